@@ -0,0 +1,226 @@
+import asyncio
+import time
+
+from qt_application_backend import (
+    IPv4AddressFilter, CanIdFilter, TokenBucket, CANETH_MAX_FRAMES_PER_DATAGRAM,
+    encode_caneth_message, encode_caneth_messages, decode_caneth_messages)
+
+CLOSED_MARKER = None  # queued by AsyncConnector.close(), ends recieve_messages and the async iteration
+
+#*********************************************************************************************************
+class CanethDatagramProtocol(asyncio.DatagramProtocol):
+    # asyncio protocol of one listening UDP port, hands every datagram to the AsyncConnector
+    def __init__(self, async_connector):
+        self.my_async_connector = async_connector
+        self.transport = None
+        self.can_write = asyncio.Event()
+        self.can_write.set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.my_async_connector.handle_datagram(data, addr, time.time_ns())
+
+    def error_received(self, exc):
+        # ICMP errors of previous sends (e.g. port unreachable) must not stop receiving
+        pass
+
+    def pause_writing(self):
+        self.can_write.clear()
+
+    def resume_writing(self):
+        self.can_write.set()
+
+#*********************************************************************************************************
+class AsyncConnector(IPv4AddressFilter):
+    # Connector for many concurrent gateways on one asyncio event loop, without one thread per socket.
+    # The IPv4 filter works like the one of the Connector, the CAN-ID filter like the one of the MessageLogger.
+    def __init__(self, UDP_IP="0.0.0.0", UDP_ports=(4210,), id_filter=None, max_queued_messages=10000):
+        # FUNC: initialize the AsyncConnector class
+        # INPUT: UDP_IP (string, optional): IP to listen on. Defaults to all network interfaces.
+        #        UDP_ports (iterable of int, optional): UDP ports to listen on. Defaults to 4210.
+        #        id_filter (CanIdFilter, optional): CAN-ID filter, e.g. a MessageLogger. Defaults to an empty blacklist.
+        #        max_queued_messages (int, optional): maximum number of queued caneth messages before dropping.
+        # RETURN: ---
+        super().__init__()
+        self.UDP_IP = UDP_IP
+        self.UDP_ports = list(UDP_ports)
+        self.id_filter = id_filter if id_filter is not None else CanIdFilter()
+        self.gateways = {}  # name -> (IP, port) of the gateways messages are sent to
+        self.transmit_buckets = {}  # name -> TokenBucket of the rate limited gateways
+        self.protocols = {}  # bound port -> CanethDatagramProtocol
+        self.max_queued_messages = max_queued_messages
+        self.message_queue = None  # created in start(), inside the running event loop
+        self.numb_of_dropped_messages = 0  # caneth messages dropped because the queue was full
+        self.pending_messages = []  # frames of the current caneth message of the async iterator
+        self.is_closed = False  # set by close(), the receivers are woken up with CLOSED_MARKER
+
+    async def start(self):
+        # FUNC: opens the UDP sockets of all ports
+        # INPUT: ---
+        # RETURN: ---
+        loop = asyncio.get_running_loop()
+        if self.message_queue is None or self.is_closed:
+            self.message_queue = asyncio.Queue(maxsize=self.max_queued_messages)
+            self.is_closed = False
+        for port in self.UDP_ports:
+            if port in self.protocols:
+                continue
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: CanethDatagramProtocol(self), local_addr=(self.UDP_IP, port))
+            # port 0 binds to a free port, the protocols are stored with the bound port
+            self.protocols[transport.get_extra_info('sockname')[1]] = protocol
+
+    def close(self):
+        # FUNC: closes the UDP sockets of all ports
+        # INPUT: ---
+        # RETURN: ---
+        for protocol in self.protocols.values():
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self.protocols.clear()
+        self.is_closed = True
+        if self.message_queue is not None:
+            # wakes up waiting receivers, the oldest message makes room if the queue is full
+            if self.message_queue.full():
+                self.message_queue.get_nowait()
+                self.numb_of_dropped_messages += 1
+            self.message_queue.put_nowait(CLOSED_MARKER)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_listening_ports(self):
+        # FUNC: returns the ports the sockets are bound to, useful when listening on port 0
+        # INPUT: ---
+        # RETURN: list of int
+        return list(self.protocols)
+
+    #************************************************************************************
+    # Gateways messages are sent to
+    def add_gateway(self, name, IP, port=4210):
+        # FUNC: adds or updates a gateway messages can be sent to
+        # INPUT: name as string; e.g.: "front_ecu"
+        #        IP as string;   e.g.: "192.168.0.240"
+        #        port (int, optional): UDP port of the gateway. Defaults to 4210.
+        # RETURN: ---
+        self.gateways[name] = (IP, port)
+
+    def remove_gateway(self, name):
+        # FUNC: removes a gateway
+        # INPUT: name as string
+        # RETURN: ---
+        self.gateways.pop(name, None)
+        self.transmit_buckets.pop(name, None)
+
+    def get_gateways(self):
+        # FUNC: returns all gateways
+        # RETURN: dictionary name -> (IP, port)
+        return dict(self.gateways)
+
+    def set_transmit_rate(self, gateway, rate, burst=CANETH_MAX_FRAMES_PER_DATAGRAM):
+        # FUNC: limiting the frames sent to a gateway with a token bucket, like Connector.set_transmit_rate
+        # INPUT: gateway as name of an added gateway
+        #        rate as frames per second, None removes the limit
+        #        burst (int, optional): frames sent at once, also the maximum frames per datagram. Defaults to 97.
+        # RETURN: ---
+        if rate:
+            self.transmit_buckets[gateway] = TokenBucket(rate, max(1, int(burst)))
+        else:
+            self.transmit_buckets.pop(gateway, None)
+
+    #************************************************************************************
+    # Sending messages
+    async def send_message(self, gateway, input_can_id_hex, input_can_data_hex, ext_flag=False, rtr_flag=False):
+        # FUNC: sending a caneth message to a gateway
+        # INPUT:    gateway as name of an added gateway
+        #           input_can_id_hex as hex-number;     e.g.: 0x123
+        #           input_can_data_hex as byte-string;  e.g.: b'\x01\x02\x03'
+        # RETURN: ---
+        await self.wait_for_transmit(gateway, 1)
+        await self._send(gateway, encode_caneth_message(input_can_id_hex, input_can_data_hex, ext_flag, rtr_flag))
+
+    async def send_messages(self, gateway, input_frames):
+        # FUNC: sending several CAN frames to a gateway with as few caneth messages as possible
+        # INPUT:    gateway as name of an added gateway
+        #           input_frames as list of CanFrame or tuples like for Connector.send_messages
+        # RETURN: number of sent caneth messages
+        bucket = self.transmit_buckets.get(gateway)
+        frames_per_datagram = CANETH_MAX_FRAMES_PER_DATAGRAM if bucket is None else \
+            min(CANETH_MAX_FRAMES_PER_DATAGRAM, int(bucket.burst))
+        numb_of_sent_messages = 0
+        for start in range(0, len(input_frames), frames_per_datagram):
+            frames = input_frames[start:start + frames_per_datagram]
+            await self.wait_for_transmit(gateway, len(frames))
+            await self._send(gateway, encode_caneth_messages(frames))
+            numb_of_sent_messages += 1
+        return numb_of_sent_messages
+
+    async def wait_for_transmit(self, gateway, numb_of_frames):
+        # reserving the frames in the token bucket of the gateway, the other coroutines go on while waiting
+        bucket = self.transmit_buckets.get(gateway)
+        if bucket is not None:
+            wait_time = bucket.reserve(numb_of_frames)
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+
+    async def _send(self, gateway, encoded_message):
+        # messages are sent from the socket of the gateway port, so the gateway can answer to the same port
+        if not self.protocols:
+            raise RuntimeError("AsyncConnector is not started, call start() before sending")
+        address = self.gateways.get(gateway)
+        if address is None:
+            raise ValueError("unknown gateway: %s" % gateway)
+        protocol = self.protocols.get(address[1])
+        if protocol is None:
+            protocol = next(iter(self.protocols.values()))
+        await protocol.can_write.wait()  # wait while the transport buffer is full
+        protocol.transport.sendto(encoded_message, address)
+
+    #************************************************************************************
+    # Receiving messages
+    def handle_datagram(self, data, addr, timestamp):
+        # FUNC: filtering and decoding a received datagram, called by the protocols
+        # INPUT: data as byte-string
+        #        addr as tuple (IP, port) of the sender
+        #        timestamp as int, receive time in nanoseconds since the epoch
+        # RETURN: ---
+        if 1 != self.check_IPv4_source(addr):
+            return
+        messages = self.id_filter.filter_messages(decode_caneth_messages(data, timestamp))
+        if not messages:
+            return
+        try:
+            self.message_queue.put_nowait((addr, messages))
+        except asyncio.QueueFull:
+            self.numb_of_dropped_messages += 1
+
+    async def recieve_messages(self):
+        # FUNC: waiting for the next accepted caneth message
+        # INPUT: ---
+        # RETURN: addr as tuple (IP, port) of the gateway, None after close()
+        #         messages as list of CanFrame
+        item = await self.message_queue.get()
+        if item is CLOSED_MARKER:
+            self.message_queue.put_nowait(CLOSED_MARKER)  # for the other receivers
+            return None, []
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # yields the accepted frames one by one
+        if not self.pending_messages:
+            addr, messages = await self.recieve_messages()
+            if addr is None:
+                raise StopAsyncIteration
+            self.pending_messages = messages[::-1]
+        return self.pending_messages.pop()
+
+#*********************************************************************************************************
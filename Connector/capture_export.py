@@ -0,0 +1,288 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from qt_application_backend import CAN_FLAG_EXT, CAN_FLAG_RTR, MessageLogger
+from capture_file import (CaptureReader, CAPTURE_RECORD_STRUCT, CAPTURE_RECORD_SIZE, encode_capture_records,
+                          open_capture_reader)
+from compressed_capture import CompressedCaptureReader
+
+try:
+    import numpy as np  # optional, needed for the columnar formats
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa  # optional, needed for the columnar formats
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+#*********************************************************************************************************
+# Streaming export of frames to analysis tools. Every source is read in chunks of capture records (the 24 byte
+# records of capture_file.py), so a multi-GB capture is exported with the memory of one chunk:
+#   csv       timestamp in s, CAN-ID in hex, ext, rtr, dlc, data in hex
+#   asc       Vector ASC text trace, time stamps relative to the first frame
+#   parquet   columnar, one row group per chunk, needs numpy and pyarrow
+#   arrow     Arrow IPC file, one record batch per chunk, needs numpy and pyarrow
+# A capture file is read zero-copy from its memory map, a compressed capture block by block.
+# export_capture_parallel formats the chunks of a capture in worker processes; the text formats are written in order
+# into one file, the columnar formats into one part file per chunk in a directory, which Parquet and Arrow readers
+# open as one dataset.
+EXPORT_FORMATS = ("csv", "asc", "parquet", "arrow")
+DEFAULT_CHUNK_SIZE = 1 << 18  # frames per chunk, 6 MB of capture records
+CSV_HEADER = "timestamp,can_id,ext,rtr,dlc,data\n"
+CAPTURE_READERS = (CaptureReader, CompressedCaptureReader)
+
+def get_export_format(file_path, export_format=None):
+    # FUNC: returns the export format, given or from the file extension
+    # INPUT: file_path as string
+    #        export_format (str, optional): one of EXPORT_FORMATS
+    # RETURN: export format as string
+    if export_format is None:
+        export_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+        export_format = {"feather": "arrow", "ipc": "arrow"}.get(export_format, export_format)
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("unknown export format: %s, expected one of %s" % (export_format, ", ".join(EXPORT_FORMATS)))
+    if export_format in ("parquet", "arrow") and (np is None or pa is None):
+        raise RuntimeError("numpy and pyarrow are required for the %s export" % export_format)
+    return export_format
+
+def iter_record_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    # FUNC: reading a source in chunks of capture records
+    # INPUT: source as (Compressed)CaptureReader, MessageLogger (its recent messages) or iterable of CanFrame,
+    #        e.g. MessageLogger.exact_messages or a FrameRingBuffer
+    #        chunk_size (int, optional): frames per chunk
+    # RETURN: generator of bytes-like objects with up to chunk_size capture records
+    if isinstance(source, CAPTURE_READERS):
+        for start in range(0, len(source), chunk_size):
+            yield source.record_view(start, start + chunk_size)
+        return
+    if isinstance(source, MessageLogger):
+        source = source.recent_messages
+    # a snapshot of the references, the receiver thread may append while the export runs
+    frame_iterator = iter(list(source))
+    while True:
+        frames = list(islice(frame_iterator, chunk_size))
+        if not frames:
+            return
+        yield encode_capture_records(frames)
+
+def get_first_timestamp(source):
+    # returns the time stamp of the first frame of a source in ns, None if it is empty
+    if isinstance(source, CAPTURE_READERS):
+        return source.frame_at(0).timestamp if len(source) else None
+    if isinstance(source, MessageLogger):
+        source = source.recent_messages
+    for frame in source:
+        return frame.timestamp
+    return None
+
+#*********************************************************************************************************
+# Text formats
+def format_csv_records(records):
+    # FUNC: formatting capture records as CSV lines
+    # INPUT: records as bytes-like object of capture records
+    # RETURN: string
+    return "".join(["%d.%09d,%X,%d,%d,%d,%s\n" % (timestamp // 1000000000, timestamp % 1000000000, can_id,
+                                                   flags & CAN_FLAG_EXT, (flags & CAN_FLAG_RTR) >> 1, dlc,
+                                                   data[:dlc].hex().upper())
+                    for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(records)])
+
+def format_asc_header(start_timestamp):
+    # FUNC: returns the header of an ASC trace
+    # INPUT: start_timestamp as int, ns since the epoch, the ASC time stamps are relative to it
+    # RETURN: string
+    start_time = time.localtime(start_timestamp // 1000000000)
+    date = "%s.%03d %s" % (time.strftime("%a %b %d %I:%M:%S", start_time), start_timestamp // 1000000 % 1000,
+                           time.strftime("%p %Y", start_time).lower())
+    return ("date %s\nbase hex  timestamps absolute\ninternal events logged\n// version 9.0.0\n"
+            "Begin Triggerblock %s\n   0.000000 Start of measurement\n" % (date, date))
+
+def format_asc_records(records, start_timestamp):
+    # FUNC: formatting capture records as ASC lines on channel 1
+    # INPUT: records as bytes-like object of capture records
+    #        start_timestamp as int, ns since the epoch
+    # RETURN: string
+    lines = []
+    for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(records):
+        identifier = "%Xx" % can_id if flags & CAN_FLAG_EXT else "%X" % can_id
+        if flags & CAN_FLAG_RTR:
+            lines.append("%11.6f 1  %-15s Rx   r %X\n" % ((timestamp - start_timestamp) / 1e9, identifier, dlc))
+        else:
+            lines.append(("%11.6f 1  %-15s Rx   d %X %s" % ((timestamp - start_timestamp) / 1e9, identifier, dlc,
+                                                          data[:min(dlc, 8)].hex(' ').upper())).rstrip() + "\n")
+    return "".join(lines)
+
+ASC_FOOTER = "End TriggerBlock\n"
+
+def format_text_records(export_format, records, start_timestamp):
+    # FUNC: formatting capture records in a text format
+    # RETURN: encoded bytes
+    if export_format == "csv":
+        return format_csv_records(records).encode("ascii")
+    return format_asc_records(records, start_timestamp).encode("ascii")
+
+#*********************************************************************************************************
+# Columnar formats
+def get_arrow_schema():
+    return pa.schema([("timestamp", pa.timestamp("ns", tz="UTC")), ("can_id", pa.uint32()), ("ext", pa.bool_()),
+                      ("rtr", pa.bool_()), ("dlc", pa.uint8()), ("data", pa.binary(8))])
+
+def records_to_arrow_table(records):
+    # FUNC: converting capture records into an Arrow table, the columns are built from numpy views of the records
+    # INPUT: records as bytes-like object of capture records
+    # RETURN: pyarrow.Table with the schema of get_arrow_schema
+    from capture_file import CAPTURE_RECORD_DTYPE
+    record_array = np.frombuffer(records, dtype=CAPTURE_RECORD_DTYPE)
+    flags = record_array['flags']
+    data = np.ascontiguousarray(record_array['data'])
+    return pa.Table.from_arrays([
+        pa.array(record_array['timestamp']).cast(pa.timestamp("ns", tz="UTC")),
+        pa.array(record_array['can_id']),
+        pa.array((flags & CAN_FLAG_EXT) != 0),
+        pa.array((flags & CAN_FLAG_RTR) != 0),
+        pa.array(record_array['dlc']),
+        pa.FixedSizeBinaryArray.from_buffers(pa.binary(8), len(record_array), [None, pa.py_buffer(data)]),
+    ], schema=get_arrow_schema())
+
+class ColumnarWriter:
+    # Writes Arrow tables chunk by chunk as Parquet row groups or Arrow IPC record batches
+    def __init__(self, file_path, export_format, compression="zstd"):
+        self.export_format = export_format
+        if export_format == "parquet":
+            self.writer = pq.ParquetWriter(file_path, get_arrow_schema(), compression=compression)
+        else:
+            self.sink = pa.OSFile(file_path, "wb")
+            self.writer = pa.ipc.new_file(self.sink, get_arrow_schema())
+
+    def write_records(self, records):
+        self.writer.write_table(records_to_arrow_table(records))
+
+    def close(self):
+        self.writer.close()
+        if self.export_format == "arrow":
+            self.sink.close()
+
+#*********************************************************************************************************
+def export_frames(source, file_path, export_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # FUNC: exporting the frames of a source chunk by chunk
+    # INPUT: source as (Compressed)CaptureReader, MessageLogger or iterable of CanFrame, see iter_record_chunks
+    #        file_path as string
+    #        export_format (str, optional): one of EXPORT_FORMATS. Defaults to the file extension.
+    #        chunk_size (int, optional): frames per chunk
+    # RETURN: number of exported frames
+    export_format = get_export_format(file_path, export_format)
+    numb_of_frames = 0
+    if export_format in ("parquet", "arrow"):
+        columnar_writer = ColumnarWriter(file_path, export_format)
+        try:
+            for records in iter_record_chunks(source, chunk_size):
+                columnar_writer.write_records(records)
+                numb_of_frames += len(records) // CAPTURE_RECORD_SIZE
+        finally:
+            columnar_writer.close()
+        return numb_of_frames
+
+    start_timestamp = get_first_timestamp(source) or time.time_ns()
+    with open(file_path, "wb") as export_file:
+        export_file.write(CSV_HEADER.encode("ascii") if export_format == "csv" else
+                          format_asc_header(start_timestamp).encode("ascii"))
+        for records in iter_record_chunks(source, chunk_size):
+            export_file.write(format_text_records(export_format, records, start_timestamp))
+            numb_of_frames += len(records) // CAPTURE_RECORD_SIZE
+        if export_format == "asc":
+            export_file.write(ASC_FOOTER.encode("ascii"))
+    return numb_of_frames
+
+def format_capture_chunk(capture_path, export_format, start, stop, start_timestamp):
+    # worker process: formats the frames start to stop of a capture file in a text format
+    with open_capture_reader(capture_path) as capture_reader:
+        return format_text_records(export_format, bytes(capture_reader.record_view(start, stop)), start_timestamp)
+
+def write_capture_part(capture_path, export_format, start, stop, part_path):
+    # worker process: writes the frames start to stop of a capture file into a columnar part file
+    with open_capture_reader(capture_path) as capture_reader:
+        records = capture_reader.record_view(start, stop)
+        columnar_writer = ColumnarWriter(part_path, export_format)
+        try:
+            columnar_writer.write_records(records)
+        finally:
+            columnar_writer.close()
+            del records  # the view has to be released before the reader closes the memory map
+    return stop - start
+
+def export_capture_parallel(capture_path, file_path, export_format=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # FUNC: exporting a capture file with worker processes, one chunk per task
+    # INPUT: capture_path as string
+    #        file_path as string, a directory for parquet and arrow which gets one part file per chunk
+    #        export_format (str, optional): one of EXPORT_FORMATS. Defaults to the file extension.
+    #        workers (int, optional): number of worker processes. Defaults to the number of CPUs.
+    #        chunk_size (int, optional): frames per chunk
+    # RETURN: number of exported frames
+    export_format = get_export_format(file_path, export_format)
+    with open_capture_reader(capture_path) as capture_reader:
+        numb_of_frames = len(capture_reader)
+        start_timestamp = capture_reader.frame_at(0).timestamp if numb_of_frames else capture_reader.start_time
+    workers = workers or os.cpu_count() or 1
+    chunks = [(start, min(start + chunk_size, numb_of_frames)) for start in range(0, numb_of_frames, chunk_size)]
+    # spawn instead of fork, the export can be started from the GUI process
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        if export_format in ("parquet", "arrow"):
+            os.makedirs(file_path, exist_ok=True)
+            futures = [executor.submit(write_capture_part, capture_path, export_format, start, stop,
+                                       os.path.join(file_path, "part-%05d.%s" % (index, export_format)))
+                       for index, (start, stop) in enumerate(chunks)]
+            return sum(future.result() for future in futures)
+
+        with open(file_path, "wb") as export_file:
+            export_file.write(CSV_HEADER.encode("ascii") if export_format == "csv" else
+                              format_asc_header(start_timestamp).encode("ascii"))
+            # at most two chunks per worker are in flight, so the memory stays bounded while the output is in order
+            pending_futures = deque()
+            chunk_iterator = iter(chunks)
+            for start, stop in islice(chunk_iterator, 2 * workers):
+                pending_futures.append(executor.submit(format_capture_chunk, capture_path, export_format, start, stop,
+                                                       start_timestamp))
+            while pending_futures:
+                export_file.write(pending_futures.popleft().result())
+                for start, stop in islice(chunk_iterator, 1):
+                    pending_futures.append(executor.submit(format_capture_chunk, capture_path, export_format, start,
+                                                           stop, start_timestamp))
+            if export_format == "asc":
+                export_file.write(ASC_FOOTER.encode("ascii"))
+    return numb_of_frames
+
+#*********************************************************************************************************
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a capture file to CSV, ASC, Parquet or Arrow")
+    parser.add_argument("capture", help="capture file of the Connector")
+    parser.add_argument("output", help="output file, the format is taken from the extension; "
+                                       "a directory of part files for parquet and arrow with --workers")
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="frames per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, 0 for one per CPU")
+    args = parser.parse_args(argv)
+    start_time = time.monotonic()
+    try:
+        if args.workers == 1:
+            with open_capture_reader(args.capture) as capture_reader:
+                numb_of_frames = export_frames(capture_reader, args.output, args.export_format, args.chunk_size)
+        else:
+            numb_of_frames = export_capture_parallel(args.capture, args.output, args.export_format,
+                                                     args.workers or None, args.chunk_size)
+    except (OSError, ValueError, RuntimeError) as error:
+        print("error: %s" % error, file=sys.stderr)
+        return 2
+    duration = time.monotonic() - start_time
+    print("%d frames exported in %.1f s (%.0f frames/s)" % (numb_of_frames, duration,
+                                                             numb_of_frames / duration if duration > 0 else 0))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
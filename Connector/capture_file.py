@@ -0,0 +1,277 @@
+import mmap
+import os
+import queue
+import threading
+import time
+from struct import Struct
+
+from qt_application_backend import CanFrame
+
+try:
+    import numpy as np  # optional, only used to hand out the records as a structured numpy array
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+# Capture file: header followed by fixed size records, all little endian
+# header: magic (8 bytes), format version (uint16), record size (uint16), reserved (uint32), start time in ns (int64)
+# record: time stamp in ns (int64), CAN ID (uint32), DLC (uint8), flags (uint8), reserved (2 bytes), data (8 bytes)
+CAPTURE_MAGIC = b'CANCAP01'
+CAPTURE_VERSION = 1
+CAPTURE_HEADER_STRUCT = Struct('<8sHHIq')
+CAPTURE_RECORD_STRUCT = Struct('<qIBB2x8s')
+CAPTURE_HEADER_SIZE = CAPTURE_HEADER_STRUCT.size
+CAPTURE_RECORD_SIZE = CAPTURE_RECORD_STRUCT.size
+
+if np is not None:
+    CAPTURE_RECORD_DTYPE = np.dtype([('timestamp', '<i8'), ('can_id', '<u4'), ('dlc', 'u1'), ('flags', 'u1'),
+                                     ('reserved', 'V2'), ('data', 'u1', (8,))])
+
+def encode_capture_records(frames):
+    # FUNC: encoding frames to capture records
+    # INPUT: frames as iterable of CanFrame
+    # RETURN: records as byte-string
+    pack_record = CAPTURE_RECORD_STRUCT.pack
+    return b''.join([pack_record(frame.timestamp, frame.can_id, frame.dlc, frame.flags, frame.data) for frame in frames])
+
+def decode_capture_record(record):
+    # FUNC: decoding one capture record
+    # INPUT: record as byte-string or memoryview of CAPTURE_RECORD_SIZE bytes
+    # RETURN: CanFrame
+    timestamp, can_id, dlc, flags, data = CAPTURE_RECORD_STRUCT.unpack(record)
+    return CanFrame(can_id, data[:dlc], flags, timestamp, dlc)
+
+#*********************************************************************************************************
+class CaptureWriter:
+    # Append-only writer of capture files. The receive thread only queues the encoded records,
+    # a writer thread does the buffered file writes and the periodic fsync.
+    def __init__(self, file_path, buffer_size=1 << 20, fsync_interval=1.0, max_queued_batches=10000):
+        # FUNC: initialize the CaptureWriter class and open the capture file
+        # INPUT: file_path as string
+        #        buffer_size (int, optional): size of the file buffer in bytes. Defaults to 1 MiB.
+        #        fsync_interval (float, optional): seconds between two fsync calls, 0 disables fsync. Defaults to 1 s.
+        #        max_queued_batches (int, optional): queued batches before frames are dropped. Defaults to 10000.
+        # RETURN: ---
+        self.file_path = file_path
+        self.fsync_interval = fsync_interval
+        self.numb_of_written_frames = 0
+        self.numb_of_dropped_frames = 0  # frames dropped because the writer thread could not keep up
+
+        new_file = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        if not new_file:
+            with open(file_path, 'r+b') as existing_file:
+                read_capture_header(existing_file.read(CAPTURE_HEADER_SIZE))
+                # a partly written last record of an interrupted capture is cut off, otherwise every appended
+                # record would be shifted against the record grid
+                numb_of_frames = (os.fstat(existing_file.fileno()).st_size - CAPTURE_HEADER_SIZE) // CAPTURE_RECORD_SIZE
+                existing_file.truncate(CAPTURE_HEADER_SIZE + numb_of_frames * CAPTURE_RECORD_SIZE)
+        self.file = open(file_path, 'ab', buffering=buffer_size)
+        if new_file:
+            self.file.write(CAPTURE_HEADER_STRUCT.pack(CAPTURE_MAGIC, CAPTURE_VERSION, CAPTURE_RECORD_SIZE, 0,
+                                                       time.time_ns()))
+
+        self.record_queue = queue.Queue(maxsize=max_queued_batches)
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self.run, name="CaptureWriter", daemon=True)
+        self.writer_thread.start()
+
+    def write_frame(self, frame):
+        # FUNC: queueing one frame for writing
+        # INPUT: frame as CanFrame
+        # RETURN: ---
+        self.write_frames((frame,))
+
+    def write_frames(self, frames):
+        # FUNC: queueing a batch of frames for writing, never blocks the caller
+        # INPUT: frames as list of CanFrame
+        # RETURN: ---
+        if not frames or not self.is_running:
+            return
+        try:
+            self.record_queue.put_nowait((len(frames), encode_capture_records(frames)))
+        except queue.Full:
+            self.numb_of_dropped_frames += len(frames)
+
+    def run(self):
+        # writer thread: writes the queued records and calls fsync every fsync_interval seconds
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self.record_queue.get(timeout=self.fsync_interval or 1.0)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                if item[1] is None:  # close marker
+                    break
+                self.file.write(item[1])
+                self.numb_of_written_frames += item[0]
+            if self.fsync_interval and time.monotonic() - last_sync >= self.fsync_interval:
+                self.sync()
+                last_sync = time.monotonic()
+        self.sync()
+
+    def sync(self):
+        # FUNC: flushing the file buffer and writing the file to disk
+        self.file.flush()
+        if self.fsync_interval:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        # FUNC: writing all queued frames and closing the capture file
+        # INPUT: ---
+        # RETURN: ---
+        if not self.is_running:
+            return
+        self.is_running = False
+        self.record_queue.put((0, None))
+        self.writer_thread.join()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#*********************************************************************************************************
+def read_capture_header(header):
+    # FUNC: reading and checking the header of a capture file
+    # INPUT: header as byte-string of CAPTURE_HEADER_SIZE bytes
+    # RETURN: start time of the capture in ns
+    if len(header) < CAPTURE_HEADER_SIZE:
+        raise ValueError("capture file is too short")
+    magic, version, record_size, _, start_time = CAPTURE_HEADER_STRUCT.unpack(header[:CAPTURE_HEADER_SIZE])
+    if magic != CAPTURE_MAGIC:
+        raise ValueError("not a capture file")
+    if version != CAPTURE_VERSION or record_size != CAPTURE_RECORD_SIZE:
+        raise ValueError("unsupported capture file version %d" % version)
+    return start_time
+
+#*********************************************************************************************************
+class CaptureReader:
+    # Reader of capture files. The file is memory-mapped, so captures larger than the RAM can be scanned
+    # and the records are handed out as zero-copy views.
+    def __init__(self, file_path):
+        # FUNC: initialize the CaptureReader class and map the capture file
+        # INPUT: file_path as string
+        # RETURN: ---
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.start_time = read_capture_header(self.file.read(CAPTURE_HEADER_SIZE))
+        self.mmap = None
+        self.view = memoryview(b'')
+        self.numb_of_frames = 0
+        self.retired_mappings = []  # (mmap, view) of previous mappings, closed once no view of them is alive
+        self.refresh()
+
+    def refresh(self):
+        # FUNC: mapping the file again, to see frames written since the reader was opened. The new mapping is created
+        #       before the previous one is released, views handed out before stay valid
+        # INPUT: ---
+        # RETURN: number of frames
+        file_size = os.fstat(self.file.fileno()).st_size
+        numb_of_frames = max(0, file_size - CAPTURE_HEADER_SIZE) // CAPTURE_RECORD_SIZE  # a partly written last record is ignored
+        if numb_of_frames == self.numb_of_frames:
+            return self.numb_of_frames
+        new_mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        new_view = memoryview(new_mmap)[CAPTURE_HEADER_SIZE:CAPTURE_HEADER_SIZE + numb_of_frames * CAPTURE_RECORD_SIZE]
+        self.retire_mapping()
+        self.mmap = new_mmap
+        self.view = new_view
+        self.numb_of_frames = numb_of_frames
+        return self.numb_of_frames
+
+    def retire_mapping(self):
+        # detaching the current mapping; it and the previously retired ones are closed as soon as no view of them
+        # (e.g. of record_view or records) is alive anymore
+        if self.mmap is not None:
+            self.retired_mappings.append((self.mmap, self.view))
+        self.mmap = None
+        self.view = memoryview(b'')
+        self.numb_of_frames = 0
+        still_used = []
+        for retired_mmap, retired_view in self.retired_mappings:
+            try:
+                retired_view.release()
+                retired_mmap.close()
+            except BufferError:
+                still_used.append((retired_mmap, retired_view))
+        self.retired_mappings = still_used
+
+    def close(self):
+        # FUNC: closing the capture file
+        # INPUT: ---
+        # RETURN: ---
+        self.retire_mapping()
+        self.retired_mappings = []  # mappings with views still alive are closed when their last view is released
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.numb_of_frames
+
+    def record_view(self, start=0, stop=None):
+        # FUNC: returns a zero-copy view of the raw records
+        # INPUT: start (int, optional): index of the first frame
+        #        stop (int, optional): index after the last frame
+        # RETURN: memoryview of (stop - start) * CAPTURE_RECORD_SIZE bytes
+        start, stop, _ = slice(start, stop).indices(self.numb_of_frames)
+        return self.view[start * CAPTURE_RECORD_SIZE:max(start, stop) * CAPTURE_RECORD_SIZE]
+
+    def records(self, start=0, stop=None):
+        # FUNC: returns the records as zero-copy structured numpy array, needs numpy
+        # INPUT: start, stop like record_view
+        # RETURN: numpy array with the fields timestamp, can_id, dlc, flags and data
+        if np is None:
+            raise RuntimeError("numpy is required for CaptureReader.records")
+        return np.frombuffer(self.record_view(start, stop), dtype=CAPTURE_RECORD_DTYPE)
+
+    def frame_at(self, index):
+        # FUNC: returns one frame
+        # INPUT: index as int; negative indices count from the end
+        # RETURN: CanFrame
+        if index < 0:
+            index += self.numb_of_frames
+        if not 0 <= index < self.numb_of_frames:
+            raise IndexError("frame index out of range")
+        return decode_capture_record(self.view[index * CAPTURE_RECORD_SIZE:(index + 1) * CAPTURE_RECORD_SIZE])
+
+    def __getitem__(self, index):
+        return self.frame_at(index)
+
+    def iter_frames(self, start=0, stop=None):
+        # FUNC: yields the frames as CanFrame
+        # INPUT: start, stop like record_view
+        # RETURN: generator of CanFrame
+        for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(self.record_view(start, stop)):
+            yield CanFrame(can_id, data[:dlc], flags, timestamp, dlc)
+
+    def __iter__(self):
+        return self.iter_frames()
+
+#*********************************************************************************************************
+def open_capture_reader(file_path):
+    # FUNC: opening a plain or a block-compressed capture file, the format is taken from the magic of the file
+    # INPUT: file_path as string
+    # RETURN: CaptureReader or CompressedCaptureReader
+    with open(file_path, 'rb') as capture_file:
+        magic = capture_file.read(len(CAPTURE_MAGIC))
+    if magic == CAPTURE_MAGIC:
+        return CaptureReader(file_path)
+    from compressed_capture import CompressedCaptureReader  # only needed for compressed captures
+    return CompressedCaptureReader(file_path)
+
+def create_capture_writer(file_path, **options):
+    # FUNC: creating the writer of a capture file, files ending with .cancapz are block-compressed
+    # INPUT: file_path as string
+    #        options: keyword arguments of CaptureWriter or CompressedCaptureWriter
+    # RETURN: CaptureWriter or CompressedCaptureWriter
+    if file_path.endswith(".cancapz"):
+        from compressed_capture import CompressedCaptureWriter  # only needed for compressed captures
+        return CompressedCaptureWriter(file_path, **options)
+    return CaptureWriter(file_path, **options)
@@ -0,0 +1,270 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from struct import Struct
+
+from capture_file import CAPTURE_RECORD_SIZE
+
+#*********************************************************************************************************
+# Sidecar index file: header followed by the sparse time index and the posting lists, all little endian
+# header: magic (8 bytes), numb_of_frames (uint64), block_size (uint32), monotonic flag (uint32), numb_of_IDs (uint32)
+INDEX_MAGIC = b'CANIDX01'
+INDEX_HEADER_STRUCT = Struct('<8sQIII')
+INDEX_POSTING_STRUCT = Struct('<IQ')  # CAN ID, number of entries
+RECORD_KEY_STRUCT = Struct('<qI12x')  # time stamp and CAN ID of a capture record
+RECORD_TIMESTAMP_STRUCT = Struct('<q')
+RECORD_DATA_OFFSET = 16  # offset of the data bytes in a capture record
+
+#*********************************************************************************************************
+class CaptureIndex:
+    # Sidecar index of a capture file for fast queries without decoding the whole capture:
+    #   posting lists:      CAN ID -> indices of all frames of this ID
+    #   sparse time index:  first, minimal and maximal time stamp of every block of block_size frames
+    # Payload searches run as byte scans over the raw records of the memory-mapped capture.
+    def __init__(self, capture_reader, block_size=4096):
+        # FUNC: initialize the CaptureIndex class
+        # INPUT: capture_reader as CaptureReader
+        #        block_size (int, optional): number of frames per block of the sparse time index. Defaults to 4096.
+        # RETURN: ---
+        self.my_capture_reader = capture_reader
+        self.block_size = block_size
+        self.clear()
+
+    def clear(self):
+        # FUNC: removing all index entries
+        self.numb_of_indexed_frames = 0
+        self.posting_lists = {}  # CAN ID -> array of frame indices
+        self.block_min_timestamps = array('q')
+        self.block_max_timestamps = array('q')
+        self.is_monotonic = True  # True if the time stamps never decrease, enables binary search over time
+        self.last_timestamp = None
+
+    def update(self):
+        # FUNC: indexing all frames written to the capture since the last update
+        # INPUT: ---
+        # RETURN: number of newly indexed frames
+        start = self.numb_of_indexed_frames
+        stop = len(self.my_capture_reader)
+        if stop <= start:
+            return 0
+        posting_lists = self.posting_lists
+        block_size = self.block_size
+        last_timestamp = self.last_timestamp
+        index = start
+        for timestamp, can_id in RECORD_KEY_STRUCT.iter_unpack(self.my_capture_reader.record_view(start, stop)):
+            postings = posting_lists.get(can_id)
+            if postings is None:
+                postings = posting_lists[can_id] = array('Q')
+            postings.append(index)
+
+            if index % block_size == 0:
+                self.block_min_timestamps.append(timestamp)
+                self.block_max_timestamps.append(timestamp)
+            elif timestamp < self.block_min_timestamps[-1]:
+                self.block_min_timestamps[-1] = timestamp
+            elif timestamp > self.block_max_timestamps[-1]:
+                self.block_max_timestamps[-1] = timestamp
+            if last_timestamp is not None and timestamp < last_timestamp:
+                self.is_monotonic = False
+            last_timestamp = timestamp
+            index += 1
+        self.last_timestamp = last_timestamp
+        self.numb_of_indexed_frames = stop
+        return stop - start
+
+    build = update
+
+    #************************************************************************************
+    # Sidecar file
+    def save(self, file_path):
+        # FUNC: writing the index to a sidecar file
+        # INPUT: file_path as string; e.g.: "trace.cap.idx"
+        # RETURN: ---
+        with open(file_path, 'wb') as index_file:
+            index_file.write(INDEX_HEADER_STRUCT.pack(INDEX_MAGIC, self.numb_of_indexed_frames, self.block_size,
+                                                      self.is_monotonic, len(self.posting_lists)))
+            index_file.write(RECORD_TIMESTAMP_STRUCT.pack(self.last_timestamp or 0))
+            self.block_min_timestamps.tofile(index_file)
+            self.block_max_timestamps.tofile(index_file)
+            for can_id, postings in self.posting_lists.items():
+                index_file.write(INDEX_POSTING_STRUCT.pack(can_id, len(postings)))
+                postings.tofile(index_file)
+
+    def load(self, file_path):
+        # FUNC: reading the index from a sidecar file and indexing frames appended to the capture since
+        # INPUT: file_path as string
+        # RETURN: ---
+        with open(file_path, 'rb') as index_file:
+            magic, numb_of_frames, block_size, is_monotonic, numb_of_IDs = INDEX_HEADER_STRUCT.unpack(
+                index_file.read(INDEX_HEADER_STRUCT.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError("not a capture index file")
+            if numb_of_frames > len(self.my_capture_reader):
+                raise ValueError("index does not belong to this capture")
+            self.clear()
+            self.block_size = block_size
+            self.is_monotonic = bool(is_monotonic)
+            self.last_timestamp, = RECORD_TIMESTAMP_STRUCT.unpack(index_file.read(RECORD_TIMESTAMP_STRUCT.size))
+            numb_of_blocks = (numb_of_frames + block_size - 1) // block_size
+            self.block_min_timestamps.fromfile(index_file, numb_of_blocks)
+            self.block_max_timestamps.fromfile(index_file, numb_of_blocks)
+            for _ in range(numb_of_IDs):
+                can_id, numb_of_postings = INDEX_POSTING_STRUCT.unpack(index_file.read(INDEX_POSTING_STRUCT.size))
+                postings = self.posting_lists[can_id] = array('Q')
+                postings.fromfile(index_file, numb_of_postings)
+            self.numb_of_indexed_frames = numb_of_frames
+        self.update()
+
+    #************************************************************************************
+    # Queries
+    def get_IDs(self):
+        # FUNC: returns all CAN-IDs of the capture with their number of frames
+        # RETURN: dictionary CAN ID -> number of frames
+        return {can_id: len(postings) for can_id, postings in self.posting_lists.items()}
+
+    def timestamp_at(self, index):
+        # FUNC: returns the time stamp of a frame without decoding the frame
+        return RECORD_TIMESTAMP_STRUCT.unpack_from(self.my_capture_reader.view, index * CAPTURE_RECORD_SIZE)[0]
+
+    def find_time_range(self, t1=None, t2=None):
+        # FUNC: returns the index range of all frames with t1 <= time stamp <= t2, needs monotonic time stamps
+        # INPUT: t1, t2 (int, optional): time stamps in ns, None for open ranges
+        # RETURN: tuple (start, stop)
+        if not self.is_monotonic:
+            raise ValueError("time stamps of the capture are not monotonic, use frame_indices_in_time_range")
+        start = 0 if t1 is None else self.bisect_timestamps(range(self.numb_of_indexed_frames), t1, bisect_left)
+        stop = self.numb_of_indexed_frames if t2 is None else self.bisect_timestamps(
+            range(self.numb_of_indexed_frames), t2, bisect_right)
+        return start, max(start, stop)
+
+    def bisect_timestamps(self, indices, timestamp, bisect_function):
+        # binary search over frame indices by time stamp, the sparse time index narrows the search to one block
+        if indices and isinstance(indices, range):
+            block = bisect_function(self.block_min_timestamps, timestamp) - 1
+            low = max(block, 0) * self.block_size
+            high = min((block + 2) * self.block_size, len(indices))
+        else:
+            low, high = 0, len(indices)
+        timestamp_at = self.timestamp_at
+        while low < high:
+            middle = (low + high) // 2
+            middle_timestamp = timestamp_at(indices[middle])
+            if middle_timestamp < timestamp or (bisect_function is bisect_right and middle_timestamp == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def frame_indices_in_time_range(self, t1=None, t2=None):
+        # FUNC: returns the indices of all frames with t1 <= time stamp <= t2, only blocks overlapping
+        #       the time range are read
+        # INPUT: t1, t2 (int, optional): time stamps in ns, None for open ranges
+        # RETURN: range or list of frame indices
+        if self.is_monotonic:
+            return range(*self.find_time_range(t1, t2))
+        t1 = self.block_min_timestamps[0] if t1 is None and self.block_min_timestamps else t1
+        t2 = self.block_max_timestamps[-1] if t2 is None and self.block_max_timestamps else t2
+        indices = []
+        for block, (block_min, block_max) in enumerate(zip(self.block_min_timestamps, self.block_max_timestamps)):
+            if block_max < t1 or block_min > t2:
+                continue
+            start = block * self.block_size
+            stop = min(start + self.block_size, self.numb_of_indexed_frames)
+            for offset, (timestamp, _) in enumerate(RECORD_KEY_STRUCT.iter_unpack(
+                    self.my_capture_reader.record_view(start, stop))):
+                if t1 <= timestamp <= t2:
+                    indices.append(start + offset)
+        return indices
+
+    def frame_indices_by_ID(self, can_id, t1=None, t2=None):
+        # FUNC: returns the indices of all frames of a CAN-ID with t1 <= time stamp <= t2
+        # INPUT: can_id as int
+        #        t1, t2 (int, optional): time stamps in ns, None for open ranges
+        # RETURN: array or list of frame indices
+        postings = self.posting_lists.get(can_id, array('Q'))
+        if t1 is None and t2 is None:
+            return postings
+        if self.is_monotonic:
+            start = 0 if t1 is None else self.bisect_timestamps(postings, t1, bisect_left)
+            stop = len(postings) if t2 is None else self.bisect_timestamps(postings, t2, bisect_right)
+            return postings[start:max(start, stop)]
+        timestamp_at = self.timestamp_at
+        return [index for index in postings
+                if (t1 is None or timestamp_at(index) >= t1) and (t2 is None or timestamp_at(index) <= t2)]
+
+    def frames_by_ID(self, can_id, t1=None, t2=None):
+        # FUNC: returns all frames of a CAN-ID with t1 <= time stamp <= t2; e.g.: frames_by_ID(0x45, t1, t2)
+        # INPUT: like frame_indices_by_ID
+        # RETURN: list of CanFrame
+        frame_at = self.my_capture_reader.frame_at
+        return [frame_at(index) for index in self.frame_indices_by_ID(can_id, t1, t2)]
+
+    def frames_in_time_range(self, t1=None, t2=None):
+        # FUNC: returns all frames with t1 <= time stamp <= t2
+        # INPUT: like frame_indices_in_time_range
+        # RETURN: list of CanFrame
+        frame_at = self.my_capture_reader.frame_at
+        return [frame_at(index) for index in self.frame_indices_in_time_range(t1, t2)]
+
+    def find_payload(self, pattern, mask=None, offset=None, can_id=None, start=0):
+        # FUNC: returns the first frame whose data contains a byte pattern; e.g.: find_payload(b'\x12\x34')
+        # INPUT: pattern as byte-string with up to 8 bytes
+        #        mask (byte-string, optional): only the bits set in mask are compared, same length as pattern
+        #        offset (int, optional): position of the pattern in the data bytes. Defaults to any position.
+        #        can_id (int, optional): only frames of this CAN-ID
+        #        start (int, optional): index of the first frame to search
+        # RETURN: tuple (index, CanFrame) or None
+        for result in self.iter_payload_matches(pattern, mask, offset, can_id, start):
+            return result
+        return None
+
+    def iter_payload_matches(self, pattern, mask=None, offset=None, can_id=None, start=0):
+        # FUNC: yields all frames whose data contains a byte pattern
+        # INPUT: like find_payload
+        # RETURN: generator of tuples (index, CanFrame)
+        regex = compile_payload_pattern(pattern, mask)
+        length = len(pattern)
+        view = self.my_capture_reader.record_view()
+        reader = self.my_capture_reader
+        position = start * CAPTURE_RECORD_SIZE
+        end = len(view)
+        # the regular expression scans the raw records in C, only hits are checked and decoded
+        while position < end:
+            match = regex.search(view, position)
+            if match is None:
+                return
+            hit = match.start()
+            index, record_offset = divmod(hit, CAPTURE_RECORD_SIZE)
+            data_offset = record_offset - RECORD_DATA_OFFSET
+            position = hit + 1
+            if data_offset < 0 or data_offset + length > 8 or (offset is not None and data_offset != offset):
+                continue
+            frame = reader.frame_at(index)
+            if data_offset + length > frame.dlc or (can_id is not None and frame.can_id != can_id):
+                continue
+            yield index, frame
+            # only one match per frame
+            position = (index + 1) * CAPTURE_RECORD_SIZE
+
+#*********************************************************************************************************
+def compile_payload_pattern(pattern, mask=None):
+    # FUNC: compiling a byte pattern with an optional bit mask to a regular expression over raw bytes
+    # INPUT: pattern as byte-string
+    #        mask (byte-string, optional): bits to compare, same length as pattern
+    # RETURN: compiled regular expression
+    if mask is None:
+        return re.compile(re.escape(pattern), re.DOTALL)
+    if len(mask) != len(pattern):
+        raise ValueError("mask and pattern must have the same length")
+    parts = []
+    for value, bits in zip(pattern, mask):
+        if bits == 0xFF:
+            parts.append(re.escape(bytes([value])))
+        elif bits == 0:
+            parts.append(b'.')
+        else:
+            matching = bytes(byte for byte in range(256) if byte & bits == value & bits)
+            parts.append(b'[' + b''.join(b'\\x%02x' % byte for byte in matching) + b']')
+    return re.compile(b''.join(parts), re.DOTALL)
+
+#*********************************************************************************************************
@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+
+from qt_application_backend import CANETH_MAX_FRAMES_PER_DATAGRAM
+
+#*********************************************************************************************************
+class ReplayStatistics:
+    # Achieved rate and timing jitter of a replay. The lateness of a frame is the time between its
+    # scheduled send time and the moment it was actually handed to the socket.
+    def __init__(self):
+        self.numb_of_frames = 0
+        self.numb_of_datagrams = 0
+        self.start_time = None  # time.monotonic_ns() of the first send
+        self.end_time = None  # time.monotonic_ns() of the last send
+        self.min_lateness = None  # ns
+        self.max_lateness = None  # ns
+        self.mean_lateness = 0.0  # ns
+        self.lateness_m2 = 0.0  # sum of squared deviations, for the standard deviation (Welford)
+
+    def add_datagram(self, numb_of_frames, send_time, deadlines):
+        # FUNC: adding a sent datagram
+        # INPUT: numb_of_frames as int
+        #        send_time as int, time.monotonic_ns() of the send
+        #        deadlines as list of int, scheduled send times of the frames, empty as fast as possible
+        # RETURN: ---
+        if self.start_time is None:
+            self.start_time = send_time
+        self.end_time = send_time
+        self.numb_of_datagrams += 1
+        for deadline in deadlines:
+            lateness = send_time - deadline
+            self.numb_of_frames += 1
+            delta = lateness - self.mean_lateness
+            self.mean_lateness += delta / self.numb_of_frames
+            self.lateness_m2 += delta * (lateness - self.mean_lateness)
+            if self.min_lateness is None or lateness < self.min_lateness:
+                self.min_lateness = lateness
+            if self.max_lateness is None or lateness > self.max_lateness:
+                self.max_lateness = lateness
+        if not deadlines:
+            self.numb_of_frames += numb_of_frames
+
+    def get_duration(self):
+        # FUNC: returns the time between the first and the last send in seconds
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time - self.start_time) / 1e9
+
+    def get_rate(self):
+        # FUNC: returns the achieved rate in frames per second
+        duration = self.get_duration()
+        return self.numb_of_frames / duration if duration > 0 else 0.0
+
+    def get_jitter(self):
+        # FUNC: returns the standard deviation of the lateness in ns
+        if self.numb_of_frames < 2 or self.min_lateness is None:
+            return 0.0
+        return math.sqrt(self.lateness_m2 / (self.numb_of_frames - 1))
+
+    def as_dict(self):
+        # FUNC: returns all statistics as dictionary
+        return {
+            "frames": self.numb_of_frames,
+            "datagrams": self.numb_of_datagrams,
+            "duration_s": self.get_duration(),
+            "rate_fps": self.get_rate(),
+            "mean_lateness_us": self.mean_lateness / 1e3,
+            "min_lateness_us": (self.min_lateness or 0) / 1e3,
+            "max_lateness_us": (self.max_lateness or 0) / 1e3,
+            "jitter_us": self.get_jitter() / 1e3,
+        }
+
+#*********************************************************************************************************
+class CaptureReplayer:
+    # Re-sends recorded frames to a gateway, e.g. to re-inject field traces into ECUs on the bench.
+    # Modes:
+    #   speed = 1.0:    original inter-frame timing
+    #   speed = x:      timing accelerated (x > 1) or slowed down (x < 1) by the factor x
+    #   speed = None:   as fast as possible
+    # Every frame has an absolute deadline relative to the start of the replay, so sleep inaccuracies
+    # do not add up over the replay (drift correction). Frames which are due together are sent in one datagram.
+    def __init__(self, connector, frames, speed=1.0, batch=True, coalesce_window=0.0, spin_threshold=0.002):
+        # FUNC: initialize the CaptureReplayer class
+        # INPUT: connector as Connector, the frames are sent to its target IP
+        #        frames as iterable of CanFrame in time stamp order; e.g.: CaptureReader, FrameRingBuffer
+        #        speed (float, optional): speed multiplier, None for as fast as possible. Defaults to 1.0.
+        #        batch (bool, optional): send due frames together with Connector.send_messages. Defaults to True.
+        #        coalesce_window (float, optional): seconds frames may be sent early to share a datagram. Defaults to 0.
+        #        spin_threshold (float, optional): the last seconds before a deadline are busy-waited. Defaults to 2 ms.
+        # RETURN: ---
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive or None")
+        self.my_connector = connector
+        self.frames = frames
+        self.speed = speed
+        self.batch = batch
+        self.coalesce_window = int(coalesce_window * 1e9)
+        self.spin_threshold = int(spin_threshold * 1e9)
+        self.statistics = ReplayStatistics()
+        self.is_running = False
+        self.replay_thread = None
+
+    def start(self):
+        # FUNC: starting the replay in a background thread
+        # INPUT: ---
+        # RETURN: ---
+        self.is_running = True
+        self.replay_thread = threading.Thread(target=self.replay, name="CaptureReplayer", daemon=True)
+        self.replay_thread.start()
+
+    def stop(self):
+        # FUNC: stopping the replay
+        # INPUT: ---
+        # RETURN: ---
+        self.is_running = False
+        if self.replay_thread is not None and self.replay_thread is not threading.current_thread():
+            self.replay_thread.join()
+
+    def join(self, timeout=None):
+        # FUNC: waiting for the end of the replay
+        if self.replay_thread is not None:
+            self.replay_thread.join(timeout)
+
+    def run(self):
+        # FUNC: replaying all frames in the calling thread, blocks until the replay is done or stopped
+        # INPUT: ---
+        # RETURN: ReplayStatistics
+        self.is_running = True
+        return self.replay()
+
+    def replay(self):
+        # replaying the frames while is_running is set; the thread of start() runs this directly, so a stop()
+        # before the thread got to run is not overwritten
+        self.statistics = ReplayStatistics()
+        if self.speed is None:
+            self.run_as_fast_as_possible()
+        else:
+            self.run_timed()
+        self.is_running = False
+        return self.statistics
+
+    def run_as_fast_as_possible(self):
+        batch_size = CANETH_MAX_FRAMES_PER_DATAGRAM if self.batch else 1
+        pending_frames = []
+        for frame in self.frames:
+            if not self.is_running:
+                return
+            pending_frames.append(frame)
+            if len(pending_frames) >= batch_size:
+                self.send(pending_frames, [])
+                pending_frames = []
+        if pending_frames:
+            self.send(pending_frames, [])
+
+    def run_timed(self):
+        frame_iterator = iter(self.frames)
+        first_frame = next(frame_iterator, None)
+        if first_frame is None:
+            return
+        first_timestamp = first_frame.timestamp
+        start_time = time.monotonic_ns()
+        speed = self.speed
+        max_batch_size = CANETH_MAX_FRAMES_PER_DATAGRAM if self.batch else 1
+
+        next_frame = first_frame
+        next_deadline = start_time
+        while next_frame is not None and self.is_running:
+            self.wait_until(next_deadline)
+            # all frames which are due now (or within the coalesce window) are sent together
+            now = time.monotonic_ns() + self.coalesce_window
+            pending_frames = []
+            deadlines = []
+            while next_frame is not None and next_deadline <= now and len(pending_frames) < max_batch_size:
+                pending_frames.append(next_frame)
+                deadlines.append(next_deadline)
+                next_frame = next(frame_iterator, None)
+                if next_frame is not None:
+                    next_deadline = start_time + int((next_frame.timestamp - first_timestamp) / speed)
+            if not pending_frames:  # stop() interrupted wait_until before the next frame was due
+                break
+            self.send(pending_frames, deadlines)
+
+    def wait_until(self, deadline):
+        # sleeping until shortly before the deadline, the rest is busy-waited for a precise send time
+        while self.is_running:
+            remaining = deadline - time.monotonic_ns()
+            if remaining <= 0:
+                return
+            if remaining > self.spin_threshold:
+                time.sleep(min((remaining - self.spin_threshold) / 1e9, 0.1))
+
+    def send(self, frames, deadlines):
+        if self.batch:
+            self.my_connector.send_messages(frames)
+        else:
+            for frame in frames:
+                self.my_connector.send_messages([frame])
+        self.statistics.add_datagram(len(frames), time.monotonic_ns(), deadlines)
+
+#*********************************************************************************************************
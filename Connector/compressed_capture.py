@@ -0,0 +1,625 @@
+import argparse
+import lzma
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_right
+from struct import Struct
+
+from qt_application_backend import CanFrame
+from capture_file import CAPTURE_RECORD_STRUCT, CAPTURE_RECORD_SIZE, decode_capture_record, encode_capture_records
+
+try:
+    import numpy as np  # optional, vectorized encoding and decoding of the blocks
+    from capture_file import CAPTURE_RECORD_DTYPE
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+# Compressed capture file (.cancapz): header, compressed blocks and the block index, all little endian
+# header:  magic (8 bytes), format version (uint16), codec (uint8), level (uint8), block size in frames (uint32),
+#          start time in ns (int64)
+# block:   block header followed by the compressed columns of the block
+#          block header: compressed size (uint32), numb_of_frames (uint32), numb_of_IDs (uint32),
+#                        index width in bytes (uint8), minimal and maximal time stamp in ns (int64)
+#          columns:      dictionary of the (CAN ID, flags) pairs of the block, (uint32, uint8) each
+#                        dictionary index per frame (index width bytes)
+#                        DLC per frame (uint8)
+#                        time stamp delta to the previous frame in ns (int64), the first delta is the time stamp itself
+#                        payload XOR the previous payload of the same dictionary entry (uint64)
+#          Multi-byte columns are stored as byte planes (all lowest bytes first), so the mostly zero high bytes
+#          of the deltas form long runs for the compressor.
+# index:   one entry per block: file offset (int64), numb_of_frames (uint32), minimal and maximal time stamp (int64),
+#          followed by the trailer: index offset (int64), numb_of_blocks (uint32), index magic (8 bytes)
+# The index is written on close. A file without index, e.g. after a crash or while it is written, is read by
+# scanning the block headers; a partly written last block is ignored.
+COMPRESSED_CAPTURE_MAGIC = b'CANCAPZ1'
+COMPRESSED_CAPTURE_VERSION = 1
+COMPRESSED_HEADER_STRUCT = Struct('<8sHBBIq')
+BLOCK_HEADER_STRUCT = Struct('<IIIB3xqq')
+BLOCK_INDEX_STRUCT = Struct('<qIqq')
+INDEX_TRAILER_STRUCT = Struct('<qI8s')
+DICTIONARY_ENTRY_STRUCT = Struct('<IB')
+INDEX_MAGIC = b'CZINDEX1'
+COMPRESSED_HEADER_SIZE = COMPRESSED_HEADER_STRUCT.size
+COMPRESSED_CAPTURE_EXTENSION = ".cancapz"
+RECORD_TIMESTAMP_STRUCT = Struct('<q16x')  # time stamp of a capture record
+
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODECS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+DEFAULT_LEVELS = {CODEC_ZLIB: 6, CODEC_LZMA: 6}
+INDEX_TYPECODES = {1: 'B', 2: 'H', 4: 'I' if array('I').itemsize == 4 else 'L'}
+IS_BIG_ENDIAN = sys.byteorder == 'big'
+
+def compress_block(codec, level, raw):
+    if codec == CODEC_ZLIB:
+        return zlib.compress(raw, level)
+    return lzma.compress(raw, preset=level)
+
+def decompress_block(codec, compressed):
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(compressed)
+    return lzma.decompress(compressed)
+
+def get_index_width(numb_of_IDs):
+    return 1 if numb_of_IDs <= 0x100 else (2 if numb_of_IDs <= 0x10000 else 4)
+
+#*********************************************************************************************************
+# Column encoding of a block
+def encode_block(records):
+    # FUNC: encoding capture records into the columns of one block
+    # INPUT: records as bytes-like object of capture records
+    # RETURN: (raw columns as bytes, numb_of_frames, numb_of_IDs, index width, minimal and maximal time stamp)
+    if np is not None:
+        return encode_block_vectorized(records)
+    dictionary = {}
+    previous_payloads = []
+    indices = []
+    dlcs = bytearray()
+    deltas = array('q')
+    payload_deltas = array('Q')
+    previous_timestamp = 0
+    min_timestamp = max_timestamp = None
+    for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(records):
+        index = dictionary.get((can_id, flags))
+        if index is None:
+            index = dictionary[(can_id, flags)] = len(previous_payloads)
+            previous_payloads.append(0)
+        payload = int.from_bytes(data, 'little')
+        payload_deltas.append(payload ^ previous_payloads[index])
+        previous_payloads[index] = payload
+        deltas.append(timestamp - previous_timestamp)
+        previous_timestamp = timestamp
+        indices.append(index)
+        dlcs.append(dlc)
+        if min_timestamp is None or timestamp < min_timestamp:
+            min_timestamp = timestamp
+        if max_timestamp is None or timestamp > max_timestamp:
+            max_timestamp = timestamp
+    index_width = get_index_width(len(dictionary))
+    pack_entry = DICTIONARY_ENTRY_STRUCT.pack
+    raw = b''.join([
+        b''.join([pack_entry(can_id, flags) for can_id, flags in dictionary]),
+        split_byte_planes(array(INDEX_TYPECODES[index_width], indices)),
+        bytes(dlcs),
+        split_byte_planes(deltas),
+        split_byte_planes(payload_deltas)])
+    return raw, len(dlcs), len(dictionary), index_width, min_timestamp or 0, max_timestamp or 0
+
+def split_byte_planes(values):
+    # splits an array into its byte planes: all lowest bytes, then all second bytes, ...
+    if IS_BIG_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    packed = values.tobytes()
+    return b''.join([packed[plane::values.itemsize] for plane in range(values.itemsize)])
+
+def join_byte_planes(raw, offset, numb_of_values, typecode):
+    # inverse of split_byte_planes, returns the array and the offset after the planes
+    values = array(typecode)
+    width = values.itemsize
+    packed = bytearray(numb_of_values * width)
+    for plane in range(width):
+        packed[plane::width] = raw[offset + plane * numb_of_values:offset + (plane + 1) * numb_of_values]
+    values.frombytes(packed)
+    if IS_BIG_ENDIAN:
+        values.byteswap()
+    return values, offset + numb_of_values * width
+
+def decode_block(raw, numb_of_frames, numb_of_IDs, index_width):
+    # FUNC: decoding the columns of one block
+    # INPUT: raw as bytes, the decompressed columns
+    #        numb_of_frames, numb_of_IDs, index_width from the block header
+    # RETURN: records as byte-string of capture records
+    if np is not None:
+        return decode_block_vectorized(raw, numb_of_frames, numb_of_IDs, index_width).tobytes()
+    dictionary = list(DICTIONARY_ENTRY_STRUCT.iter_unpack(raw[:numb_of_IDs * DICTIONARY_ENTRY_STRUCT.size]))
+    offset = numb_of_IDs * DICTIONARY_ENTRY_STRUCT.size
+    indices, offset = join_byte_planes(raw, offset, numb_of_frames, INDEX_TYPECODES[index_width])
+    dlcs = raw[offset:offset + numb_of_frames]
+    deltas, offset = join_byte_planes(raw, offset + numb_of_frames, numb_of_frames, 'q')
+    payload_deltas, offset = join_byte_planes(raw, offset, numb_of_frames, 'Q')
+
+    records = bytearray(numb_of_frames * CAPTURE_RECORD_SIZE)
+    pack_record = CAPTURE_RECORD_STRUCT.pack_into
+    previous_payloads = [0] * numb_of_IDs
+    timestamp = 0
+    record_offset = 0
+    for index, dlc, delta, payload_delta in zip(indices, dlcs, deltas, payload_deltas):
+        timestamp += delta
+        payload = previous_payloads[index] ^ payload_delta
+        previous_payloads[index] = payload
+        can_id, flags = dictionary[index]
+        pack_record(records, record_offset, timestamp, can_id, dlc, flags, payload.to_bytes(8, 'little'))
+        record_offset += CAPTURE_RECORD_SIZE
+    return bytes(records)
+
+def encode_block_vectorized(records):
+    # numpy version of encode_block, the dictionary is sorted instead of in order of appearance
+    record_array = np.frombuffer(records, dtype=CAPTURE_RECORD_DTYPE)
+    numb_of_frames = len(record_array)
+    if not numb_of_frames:
+        return b'', 0, 0, 1, 0, 0
+    keys = record_array['can_id'].astype(np.uint64) | (record_array['flags'].astype(np.uint64) << np.uint64(32))
+    dictionary, indices = np.unique(keys, return_inverse=True)
+    indices = indices.ravel()
+    index_width = get_index_width(len(dictionary))
+    dictionary_entries = np.empty(len(dictionary), dtype=[('can_id', '<u4'), ('flags', 'u1')])
+    dictionary_entries['can_id'] = dictionary & np.uint64(0xFFFFFFFF)
+    dictionary_entries['flags'] = dictionary >> np.uint64(32)
+
+    timestamps = record_array['timestamp']
+    deltas = np.empty(numb_of_frames, dtype='<i8')
+    deltas[0] = timestamps[0]
+    np.subtract(timestamps[1:], timestamps[:-1], out=deltas[1:])
+
+    # XOR with the previous payload of the same entry: consecutive within the frames grouped by entry
+    payloads = np.ascontiguousarray(record_array['data']).view('<u8').ravel()
+    order = np.argsort(indices, kind='stable')
+    grouped_payloads = payloads[order]
+    grouped_deltas = grouped_payloads.copy()
+    grouped_deltas[1:] ^= grouped_payloads[:-1]
+    sorted_indices = indices[order]
+    group_starts = np.empty(numb_of_frames, dtype=bool)
+    group_starts[0] = True
+    np.not_equal(sorted_indices[1:], sorted_indices[:-1], out=group_starts[1:])
+    grouped_deltas[group_starts] = grouped_payloads[group_starts]
+    payload_deltas = np.empty_like(payloads)
+    payload_deltas[order] = grouped_deltas
+
+    raw = b''.join([
+        dictionary_entries.tobytes(),
+        split_byte_planes_vectorized(indices.astype('<u%d' % index_width)),
+        record_array['dlc'].tobytes(),
+        split_byte_planes_vectorized(deltas),
+        split_byte_planes_vectorized(payload_deltas)])
+    return raw, numb_of_frames, len(dictionary), index_width, int(timestamps.min()), int(timestamps.max())
+
+def split_byte_planes_vectorized(values):
+    return values.view(np.uint8).reshape(len(values), values.itemsize).T.tobytes()
+
+def join_byte_planes_vectorized(raw, offset, numb_of_values, dtype):
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(raw, dtype=np.uint8, count=numb_of_values * dtype.itemsize, offset=offset)
+    values = planes.reshape(dtype.itemsize, numb_of_values).T.copy().view(dtype).ravel()
+    return values, offset + numb_of_values * dtype.itemsize
+
+def decode_block_vectorized(raw, numb_of_frames, numb_of_IDs, index_width):
+    # numpy version of decode_block, returns a structured array with CAPTURE_RECORD_DTYPE
+    record_array = np.zeros(numb_of_frames, dtype=CAPTURE_RECORD_DTYPE)
+    if not numb_of_frames:
+        return record_array
+    dictionary_entries = np.frombuffer(raw, dtype=[('can_id', '<u4'), ('flags', 'u1')], count=numb_of_IDs)
+    offset = numb_of_IDs * DICTIONARY_ENTRY_STRUCT.size
+    indices, offset = join_byte_planes_vectorized(raw, offset, numb_of_frames, '<u%d' % index_width)
+    record_array['dlc'] = np.frombuffer(raw, dtype=np.uint8, count=numb_of_frames, offset=offset)
+    deltas, offset = join_byte_planes_vectorized(raw, offset + numb_of_frames, numb_of_frames, '<i8')
+    payload_deltas, offset = join_byte_planes_vectorized(raw, offset, numb_of_frames, '<u8')
+
+    record_array['timestamp'] = np.cumsum(deltas)
+    record_array['can_id'] = dictionary_entries['can_id'][indices]
+    record_array['flags'] = dictionary_entries['flags'][indices]
+
+    # cumulative XOR over the frames grouped by entry, reset at the start of every group
+    order = np.argsort(indices, kind='stable')
+    cumulative = np.bitwise_xor.accumulate(payload_deltas[order])
+    sorted_indices = indices[order]
+    group_starts = np.empty(numb_of_frames, dtype=bool)
+    group_starts[0] = True
+    np.not_equal(sorted_indices[1:], sorted_indices[:-1], out=group_starts[1:])
+    start_positions = np.maximum.accumulate(np.where(group_starts, np.arange(numb_of_frames), 0))
+    before_group = np.where(start_positions > 0, cumulative[start_positions - 1], np.uint64(0))
+    payloads = np.empty(numb_of_frames, dtype='<u8')
+    payloads[order] = cumulative ^ before_group
+    record_array['data'] = payloads.view(np.uint8).reshape(numb_of_frames, 8)
+    return record_array
+
+#*********************************************************************************************************
+def read_compressed_header(header):
+    # FUNC: reading and checking the header of a compressed capture file
+    # INPUT: header as byte-string of COMPRESSED_HEADER_SIZE bytes
+    # RETURN: (codec, level, block size in frames, start time in ns)
+    if len(header) < COMPRESSED_HEADER_SIZE:
+        raise ValueError("compressed capture file is too short")
+    magic, version, codec, level, block_frames, start_time = COMPRESSED_HEADER_STRUCT.unpack(
+        header[:COMPRESSED_HEADER_SIZE])
+    if magic != COMPRESSED_CAPTURE_MAGIC:
+        raise ValueError("not a compressed capture file")
+    if version != COMPRESSED_CAPTURE_VERSION or codec not in CODECS.values():
+        raise ValueError("unsupported compressed capture file version %d" % version)
+    return codec, level, block_frames, start_time
+
+def read_block_index(file):
+    # FUNC: reading the block index of a compressed capture file, by scanning the block headers if it has none
+    # INPUT: file as binary file object
+    # RETURN: (list of (offset, numb_of_frames, min_timestamp, max_timestamp), offset after the last complete block)
+    file_size = os.fstat(file.fileno()).st_size
+    if file_size >= COMPRESSED_HEADER_SIZE + INDEX_TRAILER_STRUCT.size:
+        file.seek(file_size - INDEX_TRAILER_STRUCT.size)
+        index_offset, numb_of_blocks, magic = INDEX_TRAILER_STRUCT.unpack(file.read(INDEX_TRAILER_STRUCT.size))
+        if (magic == INDEX_MAGIC and index_offset + numb_of_blocks * BLOCK_INDEX_STRUCT.size +
+                INDEX_TRAILER_STRUCT.size == file_size):
+            file.seek(index_offset)
+            return (list(BLOCK_INDEX_STRUCT.iter_unpack(file.read(numb_of_blocks * BLOCK_INDEX_STRUCT.size))),
+                    index_offset)
+
+    blocks = []
+    offset = COMPRESSED_HEADER_SIZE
+    while offset + BLOCK_HEADER_STRUCT.size <= file_size:
+        file.seek(offset)
+        compressed_size, numb_of_frames, _, _, min_timestamp, max_timestamp = BLOCK_HEADER_STRUCT.unpack(
+            file.read(BLOCK_HEADER_STRUCT.size))
+        if offset + BLOCK_HEADER_STRUCT.size + compressed_size > file_size:
+            break  # partly written block
+        blocks.append((offset, numb_of_frames, min_timestamp, max_timestamp))
+        offset += BLOCK_HEADER_STRUCT.size + compressed_size
+    return blocks, offset
+
+#*********************************************************************************************************
+class CompressedCaptureWriter:
+    # Writer of compressed capture files, with the interface of CaptureWriter. The receive thread only queues the
+    # encoded records, the writer thread collects them into blocks, compresses and writes them.
+    # A block is written when it is full or max_block_age seconds after its first frame, the frames of the
+    # current block are lost on a crash.
+    def __init__(self, file_path, codec="zlib", level=None, block_frames=65536, max_block_age=10.0,
+                 fsync_interval=1.0, max_queued_batches=10000, threaded=True, start_time=None):
+        # FUNC: initialize the CompressedCaptureWriter class and open the capture file, an existing file is appended
+        # INPUT: file_path as string
+        #        codec (str, optional): "zlib" or "lzma", ignored when appending. Defaults to "zlib".
+        #        level (int, optional): compression level, zlib 0..9 or lzma preset 0..9. Defaults to 6.
+        #        block_frames (int, optional): frames per block. Defaults to 65536.
+        #        max_block_age (float, optional): seconds after which a block is written even if it is not full.
+        #        fsync_interval (float, optional): seconds between two fsync calls, 0 disables fsync. Defaults to 1 s.
+        #        max_queued_batches (int, optional): queued batches before frames are dropped. Defaults to 10000.
+        #        threaded (bool, optional): False writes in the calling thread, e.g. for conversions. Defaults to True.
+        #        start_time (int, optional): start time of a new file in ns. Defaults to now.
+        # RETURN: ---
+        self.file_path = file_path
+        self.max_block_age = max_block_age
+        self.fsync_interval = fsync_interval
+        self.numb_of_written_frames = 0
+        self.numb_of_dropped_frames = 0  # frames dropped because the writer thread could not keep up
+        self.numb_of_raw_bytes = 0
+        self.numb_of_compressed_bytes = 0
+
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            self.codec = CODECS[codec]
+            self.level = DEFAULT_LEVELS[self.codec] if level is None else level
+            self.block_frames = block_frames
+            self.file = open(file_path, 'wb')
+            self.file.write(COMPRESSED_HEADER_STRUCT.pack(COMPRESSED_CAPTURE_MAGIC, COMPRESSED_CAPTURE_VERSION,
+                                                          self.codec, self.level, block_frames,
+                                                          time.time_ns() if start_time is None else start_time))
+            self.blocks = []
+        else:
+            self.file = open(file_path, 'r+b')
+            self.codec, self.level, self.block_frames, _ = read_compressed_header(
+                self.file.read(COMPRESSED_HEADER_SIZE))
+            # the index and a partly written block are overwritten by the new blocks
+            self.blocks, end_offset = read_block_index(self.file)
+            self.file.seek(end_offset)
+            self.file.truncate()
+
+        self.pending_records = []
+        self.numb_of_pending_frames = 0
+        self.block_start_time = None
+        self.is_running = True
+        self.writer_thread = None
+        if threaded:
+            self.record_queue = queue.Queue(maxsize=max_queued_batches)
+            self.writer_thread = threading.Thread(target=self.run, name="CompressedCaptureWriter", daemon=True)
+            self.writer_thread.start()
+
+    def write_frame(self, frame):
+        # FUNC: queueing one frame for writing
+        # INPUT: frame as CanFrame
+        # RETURN: ---
+        self.write_frames((frame,))
+
+    def write_frames(self, frames):
+        # FUNC: queueing a batch of frames for writing, never blocks the caller
+        # INPUT: frames as list of CanFrame
+        # RETURN: ---
+        if frames:
+            self.write_records(encode_capture_records(frames))
+
+    def write_records(self, records):
+        # FUNC: queueing capture records for writing, written directly if the writer is not threaded
+        # INPUT: records as bytes-like object of capture records
+        # RETURN: ---
+        if not records or not self.is_running:
+            return
+        if self.writer_thread is None:
+            self.append_records(bytes(records))
+            return
+        try:
+            self.record_queue.put_nowait(bytes(records))
+        except queue.Full:
+            self.numb_of_dropped_frames += len(records) // CAPTURE_RECORD_SIZE
+
+    def run(self):
+        # writer thread: collects the queued records into blocks and calls fsync every fsync_interval seconds
+        last_sync = time.monotonic()
+        timeout = min(self.fsync_interval or 1.0, self.max_block_age or 1.0)
+        while True:
+            try:
+                records = self.record_queue.get(timeout=timeout)
+            except queue.Empty:
+                records = b''
+            if records is None:  # close marker
+                break
+            self.append_records(records)
+            if self.block_start_time is not None and time.monotonic() - self.block_start_time >= self.max_block_age:
+                self.write_block()
+            if self.fsync_interval and time.monotonic() - last_sync >= self.fsync_interval:
+                self.sync()
+                last_sync = time.monotonic()
+
+    def append_records(self, records):
+        # appends records to the current block and writes every full block
+        while records:
+            if self.block_start_time is None:
+                self.block_start_time = time.monotonic()
+            numb_of_frames = min(len(records) // CAPTURE_RECORD_SIZE, self.block_frames - self.numb_of_pending_frames)
+            self.pending_records.append(records[:numb_of_frames * CAPTURE_RECORD_SIZE])
+            self.numb_of_pending_frames += numb_of_frames
+            records = records[numb_of_frames * CAPTURE_RECORD_SIZE:]
+            if self.numb_of_pending_frames >= self.block_frames:
+                self.write_block()
+
+    def write_block(self):
+        # FUNC: encoding, compressing and writing the current block
+        if not self.numb_of_pending_frames:
+            return
+        raw, numb_of_frames, numb_of_IDs, index_width, min_timestamp, max_timestamp = encode_block(
+            b''.join(self.pending_records))
+        compressed = compress_block(self.codec, self.level, raw)
+        self.blocks.append((self.file.tell(), numb_of_frames, min_timestamp, max_timestamp))
+        self.file.write(BLOCK_HEADER_STRUCT.pack(len(compressed), numb_of_frames, numb_of_IDs, index_width,
+                                                 min_timestamp, max_timestamp) + compressed)
+        self.numb_of_written_frames += numb_of_frames
+        self.numb_of_raw_bytes += numb_of_frames * CAPTURE_RECORD_SIZE
+        self.numb_of_compressed_bytes += BLOCK_HEADER_STRUCT.size + len(compressed)
+        self.pending_records = []
+        self.numb_of_pending_frames = 0
+        self.block_start_time = None
+
+    def sync(self):
+        # FUNC: flushing the written blocks to disk, the current block stays in memory
+        self.file.flush()
+        if self.fsync_interval:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        # FUNC: writing all queued frames, the last block and the block index and closing the file
+        # INPUT: ---
+        # RETURN: ---
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self.writer_thread is not None:
+            self.record_queue.put(None)
+            self.writer_thread.join()
+        self.write_block()
+        index_offset = self.file.tell()
+        self.file.write(b''.join([BLOCK_INDEX_STRUCT.pack(*block) for block in self.blocks]) +
+                        INDEX_TRAILER_STRUCT.pack(index_offset, len(self.blocks), INDEX_MAGIC))
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#*********************************************************************************************************
+class CompressedCaptureReader:
+    # Reader of compressed capture files, with the interface of CaptureReader. Random access only decompresses
+    # the blocks which contain the requested frames, the last decoded blocks are cached.
+    def __init__(self, file_path, cached_blocks=4):
+        # FUNC: initialize the CompressedCaptureReader class and read the block index
+        # INPUT: file_path as string
+        #        cached_blocks (int, optional): number of decoded blocks kept in memory. Defaults to 4.
+        # RETURN: ---
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.codec, self.level, self.block_frames, self.start_time = read_compressed_header(
+            self.file.read(COMPRESSED_HEADER_SIZE))
+        self.cached_blocks = cached_blocks
+        self.block_cache = {}  # block number -> records, in order of use
+        self.refresh()
+
+    def refresh(self):
+        # FUNC: reading the block index again, to see blocks written since the reader was opened
+        # INPUT: ---
+        # RETURN: number of frames
+        self.blocks, _ = read_block_index(self.file)
+        self.block_starts = array('q', [0])  # index of the first frame of every block, and the total
+        for block in self.blocks:
+            self.block_starts.append(self.block_starts[-1] + block[1])
+        self.numb_of_frames = self.block_starts[-1]
+        self.block_cache.clear()
+        return self.numb_of_frames
+
+    def close(self):
+        # FUNC: closing the capture file
+        self.block_cache.clear()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.numb_of_frames
+
+    def read_block(self, block_number):
+        # FUNC: returns the decoded records of one block
+        # INPUT: block_number as int
+        # RETURN: records as byte-string of capture records
+        records = self.block_cache.pop(block_number, None)
+        if records is None:
+            self.file.seek(self.blocks[block_number][0])
+            compressed_size, numb_of_frames, numb_of_IDs, index_width, _, _ = BLOCK_HEADER_STRUCT.unpack(
+                self.file.read(BLOCK_HEADER_STRUCT.size))
+            records = decode_block(decompress_block(self.codec, self.file.read(compressed_size)), numb_of_frames,
+                                   numb_of_IDs, index_width)
+            if len(self.block_cache) >= self.cached_blocks:
+                del self.block_cache[next(iter(self.block_cache))]
+        self.block_cache[block_number] = records
+        return records
+
+    def record_view(self, start=0, stop=None):
+        # FUNC: returns the raw records, decoded from the blocks which contain them
+        # INPUT: start (int, optional): index of the first frame
+        #        stop (int, optional): index after the last frame
+        # RETURN: bytes of (stop - start) * CAPTURE_RECORD_SIZE bytes
+        start, stop, _ = slice(start, stop).indices(self.numb_of_frames)
+        if stop <= start:
+            return b''
+        parts = []
+        block_number = bisect_right(self.block_starts, start) - 1
+        while block_number < len(self.blocks) and self.block_starts[block_number] < stop:
+            block_start = self.block_starts[block_number]
+            records = self.read_block(block_number)
+            parts.append(records[max(start - block_start, 0) * CAPTURE_RECORD_SIZE:
+                                 (min(stop, self.block_starts[block_number + 1]) - block_start) * CAPTURE_RECORD_SIZE])
+            block_number += 1
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def records(self, start=0, stop=None):
+        # FUNC: returns the records as structured numpy array, needs numpy
+        # INPUT: start, stop like record_view
+        # RETURN: numpy array with the fields timestamp, can_id, dlc, flags and data
+        if np is None:
+            raise RuntimeError("numpy is required for CompressedCaptureReader.records")
+        return np.frombuffer(self.record_view(start, stop), dtype=CAPTURE_RECORD_DTYPE)
+
+    def frame_at(self, index):
+        # FUNC: returns one frame
+        # INPUT: index as int; negative indices count from the end
+        # RETURN: CanFrame
+        if index < 0:
+            index += self.numb_of_frames
+        if not 0 <= index < self.numb_of_frames:
+            raise IndexError("frame index out of range")
+        return decode_capture_record(self.record_view(index, index + 1))
+
+    def __getitem__(self, index):
+        return self.frame_at(index)
+
+    def iter_frames(self, start=0, stop=None):
+        # FUNC: yields the frames as CanFrame, block by block
+        # INPUT: start, stop like record_view
+        # RETURN: generator of CanFrame
+        start, stop, _ = slice(start, stop).indices(self.numb_of_frames)
+        block_number = bisect_right(self.block_starts, start) - 1
+        while start < stop:
+            block_stop = min(stop, self.block_starts[block_number + 1])
+            for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(
+                    self.record_view(start, block_stop)):
+                yield CanFrame(can_id, data[:dlc], flags, timestamp, dlc)
+            start = block_stop
+            block_number += 1
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    def find_time(self, timestamp):
+        # FUNC: returns the index of the first frame at or after a time stamp, only decompresses one block;
+        #       the time stamps have to be in order, like in captures of one Connector
+        # INPUT: timestamp as int, ns since the epoch
+        # RETURN: frame index, len(self) if all frames are earlier
+        for block_number, block in enumerate(self.blocks):
+            if block[3] >= timestamp:
+                records = self.read_block(block_number)
+                for position, (frame_timestamp,) in enumerate(RECORD_TIMESTAMP_STRUCT.iter_unpack(records)):
+                    if frame_timestamp >= timestamp:
+                        return self.block_starts[block_number] + position
+        return self.numb_of_frames
+
+#*********************************************************************************************************
+def convert_capture(input_path, output_path, codec="zlib", level=None, block_frames=65536):
+    # FUNC: converting a capture file between the plain and the compressed format, by the extension of the output
+    # INPUT: input_path, output_path as string; the output must not exist
+    #        codec, level, block_frames (optional): settings of the compressed output, see CompressedCaptureWriter
+    # RETURN: number of converted frames
+    from capture_file import open_capture_reader, CAPTURE_HEADER_STRUCT, CAPTURE_MAGIC, CAPTURE_VERSION
+    if os.path.exists(output_path):
+        raise ValueError("output file %s exists" % output_path)
+    with open_capture_reader(input_path) as capture_reader:
+        numb_of_frames = len(capture_reader)
+        chunk_size = capture_reader.block_frames if isinstance(capture_reader, CompressedCaptureReader) else block_frames
+        if output_path.endswith(COMPRESSED_CAPTURE_EXTENSION):
+            with CompressedCaptureWriter(output_path, codec, level, block_frames, threaded=False,
+                                         start_time=capture_reader.start_time) as capture_writer:
+                for start in range(0, numb_of_frames, chunk_size):
+                    capture_writer.write_records(capture_reader.record_view(start, start + chunk_size))
+        else:
+            with open(output_path, 'wb') as output_file:
+                output_file.write(CAPTURE_HEADER_STRUCT.pack(CAPTURE_MAGIC, CAPTURE_VERSION, CAPTURE_RECORD_SIZE, 0,
+                                                             capture_reader.start_time))
+                for start in range(0, numb_of_frames, chunk_size):
+                    output_file.write(capture_reader.record_view(start, start + chunk_size))
+    return numb_of_frames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress, decompress or describe capture files of the Connector")
+    parser.add_argument("input", help="capture file, .cancap or .cancapz")
+    parser.add_argument("output", nargs="?", help="converted file, compressed if it ends with .cancapz; "
+                                                  "without output the blocks of the input are described")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="zlib")
+    parser.add_argument("--level", type=int, help="compression level 0..9, default 6")
+    parser.add_argument("--block-frames", type=int, default=65536, help="frames per block")
+    args = parser.parse_args(argv)
+    try:
+        if args.output:
+            start_time = time.monotonic()
+            numb_of_frames = convert_capture(args.input, args.output, args.codec, args.level, args.block_frames)
+            input_size, output_size = os.path.getsize(args.input), os.path.getsize(args.output)
+            print("%d frames converted in %.1f s, %d -> %d bytes (ratio %.1f)" % (
+                numb_of_frames, time.monotonic() - start_time, input_size, output_size,
+                input_size / output_size if output_size else 0))
+        else:
+            with CompressedCaptureReader(args.input) as capture_reader:
+                raw_size = len(capture_reader) * CAPTURE_RECORD_SIZE
+                file_size = os.path.getsize(args.input)
+                print("%d frames in %d blocks, codec %s level %d, %d bytes (ratio %.1f to .cancap)" % (
+                    len(capture_reader), len(capture_reader.blocks),
+                    {value: name for name, value in CODECS.items()}[capture_reader.codec], capture_reader.level,
+                    file_size, raw_size / file_size))
+    except (OSError, ValueError) as error:
+        print("error: %s" % error, file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,481 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from qt_application_backend import (
+    Connector, MessageLogger, MessageReceiver, IPv4AddressFilter, CanIdFilter, TIMESTAMP_MODE_KERNEL,
+    TIMESTAMP_MODE_MONOTONIC, CANETH_MAX_FRAMES_PER_DATAGRAM)
+
+# Headless entry point for unattended captures on lab servers and in containers. PyQt5 is only imported with --gui.
+# All settings can be given as arguments or in a JSON config file; arguments override the config file:
+# {
+#     "listen_ip": "0.0.0.0",
+#     "port": 4210,
+#     "target_ip": "192.168.0.240",
+#     "timestamp_mode": "kernel",
+#     "ipv4_whitelist": ["192.168.0.0/24"],
+#     "ipv4_blacklist": [],
+#     "id_whitelist": ["0x100-0x1FF", "0x18FEF100/0x1FFFFF00"],
+#     "id_blacklist": [],
+#     "record": "capture.cancap",
+#     "print_messages": false,
+#     "status_interval": 10,
+#     "pipeline": false,
+#     "metrics_port": 9108,
+#     "receive_buffer_size": 8388608,
+#     "shards": 1,
+#     "max_recent_messages": 10000,
+#     "ring_buffer": false,
+#     "transmit_rate": 3000,
+#     "transmit_burst": 20,
+#     "dbc": "vehicle.dbc",
+#     "trigger": {
+#         "conditions": [{"type": "id", "id": "0x7DF"},
+#                        {"type": "payload", "id": "0x100", "mask": "0080", "value": "0080"},
+#                        {"type": "signal", "message": "Engine", "signal": "EngineSpeed", "comparison": ">", "threshold": 6000},
+#                        {"type": "missing", "id": "0x100", "timeout": 0.05}],
+#         "pre_frames": 1000, "post_frames": 1000, "post_time": null, "rearm": true, "record": "trigger_%03d.cancap"
+#     },
+#     "cyclic_messages": [
+#         {"id": "0x100", "period": 0.01, "data": "0000000000000000", "counter_byte": 6, "counter_mask": "0x0F",
+#          "checksum_byte": 7, "checksum": "crc8"},
+#         {"id": "0x18FEF100", "ext": true, "period": 0.1, "offset": 0.005, "data": "FF00"}
+#     ]
+# }
+# A whitelist is enabled as soon as it has entries, otherwise the blacklist is used.
+# SIGTERM and SIGINT stop the capture cleanly, SIGHUP reloads the config file and reopens the capture file,
+# e.g. after it was moved away by a log rotation; a config which cannot be applied is rejected as a whole.
+# With "pipeline" the socket is owned by a dedicated receiver process, which hands the frames over a shared
+# memory ring (see shared_memory_pipeline.py). With "metrics_port"
+# the metrics are served in the Prometheus text format on http://127.0.0.1:<metrics_port>/metrics.
+# "receive_buffer_size" sets SO_RCVBUF of the socket(s); with "shards" > 1 that many SO_REUSEPORT sockets share the
+# port, each drained by its own thread (see sharded_connector.py). "shards" and "pipeline" are not changed by SIGHUP.
+# "cyclic_messages" are sent periodically to the target IP (see cyclic_scheduler.py); "offset" shifts the first cycle,
+# "counter_byte"/"counter_mask" add an alive counter and "checksum_byte"/"checksum" ("sum", "xor", "crc8") a checksum.
+# With "ring_buffer" the "max_recent_messages" are stored in a columnar ring buffer of 22 bytes per frame instead of
+# a deque of CanFrame objects (see frame_ring_buffer.py); both are not changed by SIGHUP.
+# "transmit_rate" limits the frames per second sent to the gateway with a token bucket of "transmit_burst" frames,
+# so the TX queue of the gateway is not overrun; 3000 is about 80 % of a 500 kbit/s bus with 8 byte frames.
+# With "dbc" the printed messages are followed by their decoded signals (see dbc_decoder.py).
+# With "trigger" the frames around rare events are recorded: any condition fires the trigger, the event with the
+# pre-trigger and post-trigger frames is written to "record" (%03d is replaced by the event number), see trigger_engine.py.
+# Signal conditions need the "dbc".
+# Capture files ending with .cancapz ("record" and the trigger "record") are block-compressed, see compressed_capture.py.
+
+DEFAULT_SETTINGS = {
+    "listen_ip": "0.0.0.0",
+    "port": 4210,
+    "target_ip": "192.168.0.240",
+    "timestamp_mode": TIMESTAMP_MODE_KERNEL,
+    "ipv4_whitelist": [],
+    "ipv4_blacklist": [],
+    "id_whitelist": [],
+    "id_blacklist": [],
+    "record": None,
+    "print_messages": False,
+    "status_interval": 10.0,
+    "max_recent_messages": 10000,
+    "ring_buffer": False,
+    "pipeline": False,
+    "metrics_port": None,
+    "receive_buffer_size": None,
+    "shards": 1,
+    "transmit_rate": None,
+    "transmit_burst": CANETH_MAX_FRAMES_PER_DATAGRAM,
+    "cyclic_messages": [],
+    "dbc": None,
+    "trigger": None,
+}
+
+#*********************************************************************************************************
+def load_settings(args):
+    # FUNC: merging the default settings, the config file and the arguments
+    # INPUT: args as argparse.Namespace
+    # RETURN: settings as dictionary with the keys of DEFAULT_SETTINGS
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+        unknown_keys = set(config) - set(DEFAULT_SETTINGS)
+        if unknown_keys:
+            raise ValueError("unknown settings in %s: %s" % (args.config, ", ".join(sorted(unknown_keys))))
+        settings.update(config)
+    for key in DEFAULT_SETTINGS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+    return settings
+
+#*********************************************************************************************************
+class CaptureDaemon:
+    # Runs the Connector, MessageLogger and MessageReceiver without GUI until it is stopped by a signal
+    def __init__(self, args):
+        # FUNC: initialize the CaptureDaemon class
+        # INPUT: args as argparse.Namespace of create_argument_parser
+        # RETURN: ---
+        self.args = args
+        self.settings = load_settings(args)
+        if self.settings["pipeline"]:
+            from shared_memory_pipeline import SharedRingConnector  # only needed for the pipeline mode
+            self.my_connector = SharedRingConnector(timestamp_mode=self.settings["timestamp_mode"],
+                                                    receive_buffer_size=self.settings["receive_buffer_size"],
+                                                    UDP_IP=self.settings["listen_ip"], shared_UDP_port=self.settings["port"])
+        elif self.settings["shards"] > 1:
+            from sharded_connector import ShardedConnector  # only needed for several sockets
+            self.my_connector = ShardedConnector(self.settings["shards"], timestamp_mode=self.settings["timestamp_mode"],
+                                                 receive_buffer_size=self.settings["receive_buffer_size"],
+                                                 UDP_IP=self.settings["listen_ip"], shared_UDP_port=self.settings["port"])
+        else:
+            self.my_connector = Connector(timestamp_mode=self.settings["timestamp_mode"],
+                                          receive_buffer_size=self.settings["receive_buffer_size"],
+                                          UDP_IP=self.settings["listen_ip"], shared_UDP_port=self.settings["port"])
+        storage_factory = None
+        if self.settings["ring_buffer"]:
+            from frame_ring_buffer import FrameRingBuffer  # only needed for the ring buffer storage
+            storage_factory = FrameRingBuffer
+        self.my_msg_logger = MessageLogger(max_recent_messages=self.settings["max_recent_messages"],
+                                           storage_factory=storage_factory)
+        self.my_message_receiver = MessageReceiver(self.my_connector, self.my_msg_logger)
+        self.receiver_thread = None
+        self.metrics_server = None
+        self.my_scheduler = None
+        self.my_signal_database = None
+        self.stop_requested = False
+        self.reload_requested = False
+        self.apply_settings(self.settings)
+
+    def apply_settings(self, settings):
+        # FUNC: configuring socket, target IP, filters and recording from the settings. Everything which can fail is
+        #       built and validated first and only swapped in when all of it succeeded, so settings which cannot be
+        #       applied leave the running configuration and self.settings unchanged
+        # INPUT: settings as dictionary of load_settings
+        # RETURN: ---
+        if settings["timestamp_mode"] not in (TIMESTAMP_MODE_KERNEL, TIMESTAMP_MODE_MONOTONIC):
+            raise ValueError("unknown time stamp mode: %s" % settings["timestamp_mode"])
+        IPv4_filter = IPv4AddressFilter()
+        for entry in settings["ipv4_whitelist"]:
+            IPv4_filter.whitelist_add_IPv4_address(entry)
+        for entry in settings["ipv4_blacklist"]:
+            IPv4_filter.blacklist_add_IPv4_address(entry)
+        if settings["ipv4_whitelist"]:
+            IPv4_filter.enable_whitelist_IPv4_address()
+        msgID_filter = CanIdFilter()
+        for entry in settings["id_whitelist"]:
+            msgID_filter.add_msgID_filter_entries(str(entry), whitelist=True)
+        for entry in settings["id_blacklist"]:
+            msgID_filter.add_msgID_filter_entries(str(entry), whitelist=False)
+        if settings["id_whitelist"]:
+            msgID_filter.enable_whitelist_msgID()
+        cyclic_messages = self.build_cyclic_messages(settings)
+        signal_database = None
+        if settings["dbc"]:
+            from dbc_decoder import load_dbc  # only needed for the signal decoding
+            signal_database = load_dbc(settings["dbc"])
+            signal_database.compile_all()
+        trigger_engine = self.build_trigger_engine(settings, signal_database)
+        capture_writer = self.open_capture_file(settings)
+
+        try:
+            self.save_trigger_events()  # the events of the previous trigger engine, with the previous settings
+            self.apply_socket_settings(settings)
+        except BaseException:
+            if capture_writer is not self.my_msg_logger.capture_writer and capture_writer is not None:
+                capture_writer.close()
+            raise
+
+        # nothing below fails, the new configuration is swapped in
+        self.my_connector.set_timestamp_mode(settings["timestamp_mode"])
+        self.my_connector.updated_target_IP(settings["target_ip"])
+        self.my_connector.set_transmit_rate(settings["transmit_rate"], settings["transmit_burst"])
+        self.my_connector.load_IPv4_filter(IPv4_filter)
+        self.my_msg_logger.load_msgID_filter(msgID_filter)
+        previous_capture_writer = self.my_msg_logger.set_capture_writer(capture_writer)
+        if previous_capture_writer is not None and previous_capture_writer is not capture_writer:
+            previous_capture_writer.close()
+        self.apply_cyclic_messages(cyclic_messages)
+        self.my_signal_database = signal_database
+        self.my_message_receiver.my_trigger_engine = trigger_engine
+        self.settings = settings
+
+    def apply_socket_settings(self, settings):
+        # FUNC: applying the receive buffer size and the listen address, the previous ones are restored on failure
+        # INPUT: settings as dictionary of load_settings
+        # RETURN: ---
+        previous_receive_buffer_size = self.my_connector.receive_buffer_size
+        try:
+            if settings["receive_buffer_size"] != previous_receive_buffer_size:
+                self.my_connector.set_receive_buffer_size(settings["receive_buffer_size"])
+            if self.my_connector.get_UDP_socket_info() != (settings["listen_ip"], settings["port"]):
+                # update_UDP_socket keeps listening on the previous address if the new one cannot be bound
+                self.my_connector.update_UDP_socket(settings["listen_ip"], settings["port"])
+        except OSError:
+            if self.my_connector.receive_buffer_size != previous_receive_buffer_size:
+                self.my_connector.set_receive_buffer_size(previous_receive_buffer_size)
+            raise
+
+    def open_capture_file(self, settings):
+        # FUNC: opening the capture file of the settings. The running capture writer is kept if it already writes to
+        #       this file, a file which was moved away (e.g. by logrotate) or a new path is opened again
+        # INPUT: settings as dictionary of load_settings
+        # RETURN: capture writer or None
+        if not settings["record"]:
+            return None
+        capture_writer = self.my_msg_logger.capture_writer
+        if capture_writer is not None and os.path.exists(settings["record"]):
+            if os.path.samestat(os.fstat(capture_writer.file.fileno()), os.stat(settings["record"])):
+                return capture_writer
+        from capture_file import create_capture_writer  # only needed for recording
+        return create_capture_writer(settings["record"])
+
+    def build_cyclic_messages(self, settings):
+        # FUNC: parsing the cyclic messages of the settings
+        # INPUT: settings as dictionary of load_settings
+        # RETURN: list of tuples (can_id, period, payload, offset, ext_flag) for CyclicScheduler.add_message
+        if not settings["cyclic_messages"]:
+            return []
+        from cyclic_scheduler import CounterPayload, ChecksumPayload  # only needed for cyclic messages
+        messages = []
+        for entry in settings["cyclic_messages"]:
+            try:
+                can_id = int(str(entry["id"]), 0)
+                payload = bytes.fromhex(entry.get("data", ""))
+                if entry.get("counter_byte") is not None:
+                    payload = CounterPayload(payload, int(entry["counter_byte"]), int(str(entry.get("counter_mask", 0xFF)), 0))
+                if entry.get("checksum_byte") is not None:
+                    payload = ChecksumPayload(payload, int(entry["checksum_byte"]), entry.get("checksum", "sum"))
+                period = float(entry["period"])
+                offset = float(entry.get("offset", 0.0))
+            except (KeyError, TypeError) as error:
+                raise ValueError("invalid cyclic message %r: %s" % (entry, error))
+            if period <= 0 or offset < 0:
+                raise ValueError("invalid cyclic message %r: period must be positive, offset not negative" % (entry,))
+            messages.append((can_id, period, payload, offset, bool(entry.get("ext", False))))
+        return messages
+
+    def apply_cyclic_messages(self, messages):
+        # FUNC: replacing the cyclic messages of the scheduler
+        # INPUT: messages as list of build_cyclic_messages
+        # RETURN: ---
+        if not messages and self.my_scheduler is None:
+            return
+        if self.my_scheduler is None:
+            from cyclic_scheduler import CyclicScheduler  # only needed for cyclic messages
+            self.my_scheduler = CyclicScheduler(self.my_connector)
+        self.my_scheduler.clear_messages()
+        for can_id, period, payload, offset, ext_flag in messages:
+            self.my_scheduler.add_message(can_id, period, payload, offset, ext_flag)
+
+    def build_trigger_engine(self, settings, signal_database):
+        # FUNC: creating and arming the trigger engine of the settings
+        # INPUT: settings as dictionary of load_settings
+        #        signal_database as SignalDatabase or None, needed by signal conditions
+        # RETURN: TriggerEngine or None
+        trigger_settings = settings["trigger"]
+        if not trigger_settings:
+            return None
+        from trigger_engine import (TriggerEngine, IdCondition, PayloadCondition, SignalCondition,
+                                    MissingCycleCondition)  # only needed for triggered recording
+        trigger_engine = TriggerEngine(trigger_settings.get("pre_frames", 1000), trigger_settings.get("post_frames", 1000),
+                                       trigger_settings.get("post_time"), trigger_settings.get("rearm", False))
+        for entry in trigger_settings.get("conditions", []):
+            try:
+                condition_type = entry["type"]
+                if condition_type == "signal":
+                    if signal_database is None:
+                        raise ValueError("signal trigger conditions need a dbc")
+                    condition = SignalCondition(signal_database, entry["message"], entry["signal"],
+                                                entry.get("comparison", ">"), entry["threshold"])
+                else:
+                    can_id = int(str(entry["id"]), 0)
+                    ext = bool(entry.get("ext", False))
+                    if condition_type == "id":
+                        condition = IdCondition(can_id, ext)
+                    elif condition_type == "payload":
+                        condition = PayloadCondition(can_id, bytes.fromhex(entry["mask"]), bytes.fromhex(entry["value"]), ext)
+                    elif condition_type == "missing":
+                        condition = MissingCycleCondition(can_id, float(entry["timeout"]), ext)
+                    else:
+                        raise ValueError("unknown trigger condition type: %s" % condition_type)
+            except (KeyError, TypeError) as error:
+                raise ValueError("invalid trigger condition %r: %s" % (entry, error))
+            trigger_engine.add_condition(condition)
+        trigger_engine.arm()
+        return trigger_engine
+
+    def save_trigger_events(self):
+        # FUNC: logging the completed trigger events and writing them to their capture files
+        # INPUT: ---
+        # RETURN: ---
+        trigger_engine = self.my_message_receiver.my_trigger_engine
+        if trigger_engine is None:
+            return
+        for event in trigger_engine.take_events():
+            self.log(event.format_line())
+            record = (self.settings["trigger"] or {}).get("record")
+            if record:
+                from trigger_engine import write_trigger_event
+                file_path = record % event.index if "%" in record else record  # e.g. "trigger_%03d.cancap"
+                write_trigger_event(event, file_path)
+                self.log("trigger %d recorded to %s" % (event.index, file_path))
+
+    def request_stop(self, signum=None, frame=None):
+        # signal handler of SIGTERM and SIGINT, the main loop does the shutdown
+        self.stop_requested = True
+
+    def request_reload(self, signum=None, frame=None):
+        # signal handler of SIGHUP, the main loop does the reload
+        self.reload_requested = True
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if hasattr(signal, "SIGHUP"):  # not available on Windows
+            signal.signal(signal.SIGHUP, self.request_reload)
+
+    def reload(self):
+        # FUNC: reading the config file again and applying it, a moved capture file is reopened
+        # INPUT: ---
+        # RETURN: ---
+        self.reload_requested = False
+        try:
+            self.apply_settings(load_settings(self.args))
+        except (OSError, ValueError) as error:
+            # a broken config file must not stop an unattended capture, the previous settings stay active
+            self.log("reload failed: %s" % error)
+            return
+        self.log("settings reloaded")
+
+    def log(self, text):
+        print(time.strftime("%Y-%m-%d %H:%M:%S ") + text, file=sys.stderr, flush=True)
+
+    def run(self):
+        # FUNC: capturing until SIGTERM or SIGINT
+        # INPUT: ---
+        # RETURN: exit code
+        self.install_signal_handlers()
+        self.my_message_receiver.start()
+        self.receiver_thread = threading.Thread(target=self.my_message_receiver.run, name="MessageReceiver", daemon=True)
+        self.receiver_thread.start()
+        self.log("listening on %s:%d" % self.my_connector.get_UDP_socket_info())
+        if self.my_scheduler is not None:
+            self.my_scheduler.start()
+            self.log("sending %d cyclic messages to %s" % (len(self.my_scheduler), self.settings["target_ip"]))
+        if self.my_connector.effective_receive_buffer_size:
+            self.log("receive buffer %d bytes" % self.my_connector.effective_receive_buffer_size)
+        if self.settings["metrics_port"] is not None:
+            from connector_metrics import create_registry, MetricsHTTPServer  # only needed for the metrics endpoint
+            registry = create_registry(self.my_connector, self.my_msg_logger, self.my_message_receiver)
+            self.metrics_server = MetricsHTTPServer(registry, port=self.settings["metrics_port"])
+            self.metrics_server.start()
+            self.log("metrics on http://%s:%d/metrics" % self.metrics_server.get_address())
+
+        last_status_time = time.monotonic()
+        last_numb_of_messages = 0
+        while not self.stop_requested:
+            time.sleep(0.2)  # signals interrupt the sleep
+            if self.reload_requested:
+                self.reload()
+            recent_messages, _ = self.my_message_receiver.take_new_messages()
+            self.save_trigger_events()
+            if self.settings["print_messages"]:
+                if self.my_signal_database is not None:
+                    format_signals = self.my_signal_database.format_signals
+                    sys.stdout.write("".join(message.format_line() + "\t" + format_signals(message) + "\n"
+                                             for message in recent_messages))
+                else:
+                    sys.stdout.write("".join(message.format_line() + "\n" for message in recent_messages))
+                sys.stdout.flush()
+            now = time.monotonic()
+            if self.settings["status_interval"] and now - last_status_time >= self.settings["status_interval"]:
+                numb_of_messages = self.my_message_receiver.numb_of_accepted_messages
+                self.log("%d messages received, %.0f messages/s" % (
+                    numb_of_messages, (numb_of_messages - last_numb_of_messages) / (now - last_status_time)))
+                last_status_time = now
+                last_numb_of_messages = numb_of_messages
+
+        self.shutdown()
+        return 0
+
+    def shutdown(self):
+        # FUNC: stopping the receiver and closing the capture file and the socket
+        # INPUT: ---
+        # RETURN: ---
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.my_scheduler is not None:
+            self.my_scheduler.stop()
+            for statistics in self.my_scheduler.get_statistics():
+                self.log("cyclic 0x%X: %d frames, max lateness %.0f us, jitter %.0f us, %d skipped cycles" % (
+                    statistics["can_id"], statistics["frames"], statistics["max_lateness_us"],
+                    statistics["jitter_us"], statistics["skipped_cycles"]))
+        transmit_statistics = self.my_connector.get_transmit_statistics()
+        if transmit_statistics["sent_frames"]:
+            self.log("sent %d frames in %d datagrams, %d datagrams delayed by the rate limit for %.1f s" % (
+                transmit_statistics["sent_frames"], transmit_statistics["sent_datagrams"],
+                transmit_statistics["delayed_datagrams"], transmit_statistics["wait_time"]))
+        self.my_message_receiver.stop()
+        if self.receiver_thread is not None:
+            self.receiver_thread.join()
+        self.save_trigger_events()
+        capture_writer = self.my_msg_logger.set_capture_writer(None)
+        if capture_writer is not None:
+            capture_writer.close()
+        self.my_connector.close()
+        self.log("stopped after %d messages" % self.my_message_receiver.numb_of_accepted_messages)
+
+#*********************************************************************************************************
+def create_argument_parser():
+    parser = argparse.ArgumentParser(description="Headless CANeth capture with the Connector")
+    parser.add_argument("--config", help="JSON config file, reloaded on SIGHUP")
+    parser.add_argument("--listen-ip", dest="listen_ip", help="IP to listen on, defaults to 0.0.0.0")
+    parser.add_argument("--port", type=int, help="UDP port, defaults to 4210")
+    parser.add_argument("--target-ip", dest="target_ip", help="IP of the gateway messages are sent to")
+    parser.add_argument("--timestamp-mode", dest="timestamp_mode", choices=(TIMESTAMP_MODE_KERNEL, TIMESTAMP_MODE_MONOTONIC))
+    parser.add_argument("--ipv4-whitelist", dest="ipv4_whitelist", action="append",
+                        help="whitelisted IPv4 address or subnet, can be repeated")
+    parser.add_argument("--ipv4-blacklist", dest="ipv4_blacklist", action="append",
+                        help="blacklisted IPv4 address or subnet, can be repeated")
+    parser.add_argument("--id-whitelist", dest="id_whitelist", action="append",
+                        help="whitelisted CAN-IDs, ranges or code/mask pairs, can be repeated")
+    parser.add_argument("--id-blacklist", dest="id_blacklist", action="append",
+                        help="blacklisted CAN-IDs, ranges or code/mask pairs, can be repeated")
+    parser.add_argument("--record", help="capture file all accepted messages are recorded to")
+    parser.add_argument("--print", dest="print_messages", action="store_const", const=True,
+                        help="print the accepted messages to stdout")
+    parser.add_argument("--status-interval", dest="status_interval", type=float,
+                        help="seconds between two status lines on stderr, 0 disables them")
+    parser.add_argument("--ring-buffer", dest="ring_buffer", action="store_const", const=True,
+                        help="store the recent messages in a columnar ring buffer instead of a deque")
+    parser.add_argument("--pipeline", action="store_const", const=True,
+                        help="receive in a dedicated process and hand the frames over a shared memory ring")
+    parser.add_argument("--metrics-port", dest="metrics_port", type=int,
+                        help="serve the metrics in the Prometheus text format on this local TCP port")
+    parser.add_argument("--receive-buffer-size", dest="receive_buffer_size", type=int,
+                        help="SO_RCVBUF of the socket in bytes, raised with SO_RCVBUFFORCE if permitted")
+    parser.add_argument("--shards", type=int,
+                        help="number of SO_REUSEPORT sockets receiving on the port, each in its own thread")
+    parser.add_argument("--transmit-rate", dest="transmit_rate", type=float,
+                        help="maximum frames per second sent to the gateway, defaults to unlimited")
+    parser.add_argument("--dbc", help="DBC file, the printed messages are followed by their decoded signals")
+    parser.add_argument("--gui", action="store_true", help="start the GUI instead of a headless capture")
+    return parser
+
+def main(argv=None):
+    args = create_argument_parser().parse_args(argv)
+    if args.gui:
+        import qt_application_frontend  # PyQt5 is only imported for the GUI
+        return qt_application_frontend.main(sys.argv[:1], use_shared_memory_pipeline=bool(args.pipeline),
+                                            use_ring_buffer=bool(args.ring_buffer))
+    try:
+        daemon = CaptureDaemon(args)
+    except (OSError, ValueError) as error:
+        print("error: %s" % error, file=sys.stderr)
+        return 2
+    return daemon.run()
+
+if __name__ == "__main__":
+    sys.exit(main())
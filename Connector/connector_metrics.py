@@ -0,0 +1,273 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metrics of the receive path. The Connector, MessageLogger and MessageReceiver only increase plain integer
+# counters and fill LatencyHistograms (qt_application_backend.py); the registry reads them when a snapshot
+# is taken, so the metrics cost nothing on the receive path beyond the increments and can stay enabled in production.
+
+#*********************************************************************************************************
+class MetricsRegistry:
+    # Collection of named counters, gauges and histograms with a snapshot API and the Prometheus text format
+    def __init__(self, prefix="caneth_"):
+        # FUNC: initialize the MetricsRegistry class
+        # INPUT: prefix (string, optional): prefix of all metric names. Defaults to "caneth_".
+        # RETURN: ---
+        self.prefix = prefix
+        self.metrics = []  # tuples (name, type, help text, getter, label name)
+        self.last_counters = {}
+        self.last_rate_time = None
+
+    def add_counter(self, name, help_text, getter, label_name=None):
+        # FUNC: adding a counter
+        # INPUT: name as string; e.g.: "received_datagrams_total"
+        #        help_text as string
+        #        getter as callable returning an int, or a dictionary label value -> int if label_name is given
+        #        label_name (string, optional): name of the label of a labeled counter; e.g.: "gateway"
+        # RETURN: ---
+        self.metrics.append((self.prefix + name, "counter", help_text, getter, label_name))
+
+    def add_gauge(self, name, help_text, getter, label_name=None):
+        # FUNC: adding a gauge, see add_counter
+        self.metrics.append((self.prefix + name, "gauge", help_text, getter, label_name))
+
+    def add_histogram(self, name, help_text, getter):
+        # FUNC: adding a histogram
+        # INPUT: name as string; e.g.: "receive_latency_seconds"
+        #        help_text as string
+        #        getter as callable returning a LatencyHistogram
+        # RETURN: ---
+        self.metrics.append((self.prefix + name, "histogram", help_text, getter, None))
+
+    def snapshot(self):
+        # FUNC: returns the current values of all metrics
+        # INPUT: ---
+        # RETURN: dictionary name -> int, dictionary label value -> int for labeled metrics, or for histograms
+        #         a dictionary with count, sum_ns, p50_ns, p99_ns and buckets (upper bound in ns -> count)
+        values = {}
+        for name, metric_type, _, getter, _ in self.metrics:
+            value = getter()
+            if metric_type == "histogram":
+                values[name] = {
+                    "count": value.count,
+                    "sum_ns": value.sum,
+                    "p50_ns": value.get_percentile(0.5),
+                    "p99_ns": value.get_percentile(0.99),
+                    "buckets": dict(zip(value.get_bucket_bounds(), value.bucket_counts)),
+                }
+            elif isinstance(value, dict):
+                values[name] = dict(value)
+            else:
+                values[name] = value
+        return values
+
+    def get_rates(self):
+        # FUNC: returns the rates of all counters per second since the last call, e.g. the per gateway rates
+        # INPUT: ---
+        # RETURN: dictionary name -> float, or label value -> float for labeled counters; empty on the first call
+        now = time.monotonic()
+        counters = {name: getter() for name, metric_type, _, getter, _ in self.metrics if metric_type == "counter"}
+        counters = {name: dict(value) if isinstance(value, dict) else value for name, value in counters.items()}
+        rates = {}
+        if self.last_rate_time is not None and now > self.last_rate_time:
+            interval = now - self.last_rate_time
+            for name, value in counters.items():
+                last_value = self.last_counters.get(name)
+                if isinstance(value, dict):
+                    last_value = last_value or {}
+                    rates[name] = {label: (count - last_value.get(label, 0)) / interval for label, count in value.items()}
+                else:
+                    rates[name] = (value - (last_value or 0)) / interval
+        self.last_counters = counters
+        self.last_rate_time = now
+        return rates
+
+    def render_prometheus(self):
+        # FUNC: returns all metrics in the Prometheus text exposition format, latencies in seconds
+        # INPUT: ---
+        # RETURN: string
+        lines = []
+        for name, metric_type, help_text, getter, label_name in self.metrics:
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, metric_type))
+            value = getter()
+            if metric_type == "histogram":
+                cumulative_count = 0
+                for bound, bucket_count in zip(value.get_bucket_bounds(), value.bucket_counts):
+                    cumulative_count += bucket_count
+                    lines.append('%s_bucket{le="%s"} %d' % (name, "+Inf" if bound is None else repr(bound / 1e9), cumulative_count))
+                lines.append("%s_sum %r" % (name, value.sum / 1e9))
+                lines.append("%s_count %d" % (name, value.count))
+            elif isinstance(value, dict):
+                for label, labeled_value in sorted(value.items()):
+                    lines.append('%s{%s="%s"} %s' % (name, label_name, label, labeled_value))
+            else:
+                lines.append("%s %s" % (name, value))
+        return "\n".join(lines) + "\n"
+
+#*********************************************************************************************************
+def connector_value(connector, name):
+    # returns a getter of a Connector counter, summed over all sockets of a ShardedConnector and read from the
+    # receiver process of a SharedRingConnector
+    if hasattr(connector, "read_socket_counters"):
+        return lambda: connector.read_socket_counters()[name]
+    if hasattr(connector, "shards"):
+        return lambda: sum(getattr(shard, name) for shard in connector.shards)
+    return lambda: getattr(connector, name)
+
+def connector_datagrams_per_gateway(connector):
+    # returns the received datagrams per gateway, merged over all sockets of a ShardedConnector
+    datagrams_per_gateway = {}
+    for shard in getattr(connector, "shards", [connector]):
+        for gateway, count in list(shard.datagrams_per_gateway.items()):
+            datagrams_per_gateway[gateway] = datagrams_per_gateway.get(gateway, 0) + count
+    return datagrams_per_gateway
+
+def register_connector(registry, connector):
+    # FUNC: adding the metrics of a Connector
+    # INPUT: registry as MetricsRegistry, connector as Connector, ShardedConnector or SharedRingConnector
+    # RETURN: ---
+    blacklisted = connector_value(connector, "numb_of_blacklisted_datagrams")
+    not_whitelisted = connector_value(connector, "numb_of_not_whitelisted_datagrams")
+    registry.add_counter("received_datagrams_total", "Received caneth datagrams.",
+                         connector_value(connector, "numb_of_received_datagrams"))
+    registry.add_counter("accepted_datagrams_total", "Datagrams accepted by the IPv4 filter and decoded.",
+                         connector_value(connector, "numb_of_accepted_datagrams"))
+    registry.add_counter("accepted_frames_total", "CAN frames of the accepted datagrams.",
+                         connector_value(connector, "numb_of_accepted_frames"))
+    registry.add_counter("ip_filtered_datagrams_total", "Datagrams rejected by the IPv4 filter.",
+                         lambda: {"blacklist": blacklisted(), "whitelist": not_whitelisted()}, "filter")
+    registry.add_counter("malformed_datagrams_total", "Datagrams with a wrong magic id or too short.",
+                         connector_value(connector, "numb_of_malformed_datagrams"))
+    registry.add_counter("receive_timeouts_total", "Receive calls without a datagram within the timeout.",
+                         lambda: connector.numb_of_timeouts)
+    registry.add_counter("kernel_dropped_datagrams_total", "Datagrams dropped by the kernel, socket buffer full (SO_RXQ_OVFL).",
+                         connector.get_numb_of_kernel_dropped_datagrams)
+    registry.add_counter("gateway_datagrams_total", "Received datagrams per gateway IP.",
+                         lambda: connector_datagrams_per_gateway(connector), "gateway")
+    registry.add_gauge("receive_buffer_bytes", "Effective receive buffer size of the socket.",
+                       lambda: connector.effective_receive_buffer_size)
+    registry.add_counter("sent_frames_total", "CAN frames sent to the gateways.",
+                         lambda: connector.numb_of_sent_frames)
+    registry.add_counter("sent_datagrams_total", "Caneth datagrams sent to the gateways.",
+                         lambda: connector.numb_of_sent_datagrams)
+    registry.add_counter("transmit_delayed_datagrams_total", "Datagrams delayed by the transmit rate limit.",
+                         lambda: connector.get_transmit_statistics()["delayed_datagrams"])
+    registry.add_counter("transmit_wait_seconds_total", "Time senders waited for the transmit rate limit.",
+                         lambda: connector.get_transmit_statistics()["wait_time"])
+    if hasattr(connector, "shards"):  # ShardedConnector
+        registry.add_histogram("receive_latency_seconds", "Receive time stamp of the oldest datagram of a batch until decoded.",
+                               connector.get_merged_receive_latency)
+        registry.add_gauge("shard_queued_batches", "Batches of the receiver workers not merged yet.",
+                           connector.shard_queue.qsize)
+        registry.add_counter("shard_dropped_batches_total", "Batches dropped because the merge queue was full.",
+                             lambda: connector.numb_of_dropped_batches)
+    else:
+        registry.add_histogram("receive_latency_seconds", "Receive time stamp of the oldest datagram of a batch until decoded.",
+                               lambda: connector.receive_latency)
+    if hasattr(connector, "my_reader"):  # SharedRingConnector
+        registry.add_gauge("ring_pending_frames", "Frames in the shared memory ring not read yet.",
+                           connector.my_reader.numb_of_pending_frames)
+        registry.add_counter("ring_lost_frames_total", "Frames overwritten in the shared memory ring before they were read.",
+                             connector.get_numb_of_lost_frames)
+
+def get_capacity(maxlen):
+    # capacity of a MessageLogger buffer, None stores all messages
+    return float("inf") if maxlen is None else maxlen
+
+def register_message_logger(registry, message_logger):
+    # FUNC: adding the metrics of a MessageLogger
+    # INPUT: registry as MetricsRegistry, message_logger as MessageLogger
+    # RETURN: ---
+    registry.add_counter("id_filtered_frames_total", "Frames rejected by the CAN-ID filter.",
+                         lambda: message_logger.numb_of_ID_filtered_messages)
+    registry.add_gauge("logger_buffer_frames", "Frames stored in the buffers of the MessageLogger.",
+                       lambda: {"recent": len(message_logger.recent_messages), "exact": len(message_logger.exact_messages)},
+                       "buffer")
+    registry.add_gauge("logger_buffer_capacity_frames", "Capacity of the buffers of the MessageLogger.",
+                       lambda: {"recent": get_capacity(message_logger.max_recent_messages),
+                                "exact": get_capacity(message_logger.exact_message_count)},
+                       "buffer")
+    registry.add_counter("capture_dropped_frames_total", "Frames dropped because the capture writer could not keep up.",
+                         lambda: message_logger.capture_writer.numb_of_dropped_frames if message_logger.capture_writer else 0)
+    registry.add_gauge("capture_queued_batches", "Batches queued for the capture writer thread.",
+                       lambda: message_logger.capture_writer.record_queue.qsize() if message_logger.capture_writer else 0)
+
+def register_message_receiver(registry, message_receiver):
+    # FUNC: adding the metrics of a MessageReceiver
+    # INPUT: registry as MetricsRegistry, message_receiver as MessageReceiver
+    # RETURN: ---
+    registry.add_counter("receiver_accepted_frames_total", "Frames accepted by both filters.",
+                         lambda: message_receiver.numb_of_accepted_messages)
+    registry.add_counter("receiver_batches_total", "Processed receive batches.",
+                         lambda: message_receiver.numb_of_batches)
+    registry.add_gauge("receiver_pending_frames", "Frames waiting for the next GUI refresh tick.",
+                       lambda: {"recent": len(message_receiver.new_recent_messages),
+                                "logged": len(message_receiver.new_logged_messages)}, "buffer")
+    registry.add_gauge("trace_ids", "CAN-IDs in the fixed trace.", lambda: len(message_receiver.my_trace))
+    registry.add_histogram("processing_latency_seconds", "Filtering, logging and tracing of one batch.",
+                           lambda: message_receiver.processing_latency)
+    registry.add_histogram("end_to_end_latency_seconds", "Receive time stamp of the oldest frame of a batch until handed to the GUI.",
+                           lambda: message_receiver.end_to_end_latency)
+
+def create_registry(connector=None, message_logger=None, message_receiver=None):
+    # FUNC: creating a registry with the metrics of the given components
+    # INPUT: connector, message_logger, message_receiver (optional)
+    # RETURN: MetricsRegistry
+    registry = MetricsRegistry()
+    if connector is not None:
+        register_connector(registry, connector)
+    if message_logger is not None:
+        register_message_logger(registry, message_logger)
+    if message_receiver is not None:
+        register_message_receiver(registry, message_receiver)
+    return registry
+
+#*********************************************************************************************************
+class MetricsHTTPServer:
+    # Local HTTP endpoint serving the metrics of a registry in the Prometheus text format under /metrics
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        # FUNC: initialize the MetricsHTTPServer class
+        # INPUT: registry as MetricsRegistry
+        #        host (string, optional): IP to listen on. Defaults to localhost only.
+        #        port (int, optional): TCP port, 0 for a free port. Defaults to 9108.
+        # RETURN: ---
+        self.my_registry = registry
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass  # no log line per scrape
+
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server_thread = None
+
+    def get_address(self):
+        # FUNC: returns the address the server is listening on
+        # RETURN: tuple (host, port)
+        return self.server.server_address[:2]
+
+    def start(self):
+        # FUNC: serving in a background thread
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name="MetricsHTTPServer", daemon=True)
+        self.server_thread.start()
+
+    def stop(self):
+        # FUNC: stopping the server
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server_thread is not None:
+            self.server_thread.join()
+
+#*********************************************************************************************************
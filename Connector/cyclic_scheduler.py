@@ -0,0 +1,383 @@
+import heapq
+import math
+import threading
+import time
+
+# Cyclic transmit of many periodic CAN messages, e.g. to simulate the cyclic output of a complete ECU through a gateway.
+# All messages share one timer heap of absolute deadlines (time.monotonic_ns), so the periods do not drift with
+# sleep inaccuracies, and all frames which are due together are sent in one caneth datagram.
+
+CRC8_SAE_J1850_POLYNOMIAL = 0x1D
+
+def create_crc8_table(polynomial):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8_SAE_J1850_TABLE = create_crc8_table(CRC8_SAE_J1850_POLYNOMIAL)
+
+#*********************************************************************************************************
+class CounterPayload:
+    # Payload generator with an alive counter: the bits of counter_mask in byte counter_byte count up every cycle
+    # and wrap around, all other bits keep the value of data; e.g. counter_mask=0x0F for a 4 bit counter.
+    def __init__(self, data, counter_byte=0, counter_mask=0xFF):
+        # FUNC: initialize the CounterPayload class
+        # INPUT: data as byte-string with up to 8 bytes; e.g.: b'\x00\x10\x20\x30'
+        #        counter_byte (int, optional): index of the counter byte. Defaults to 0.
+        #        counter_mask (int, optional): bits of the counter in the counter byte. Defaults to 0xFF.
+        # RETURN: ---
+        if not 0 <= counter_byte < len(data):
+            raise ValueError("counter byte %d outside of the %d data bytes" % (counter_byte, len(data)))
+        if not 0 < counter_mask <= 0xFF:
+            raise ValueError("counter mask must be between 0x01 and 0xFF")
+        self.data = bytearray(data)
+        self.counter_byte = counter_byte
+        self.counter_mask = counter_mask
+        self.counter_shift = (counter_mask & -counter_mask).bit_length() - 1  # lowest bit of the counter
+        self.counter_modulo = (counter_mask >> self.counter_shift) + 1
+
+    def __call__(self, cycle):
+        # FUNC: returns the payload of a cycle
+        # INPUT: cycle as int, number of the cycle counted from 0
+        # RETURN: payload as byte-string
+        data = self.data
+        counter = (cycle % self.counter_modulo) << self.counter_shift
+        data[self.counter_byte] = (data[self.counter_byte] & ~self.counter_mask & 0xFF) | (counter & self.counter_mask)
+        return bytes(data)
+
+#*********************************************************************************************************
+class ChecksumPayload:
+    # Payload generator which writes a checksum over all other payload bytes into byte checksum_byte.
+    # The wrapped payload is a byte-string or another generator, e.g. a CounterPayload for counter and checksum.
+    # Algorithms:
+    #   "sum":   sum of the bytes modulo 256
+    #   "xor":   XOR of the bytes
+    #   "crc8":  CRC-8 SAE J1850 (polynomial 0x1D, start and final XOR 0xFF), as in the AUTOSAR E2E profile 1
+    # With data_id the low byte of the CAN-ID (or any data ID) is included in front of the payload bytes.
+    def __init__(self, payload, checksum_byte=7, algorithm="sum", data_id=None):
+        # FUNC: initialize the ChecksumPayload class
+        # INPUT: payload as byte-string or generator called with the cycle
+        #        checksum_byte (int, optional): index of the checksum byte. Defaults to 7.
+        #        algorithm (str, optional): "sum", "xor" or "crc8". Defaults to "sum".
+        #        data_id (int, optional): byte included in the checksum before the payload. Defaults to None.
+        # RETURN: ---
+        if algorithm not in ("sum", "xor", "crc8"):
+            raise ValueError("unknown checksum algorithm: %s" % algorithm)
+        if not callable(payload) and not 0 <= checksum_byte < len(payload):
+            raise ValueError("checksum byte %d outside of the %d data bytes" % (checksum_byte, len(payload)))
+        self.payload = payload
+        self.checksum_byte = checksum_byte
+        self.algorithm = algorithm
+        self.data_id = data_id
+
+    def calculate_checksum(self, data):
+        # FUNC: returns the checksum of data without the checksum byte
+        # INPUT: data as byte-string or bytearray
+        # RETURN: checksum as int
+        checked_bytes = bytes(data[:self.checksum_byte]) + bytes(data[self.checksum_byte + 1:])
+        if self.data_id is not None:
+            checked_bytes = bytes((self.data_id & 0xFF,)) + checked_bytes
+        if self.algorithm == "sum":
+            return sum(checked_bytes) & 0xFF
+        checksum = 0xFF if self.algorithm == "crc8" else 0
+        for byte in checked_bytes:
+            checksum = CRC8_SAE_J1850_TABLE[checksum ^ byte] if self.algorithm == "crc8" else checksum ^ byte
+        return checksum ^ 0xFF if self.algorithm == "crc8" else checksum
+
+    def __call__(self, cycle):
+        # FUNC: returns the payload of a cycle with the checksum
+        # INPUT: cycle as int, number of the cycle counted from 0
+        # RETURN: payload as byte-string
+        data = bytearray(self.payload(cycle) if callable(self.payload) else self.payload)
+        data[self.checksum_byte] = self.calculate_checksum(data)
+        return bytes(data)
+
+#*********************************************************************************************************
+class CyclicMessage:
+    # One periodic message of the CyclicScheduler with its timing statistics. The lateness of a cycle is the
+    # time between its deadline and the moment it was handed to the socket; coalesced frames can be early (negative).
+    __slots__ = ('handle', 'can_id', 'period', 'offset', 'payload', 'ext_flag', 'rtr_flag', 'next_deadline',
+                 'cycle', 'pending_frame', 'numb_of_sent_frames', 'numb_of_skipped_cycles', 'last_send_time', 'min_period',
+                 'max_period', 'min_lateness', 'max_lateness', 'mean_lateness', 'lateness_m2')
+
+    def __init__(self, handle, can_id, period, offset, payload, ext_flag=False, rtr_flag=False):
+        self.handle = handle
+        self.can_id = can_id
+        self.period = period  # ns
+        self.offset = offset  # ns, relative to the start of the scheduler
+        self.payload = payload  # byte-string or generator called with the cycle
+        self.ext_flag = ext_flag
+        self.rtr_flag = rtr_flag
+        self.next_deadline = 0  # time.monotonic_ns() of the next cycle
+        self.cycle = 0
+        self.pending_frame = None  # frame of the next cycle, generated ahead of its deadline
+        self.clear_statistics()
+
+    def clear_statistics(self):
+        self.numb_of_sent_frames = 0
+        self.numb_of_skipped_cycles = 0  # cycles not sent because the scheduler was too late by more than a period
+        self.last_send_time = None
+        self.min_period = None  # ns, measured between two sends
+        self.max_period = None  # ns
+        self.min_lateness = None  # ns
+        self.max_lateness = None  # ns
+        self.mean_lateness = 0.0  # ns
+        self.lateness_m2 = 0.0  # sum of squared deviations, for the standard deviation (Welford)
+
+    def prepare_frame(self):
+        # FUNC: generating the frame of the next cycle as tuple for Connector.send_messages
+        payload = self.payload(self.cycle) if callable(self.payload) else self.payload
+        self.pending_frame = (self.can_id, payload, self.ext_flag, self.rtr_flag)
+
+    def add_send(self, send_time, deadline):
+        # FUNC: adding the timing of a sent cycle
+        # INPUT: send_time and deadline as int, time.monotonic_ns()
+        # RETURN: ---
+        self.numb_of_sent_frames += 1
+        if self.last_send_time is not None:
+            period = send_time - self.last_send_time
+            if self.min_period is None or period < self.min_period:
+                self.min_period = period
+            if self.max_period is None or period > self.max_period:
+                self.max_period = period
+        self.last_send_time = send_time
+        lateness = send_time - deadline
+        delta = lateness - self.mean_lateness
+        self.mean_lateness += delta / self.numb_of_sent_frames
+        self.lateness_m2 += delta * (lateness - self.mean_lateness)
+        if self.min_lateness is None or lateness < self.min_lateness:
+            self.min_lateness = lateness
+        if self.max_lateness is None or lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+    def get_jitter(self):
+        # FUNC: returns the standard deviation of the lateness in ns
+        if self.numb_of_sent_frames < 2:
+            return 0.0
+        return math.sqrt(self.lateness_m2 / (self.numb_of_sent_frames - 1))
+
+    def as_dict(self):
+        # FUNC: returns the timing statistics as dictionary
+        return {
+            "can_id": self.can_id,
+            "period_ms": self.period / 1e6,
+            "frames": self.numb_of_sent_frames,
+            "skipped_cycles": self.numb_of_skipped_cycles,
+            "min_period_ms": (self.min_period or 0) / 1e6,
+            "max_period_ms": (self.max_period or 0) / 1e6,
+            "mean_lateness_us": self.mean_lateness / 1e3,
+            "min_lateness_us": (self.min_lateness or 0) / 1e3,
+            "max_lateness_us": (self.max_lateness or 0) / 1e3,
+            "jitter_us": self.get_jitter() / 1e3,
+        }
+
+    def format_line(self):
+        # FUNC: returns the timing statistics as one line of text
+        return ("ID:" + hex(self.can_id) + "\tCycle: %.3f ms\tCount: %d\tMin: %.3f ms\tMax: %.3f ms"
+                "\tLateness: %.1f us\tMax lateness: %.1f us\tJitter: %.1f us\tSkipped: %d" % (
+                    self.period / 1e6, self.numb_of_sent_frames, (self.min_period or 0) / 1e6,
+                    (self.max_period or 0) / 1e6, self.mean_lateness / 1e3, (self.max_lateness or 0) / 1e3,
+                    self.get_jitter() / 1e3, self.numb_of_skipped_cycles))
+
+#*********************************************************************************************************
+class CyclicScheduler:
+    # Sends hundreds of periodic messages to the target IP of a Connector from one thread.
+    # Every message has an absolute deadline in a heap: start of the scheduler + offset + n * period. The thread
+    # sleeps until shortly before the earliest deadline and busy-waits the rest, then all messages which are due
+    # (or due within the coalesce window) are sent together in as few datagrams as possible. The payloads are
+    # generated right after a send for the following cycle, so counters and checksums do not delay the deadline.
+    # If the scheduler is late by more than a period, the missed cycles are skipped and counted instead of being
+    # sent in a burst.
+    def __init__(self, connector, coalesce_window=0.0005, spin_threshold=0.0002):
+        # FUNC: initialize the CyclicScheduler class
+        # INPUT: connector as Connector, the frames are sent to its target IP
+        #        coalesce_window (float, optional): seconds a frame may be sent early to share a datagram. Defaults to 0.5 ms.
+        #        spin_threshold (float, optional): the last seconds before a deadline are busy-waited. Defaults to 0.2 ms.
+        # RETURN: ---
+        self.my_connector = connector
+        self.coalesce_window = int(coalesce_window * 1e9)
+        self.spin_threshold = int(spin_threshold * 1e9)
+        self.messages = {}  # handle -> CyclicMessage
+        self.deadline_heap = []  # (deadline, handle); entries of removed or rescheduled messages are skipped
+        self.next_handle = 0
+        self.start_time = time.monotonic_ns()  # deadlines are start_time + offset + n * period
+        self.schedule_lock = threading.Lock()
+        self.wakeup_event = threading.Event()  # wakes the thread for an earlier deadline or the stop
+        self.is_running = False
+        self.scheduler_thread = None
+        self.numb_of_sent_datagrams = 0
+        self.numb_of_sent_frames = 0
+        self.numb_of_send_errors = 0
+
+    #************************************************************************************
+    # Messages
+    def add_message(self, can_id, period, payload=b'', offset=0.0, ext_flag=False, rtr_flag=False):
+        # FUNC: adding a periodic message, it is sent from its next deadline on
+        # INPUT: can_id as int
+        #        period as float, seconds; e.g.: 0.01
+        #        payload (optional): byte-string or generator called with the cycle; e.g.: CounterPayload(b'\x00' * 8)
+        #        offset (float, optional): seconds after the start of the scheduler the first cycle is due. Defaults to 0.
+        #        ext_flag, rtr_flag (bool, optional): extended ID and remote frame. Default to False.
+        # RETURN: handle as int for update_payload and remove_message
+        if period <= 0:
+            raise ValueError("period must be positive")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        with self.schedule_lock:
+            handle = self.next_handle
+            self.next_handle += 1
+            message = CyclicMessage(handle, can_id, int(period * 1e9), int(offset * 1e9), payload, ext_flag, rtr_flag)
+            self.messages[handle] = message
+            message.prepare_frame()
+            self.schedule_first_cycle(message, time.monotonic_ns())
+        self.wakeup_event.set()
+        return handle
+
+    def remove_message(self, handle):
+        # FUNC: removing a periodic message
+        # INPUT: handle as int of add_message
+        # RETURN: CyclicMessage with its statistics, None if the handle is unknown
+        with self.schedule_lock:
+            return self.messages.pop(handle, None)
+
+    def update_payload(self, handle, payload):
+        # FUNC: replacing the payload of a message, used from its next cycle on
+        # INPUT: handle as int of add_message
+        #        payload as byte-string or generator called with the cycle
+        # RETURN: ---
+        with self.schedule_lock:
+            message = self.messages[handle]
+            message.payload = payload
+            message.prepare_frame()
+
+    def clear_messages(self):
+        with self.schedule_lock:
+            self.messages.clear()
+            self.deadline_heap = []
+
+    def schedule_first_cycle(self, message, now):
+        # the first deadline not in the past, on the grid start_time + offset + n * period
+        first_deadline = self.start_time + message.offset
+        if first_deadline < now:
+            first_deadline += -(-(now - first_deadline) // message.period) * message.period
+        message.next_deadline = first_deadline
+        heapq.heappush(self.deadline_heap, (first_deadline, message.handle))
+
+    def get_statistics(self):
+        # FUNC: returns the timing statistics of all messages
+        # INPUT: ---
+        # RETURN: list of dictionaries of CyclicMessage.as_dict, in the order the messages were added
+        with self.schedule_lock:
+            return [message.as_dict() for message in self.messages.values()]
+
+    def clear_statistics(self):
+        with self.schedule_lock:
+            for message in self.messages.values():
+                message.clear_statistics()
+
+    def __len__(self):
+        return len(self.messages)
+
+    #************************************************************************************
+    # Scheduler thread
+    def start(self):
+        # FUNC: starting the cyclic transmit in a background thread, all messages start again at their offset
+        # INPUT: ---
+        # RETURN: ---
+        if self.is_running:
+            return
+        with self.schedule_lock:
+            self.start_time = time.monotonic_ns()
+            self.deadline_heap = []
+            for message in self.messages.values():
+                message.cycle = 0
+                message.prepare_frame()
+                self.schedule_first_cycle(message, self.start_time)
+        self.is_running = True
+        self.wakeup_event.clear()
+        self.scheduler_thread = threading.Thread(target=self.run, name="CyclicScheduler", daemon=True)
+        self.scheduler_thread.start()
+
+    def stop(self):
+        # FUNC: stopping the cyclic transmit
+        # INPUT: ---
+        # RETURN: ---
+        self.is_running = False
+        self.wakeup_event.set()
+        if self.scheduler_thread is not None and self.scheduler_thread is not threading.current_thread():
+            self.scheduler_thread.join()
+        self.scheduler_thread = None
+
+    def run(self):
+        while self.is_running:
+            # the event is cleared before the earliest deadline is read, so an add_message in between wakes the wait
+            self.wakeup_event.clear()
+            with self.schedule_lock:
+                next_deadline = self.deadline_heap[0][0] if self.deadline_heap else None
+            if next_deadline is None:
+                self.wakeup_event.wait(0.1)
+                continue
+            remaining = next_deadline - time.monotonic_ns()
+            if remaining > self.spin_threshold:
+                self.wakeup_event.wait(min((remaining - self.spin_threshold) / 1e9, 0.1))
+                continue
+            while time.monotonic_ns() < next_deadline:
+                pass  # busy-wait the last part for a precise send time
+            self.send_due_messages()
+
+    def send_due_messages(self):
+        # FUNC: sending all messages due now or within the coalesce window and scheduling their next cycle
+        # INPUT: ---
+        # RETURN: number of sent frames
+        now = time.monotonic_ns()
+        due_time = now + self.coalesce_window
+        frames = []
+        due_messages = []
+        rescheduled = []  # pushed after the pass, a period shorter than the coalesce window must not be due again
+        with self.schedule_lock:
+            deadline_heap = self.deadline_heap
+            messages = self.messages
+            while deadline_heap and deadline_heap[0][0] <= due_time:
+                deadline, handle = heapq.heappop(deadline_heap)
+                message = messages.get(handle)
+                if message is None or message.next_deadline != deadline:
+                    continue  # removed or restarted meanwhile
+                frames.append(message.pending_frame)
+                due_messages.append((message, deadline))
+                message.cycle += 1
+                next_deadline = deadline + message.period
+                if next_deadline <= now:
+                    # late by more than a period: skipping the missed cycles keeps the grid instead of a burst
+                    numb_of_skipped_cycles = (now - next_deadline) // message.period + 1
+                    message.numb_of_skipped_cycles += numb_of_skipped_cycles
+                    message.cycle += numb_of_skipped_cycles
+                    next_deadline += numb_of_skipped_cycles * message.period
+                message.next_deadline = next_deadline
+                rescheduled.append((next_deadline, handle))
+            for entry in rescheduled:
+                heapq.heappush(deadline_heap, entry)
+        if not frames:
+            return 0
+
+        try:
+            numb_of_datagrams = self.my_connector.send_messages(frames)
+        except OSError:
+            numb_of_datagrams = 0
+            self.numb_of_send_errors += 1
+        send_time = time.monotonic_ns()
+        with self.schedule_lock:
+            for message, deadline in due_messages:
+                if numb_of_datagrams:
+                    message.add_send(send_time, deadline)
+                message.prepare_frame()
+        if not numb_of_datagrams:
+            return 0
+        self.numb_of_sent_datagrams += numb_of_datagrams
+        self.numb_of_sent_frames += len(frames)
+        return len(frames)
+
+#*********************************************************************************************************
@@ -0,0 +1,386 @@
+import re
+from struct import Struct
+
+from qt_application_backend import CAN_FLAG_EXT, CAN_TRACE_EXT_KEY
+
+try:
+    import numpy as np  # optional, only used for the vectorized decoding of whole captures and ring buffer columns
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+# Signal decoding with a DBC database. Every message definition is compiled once into a DecodePlan with the shift,
+# mask, sign bit, scale and offset of all signals, so decoding a frame is a few integer operations per signal and
+# never touches the definition text again. Supported DBC content:
+#   BO_ <id> <name>: <dlc> <transmitter>                               message, bit 31 of the id marks extended IDs
+#   SG_ <name> [M|m<n>] : <start>|<length>@<1|0><+|-> (<scale>,<offset>) [<min>|<max>] "<unit>" <receivers>
+#   VAL_ <id> <signal> <value> "<text>" ... ;                           value tables, used for the text output
+#   SIG_VALTYPE_ <id> <signal> : <1|2>;                                 IEEE float (1) and double (2) signals
+# Byte order 1 is Intel (little endian, start bit = LSB), 0 is Motorola (big endian, start bit = MSB).
+# Multiplexing: the signals with m<n> are only decoded if the multiplexer switch M of the message has the value n.
+# Other sections (comments, attributes, extended multiplexing) are ignored.
+DBC_MESSAGE_PATTERN = re.compile(r'^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\S+)')
+DBC_SIGNAL_PATTERN = re.compile(r'^SG_\s+(\w+)\s*(M|m\d+M?)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*\(([^,]+),([^)]+)\)\s*'
+                                r'\[([^|]*)\|([^\]]*)\]\s*"([^"]*)"')
+DBC_VALUE_TABLE_PATTERN = re.compile(r'^VAL_\s+(\d+)\s+(\w+)\s+(.*);')
+DBC_VALUE_PATTERN = re.compile(r'(-?\d+)\s+"([^"]*)"')
+DBC_VALUE_TYPE_PATTERN = re.compile(r'^SIG_VALTYPE_\s+(\d+)\s+(\w+)\s*:?\s*([012])\s*;')
+
+VALUE_TYPE_INTEGER = 0
+VALUE_TYPE_FLOAT = 1
+VALUE_TYPE_DOUBLE = 2
+
+UINT32_STRUCT = Struct('<I')
+FLOAT_STRUCT = Struct('<f')
+UINT64_STRUCT = Struct('<Q')
+DOUBLE_STRUCT = Struct('<d')
+
+#*********************************************************************************************************
+class SignalDefinition:
+    # One signal of a message as defined in the DBC file
+    __slots__ = ('name', 'start_bit', 'length', 'little_endian', 'signed', 'scale', 'offset', 'minimum', 'maximum',
+                 'unit', 'is_multiplexer', 'multiplexer_value', 'value_type', 'choices')
+
+    def __init__(self, name, start_bit, length, little_endian=True, signed=False, scale=1, offset=0,
+                 minimum=None, maximum=None, unit="", is_multiplexer=False, multiplexer_value=None):
+        self.name = name
+        self.start_bit = start_bit
+        self.length = length
+        self.little_endian = little_endian
+        self.signed = signed
+        self.scale = scale
+        self.offset = offset
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+        self.is_multiplexer = is_multiplexer  # multiplexer switch of the message
+        self.multiplexer_value = multiplexer_value  # value of the switch this signal is decoded for, None for always
+        self.value_type = VALUE_TYPE_INTEGER
+        self.choices = {}  # raw value -> text of the value table
+
+    def get_shift(self):
+        # FUNC: returns the shift of the signal LSB in the payload as 64 bit integer
+        # RETURN: shift as int; little endian payload for Intel, big endian payload for Motorola signals
+        if self.little_endian:
+            shift = self.start_bit
+        else:
+            # the start bit is the MSB, counted per byte from the LSB; byte 0 is the most significant byte
+            msb_position = (7 - self.start_bit // 8) * 8 + self.start_bit % 8
+            shift = msb_position - self.length + 1
+        if shift < 0 or shift + self.length > 64 or self.length < 1:
+            raise ValueError("signal %s does not fit into 8 data bytes" % self.name)
+        return shift
+
+#*********************************************************************************************************
+class MessageDefinition:
+    # One message of the DBC file with its signals
+    def __init__(self, can_id, name, dlc, ext=False, transmitter=""):
+        self.can_id = can_id
+        self.name = name
+        self.dlc = dlc
+        self.ext = ext
+        self.transmitter = transmitter
+        self.signals = []
+
+    def get_key(self):
+        # key of the message like in the CanIdTrace: the CAN-ID plus CAN_TRACE_EXT_KEY for extended IDs
+        return self.can_id | CAN_TRACE_EXT_KEY if self.ext else self.can_id
+
+#*********************************************************************************************************
+class DecodePlan:
+    # Compiled decoding of one message. Every signal is one tuple of
+    # (name, big_endian, shift, mask, sign_bit, scale, offset, value_type), sign_bit is 0 for unsigned signals.
+    # The payload is converted once per frame into a little and/or big endian integer, every signal is then a
+    # shift and a mask. Signals of a multiplexed message are grouped by the value of the multiplexer switch.
+    def __init__(self, message_definition):
+        # FUNC: compiling a message definition
+        # INPUT: message_definition as MessageDefinition
+        # RETURN: ---
+        self.name = message_definition.name
+        self.signal_definitions = {signal.name: signal for signal in message_definition.signals}
+        self.signals = []  # decoded for every frame, including the multiplexer switch
+        self.multiplexer = None  # compiled multiplexer switch
+        self.multiplexed_signals = {}  # switch value -> compiled signals
+        for signal in message_definition.signals:
+            compiled_signal = (signal.name, not signal.little_endian, signal.get_shift(), (1 << signal.length) - 1,
+                               1 << (signal.length - 1) if signal.signed else 0, signal.scale, signal.offset,
+                               signal.value_type)
+            if signal.multiplexer_value is not None:
+                self.multiplexed_signals.setdefault(signal.multiplexer_value, []).append(compiled_signal)
+            else:
+                self.signals.append(compiled_signal)
+            if signal.is_multiplexer:
+                self.multiplexer = compiled_signal
+        self.needs_little_endian = any(signal.little_endian for signal in message_definition.signals)
+        self.needs_big_endian = any(not signal.little_endian for signal in message_definition.signals)
+
+    def decode(self, data):
+        # FUNC: decoding the signals of a payload
+        # INPUT: data as byte-string with up to 8 bytes
+        # RETURN: dictionary signal name -> physical value
+        if len(data) != 8:
+            data = bytes(data[:8]).ljust(8, b'\x00')
+        raw_little = int.from_bytes(data, 'little') if self.needs_little_endian else 0
+        raw_big = int.from_bytes(data, 'big') if self.needs_big_endian else 0
+        values = {}
+        decode_signals(self.signals, raw_little, raw_big, values)
+        if self.multiplexer is not None:
+            switch_value = extract_raw_value(self.multiplexer, raw_little, raw_big)
+            decode_signals(self.multiplexed_signals.get(switch_value, ()), raw_little, raw_big, values)
+        return values
+
+    def decode_columns(self, payloads):
+        # FUNC: vectorized decoding of the payloads of this message, needs numpy
+        # INPUT: payloads as numpy array (n x 8) of uint8
+        # RETURN: dictionary signal name -> numpy array of float64, NaN where a multiplexed signal is not present
+        payloads = np.ascontiguousarray(payloads, dtype=np.uint8)
+        raw_little = payloads.view('<u8')[:, 0] if self.needs_little_endian else None
+        raw_big = payloads.view('>u8')[:, 0].astype(np.uint64) if self.needs_big_endian else None
+        columns = {}
+        for compiled_signal in self.signals:
+            columns[compiled_signal[0]] = decode_signal_column(compiled_signal, raw_little, raw_big)
+        if self.multiplexer is not None:
+            switch_values = extract_raw_column(self.multiplexer, raw_little, raw_big)
+            for switch_value, compiled_signals in self.multiplexed_signals.items():
+                present = switch_values == switch_value
+                for compiled_signal in compiled_signals:
+                    column = np.full(len(payloads), np.nan)
+                    if present.any():
+                        column[present] = decode_signal_column(
+                            compiled_signal, None if raw_little is None else raw_little[present],
+                            None if raw_big is None else raw_big[present])
+                    columns[compiled_signal[0]] = column
+        return columns
+
+def extract_raw_value(compiled_signal, raw_little, raw_big):
+    # returns the unsigned raw value of a compiled signal
+    return ((raw_big if compiled_signal[1] else raw_little) >> compiled_signal[2]) & compiled_signal[3]
+
+def decode_signals(compiled_signals, raw_little, raw_big, values):
+    # decodes the compiled signals into values, the hot loop of the live path
+    for name, big_endian, shift, mask, sign_bit, scale, offset, value_type in compiled_signals:
+        raw = ((raw_big if big_endian else raw_little) >> shift) & mask
+        if value_type:
+            raw = (FLOAT_STRUCT.unpack(UINT32_STRUCT.pack(raw))[0] if value_type == VALUE_TYPE_FLOAT
+                   else DOUBLE_STRUCT.unpack(UINT64_STRUCT.pack(raw))[0])
+        else:
+            raw = (raw ^ sign_bit) - sign_bit  # two's complement, unchanged for unsigned signals (sign_bit 0)
+        values[name] = raw * scale + offset if scale != 1 or offset != 0 else raw
+
+def extract_raw_column(compiled_signal, raw_little, raw_big):
+    # returns the unsigned raw values of a compiled signal as numpy array of uint64
+    return ((raw_big if compiled_signal[1] else raw_little) >> np.uint64(compiled_signal[2])) & np.uint64(compiled_signal[3])
+
+def decode_signal_column(compiled_signal, raw_little, raw_big):
+    # returns the physical values of a compiled signal as numpy array of float64
+    sign_bit, scale, offset, value_type = compiled_signal[4:]
+    raw = extract_raw_column(compiled_signal, raw_little, raw_big)
+    if value_type == VALUE_TYPE_FLOAT:
+        with np.errstate(invalid='ignore'):  # payload bits which are signaling NaNs as float
+            values = raw.astype(np.uint32).view(np.float32).astype(np.float64)
+    elif value_type == VALUE_TYPE_DOUBLE:
+        values = raw.view(np.float64)
+    elif sign_bit:
+        # two's complement in wrapping uint64 arithmetic, also for 63 and 64 bit signals
+        values = ((raw ^ np.uint64(sign_bit)) - np.uint64(sign_bit)).view(np.int64).astype(np.float64)
+    else:
+        values = raw.astype(np.float64)
+    if scale != 1 or offset != 0:
+        values = values * scale + offset
+    return values
+
+#*********************************************************************************************************
+class SignalDatabase:
+    # Message definitions of a DBC file and their decode plans. The plans are compiled on the first frame of a
+    # CAN-ID and cached, unknown CAN-IDs are cached as None, so the live path is one dictionary lookup per frame.
+    def __init__(self):
+        self.messages = {}  # key -> MessageDefinition, key is the CAN-ID plus CAN_TRACE_EXT_KEY for extended IDs
+        self.decode_plans = {}  # key -> DecodePlan or None
+
+    def add_message(self, message_definition):
+        self.messages[message_definition.get_key()] = message_definition
+        self.decode_plans.clear()
+
+    def get_message(self, name):
+        # FUNC: returns the definition of a message by name, None if it is unknown
+        for message_definition in self.messages.values():
+            if message_definition.name == name:
+                return message_definition
+        return None
+
+    def get_plan(self, key):
+        # FUNC: returns the cached decode plan of a message
+        # INPUT: key as int, the CAN-ID plus CAN_TRACE_EXT_KEY for extended IDs
+        # RETURN: DecodePlan, None if the message is not in the database
+        try:
+            return self.decode_plans[key]
+        except KeyError:
+            message_definition = self.messages.get(key)
+            plan = DecodePlan(message_definition) if message_definition is not None else None
+            self.decode_plans[key] = plan
+            return plan
+
+    def compile_all(self):
+        # FUNC: compiling the decode plans of all messages ahead of the first frame
+        for key in self.messages:
+            self.get_plan(key)
+
+    def decode_frame(self, frame):
+        # FUNC: decoding the signals of a frame
+        # INPUT: frame as CanFrame
+        # RETURN: tuple (message name, dictionary signal name -> physical value), None if the message is unknown
+        plan = self.get_plan(frame.can_id | CAN_TRACE_EXT_KEY if frame.flags & CAN_FLAG_EXT else frame.can_id)
+        if plan is None:
+            return None
+        return plan.name, plan.decode(frame.data)
+
+    def format_signals(self, frame):
+        # FUNC: returns the decoded signals of a frame as one line of text, with units and value table texts
+        # INPUT: frame as CanFrame
+        # RETURN: string, empty if the message is unknown
+        decoded = self.decode_frame(frame)
+        if decoded is None:
+            return ""
+        name, values = decoded
+        plan = self.get_plan(frame.can_id | CAN_TRACE_EXT_KEY if frame.flags & CAN_FLAG_EXT else frame.can_id)
+        parts = []
+        for signal_name, value in values.items():
+            signal = plan.signal_definitions[signal_name]
+            text = signal.choices.get(value) if isinstance(value, int) else None
+            if text is not None:
+                parts.append("%s=%s" % (signal_name, text))
+            else:
+                parts.append(("%s=%g %s" % (signal_name, value, signal.unit)).rstrip())
+        return name + ": " + ", ".join(parts)
+
+    def decode_columns(self, columns):
+        # FUNC: vectorized decoding of frame columns, e.g. of FrameRingBuffer.newest_columns, needs numpy
+        # INPUT: columns as dictionary with the numpy arrays "can_ids", "flags", "payloads" (n x 8) and
+        #        optionally "timestamps"
+        # RETURN: dictionary message name -> dictionary with "timestamps" (if given), "indices" (rows of the frames)
+        #         and one numpy array of float64 per signal
+        if np is None:
+            raise RuntimeError("numpy is required for SignalDatabase.decode_columns")
+        can_ids = np.asarray(columns["can_ids"], dtype=np.uint32)
+        keys = np.where(np.asarray(columns["flags"]) & CAN_FLAG_EXT, can_ids | np.uint32(CAN_TRACE_EXT_KEY), can_ids)
+        payloads = np.asarray(columns["payloads"])
+        timestamps = columns.get("timestamps")
+        # the frames are grouped by key with one sort instead of one comparison of all frames per message
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        decoded = {}
+        for key, start, end in zip(unique_keys.tolist(), starts.tolist(), ends.tolist()):
+            plan = self.get_plan(key)
+            if plan is None:
+                continue
+            indices = order[start:end]
+            message_columns = {"indices": indices}
+            if timestamps is not None:
+                message_columns["timestamps"] = np.asarray(timestamps)[indices]
+            message_columns.update(plan.decode_columns(payloads[indices]))
+            decoded[plan.name] = message_columns
+        return decoded
+
+    def decode_records(self, records):
+        # FUNC: vectorized decoding of capture records, e.g. of CaptureReader.records or SharedFrameRingReader.read_array
+        # INPUT: records as structured numpy array with the fields timestamp, can_id, flags and data
+        # RETURN: like decode_columns
+        return self.decode_columns({"timestamps": records['timestamp'], "can_ids": records['can_id'],
+                                    "flags": records['flags'], "payloads": records['data']})
+
+    def decode_capture(self, capture_reader, chunk_size=1 << 20):
+        # FUNC: decoding a capture file chunk by chunk, so hour-long recordings do not need all results in memory
+        # INPUT: capture_reader as CaptureReader or CompressedCaptureReader
+        #        chunk_size (int, optional): records per chunk. Defaults to 1048576.
+        # RETURN: generator of the results of decode_records per chunk, the indices are relative to the chunk
+        for start in range(0, len(capture_reader), chunk_size):
+            yield self.decode_records(capture_reader.records(start, start + chunk_size))
+
+    def __len__(self):
+        return len(self.messages)
+
+#*********************************************************************************************************
+def parse_dbc_number(text):
+    # DBC numbers are written as integers or floats, integers are kept to avoid float results for raw signals
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parse_dbc(text):
+    # FUNC: parsing the content of a DBC file
+    # INPUT: text as string
+    # RETURN: SignalDatabase
+    database = SignalDatabase()
+    message_definition = None
+    value_tables = []
+    value_types = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if line.startswith("BO_ "):
+            match = DBC_MESSAGE_PATTERN.match(line)
+            if match is None:
+                raise ValueError("invalid message in line %d: %s" % (line_number, line))
+            raw_id = int(match.group(1))
+            message_definition = MessageDefinition(raw_id & 0x1FFFFFFF, match.group(2), int(match.group(3)),
+                                                   bool(raw_id & CAN_TRACE_EXT_KEY), match.group(4))
+            database.add_message(message_definition)
+        elif line.startswith("SG_ "):
+            match = DBC_SIGNAL_PATTERN.match(line)
+            if match is None or message_definition is None:
+                raise ValueError("invalid signal in line %d: %s" % (line_number, line))
+            (name, multiplexing, start_bit, length, byte_order, sign, scale, offset,
+             minimum, maximum, unit) = match.groups()
+            multiplexer_value = None
+            if multiplexing and multiplexing.startswith("m"):
+                multiplexer_value = int(multiplexing[1:].rstrip("M"))
+            signal = SignalDefinition(name, int(start_bit), int(length), byte_order == "1", sign == "-",
+                                      parse_dbc_number(scale), parse_dbc_number(offset),
+                                      parse_dbc_number(minimum) if minimum.strip() else None,
+                                      parse_dbc_number(maximum) if maximum.strip() else None, unit,
+                                      bool(multiplexing) and multiplexing.endswith("M"), multiplexer_value)
+            signal.get_shift()  # rejecting signals outside of the payload while loading
+            message_definition.signals.append(signal)
+        elif line.startswith("VAL_ "):
+            match = DBC_VALUE_TABLE_PATTERN.match(line)
+            if match is not None:
+                value_tables.append(match.groups())
+        elif line.startswith("SIG_VALTYPE_ "):
+            match = DBC_VALUE_TYPE_PATTERN.match(line)
+            if match is not None:
+                value_types.append(match.groups())
+        elif line and not line.startswith("SG_"):
+            message_definition = None  # the signals of a message follow directly after its BO_ line
+
+    # value tables and value types reference the signals by message id and name, they follow after all messages
+    for raw_id, signal_name, value_type in value_types:
+        signal = find_signal(database, int(raw_id), signal_name)
+        if signal is not None:
+            signal.value_type = int(value_type)
+            if signal.value_type and signal.length != (32 if signal.value_type == VALUE_TYPE_FLOAT else 64):
+                raise ValueError("float signal %s must have %d bits" % (
+                    signal_name, 32 if signal.value_type == VALUE_TYPE_FLOAT else 64))
+    for raw_id, signal_name, values in value_tables:
+        signal = find_signal(database, int(raw_id), signal_name)
+        if signal is not None:
+            signal.choices = {int(value): text for value, text in DBC_VALUE_PATTERN.findall(values)}
+    return database
+
+def find_signal(database, raw_id, signal_name):
+    # returns the signal of a message by the DBC id and the signal name, None if it does not exist
+    message_definition = database.messages.get(raw_id & 0x1FFFFFFF | (raw_id & CAN_TRACE_EXT_KEY))
+    if message_definition is None:
+        return None
+    for signal in message_definition.signals:
+        if signal.name == signal_name:
+            return signal
+    return None
+
+def load_dbc(file_path, encoding="cp1252"):
+    # FUNC: loading a DBC file
+    # INPUT: file_path as string
+    #        encoding (str, optional): DBC files are usually written by Windows tools. Defaults to "cp1252".
+    # RETURN: SignalDatabase
+    with open(file_path, encoding=encoding, errors="replace") as dbc_file:
+        return parse_dbc(dbc_file.read())
@@ -0,0 +1,178 @@
+from array import array
+
+from qt_application_backend import CanFrame
+
+try:
+    import numpy as np  # optional, only used to hand out the columns as numpy arrays
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+class FrameRingBuffer:
+    # Columnar ring buffer for CAN frames, usable as storage of the MessageLogger instead of a deque.
+    # All columns are preallocated, so appending is O(1) and a frame costs 22 bytes instead of a Python object:
+    #   timestamps  int64, nanoseconds since the epoch
+    #   can_ids     uint32
+    #   dlcs        uint8
+    #   flags       uint8, combination of CAN_FLAG_EXT and CAN_FLAG_RTR
+    #   payloads    maxlen x 8 uint8, padded with zeros
+    def __init__(self, maxlen):
+        # FUNC: initialize the FrameRingBuffer class
+        # INPUT: maxlen (int): maximum number of stored frames, the oldest frames are overwritten
+        # RETURN: ---
+        self.maxlen = 0
+        self.head = 0  # index the next frame is written to
+        self.count = 0  # number of stored frames
+        self.allocate(max(int(maxlen), 1))
+
+    def allocate(self, maxlen):
+        # FUNC: allocating empty columns
+        # INPUT: maxlen as int
+        # RETURN: ---
+        self.maxlen = maxlen
+        self.timestamps = array('q', bytes(8 * maxlen))
+        self.can_ids = array('I', bytes(4 * maxlen))
+        self.dlcs = bytearray(maxlen)
+        self.flags = bytearray(maxlen)
+        self.payloads = bytearray(8 * maxlen)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, frame):
+        # FUNC: appending a frame, overwrites the oldest frame when the buffer is full
+        # INPUT: frame as CanFrame
+        # RETURN: ---
+        index = self.head
+        self.timestamps[index] = frame.timestamp
+        self.can_ids[index] = frame.can_id
+        self.dlcs[index] = frame.dlc
+        self.flags[index] = frame.flags
+        data = frame.data
+        self.payloads[index * 8:index * 8 + 8] = data if len(data) == 8 else data[:8].ljust(8, b'\x00')
+        index += 1
+        self.head = 0 if index == self.maxlen else index
+        if self.count < self.maxlen:
+            self.count += 1
+
+    def extend(self, frames):
+        # FUNC: appending several frames
+        # INPUT: frames as iterable of CanFrame
+        # RETURN: ---
+        append = self.append
+        for frame in frames:
+            append(frame)
+
+    def clear(self):
+        # FUNC: removing all frames, the columns stay allocated
+        # INPUT: ---
+        # RETURN: ---
+        self.head = 0
+        self.count = 0
+
+    def resize(self, new_maxlen):
+        # FUNC: changing the maximum number of frames, the newest frames are kept
+        # INPUT: new_maxlen as int
+        # RETURN: ---
+        # The stored frames are moved with one block copy per column and segment, not frame by frame.
+        segments = self.segments(min(self.count, max(int(new_maxlen), 1)))
+        old_columns = (self.timestamps, self.can_ids, self.dlcs, self.flags, self.payloads)
+        self.allocate(max(int(new_maxlen), 1))
+        position = 0
+        for start, stop in segments:
+            length = stop - start
+            for old_column, new_column in zip(old_columns[:4], (self.timestamps, self.can_ids, self.dlcs, self.flags)):
+                memoryview(new_column)[position:position + length] = memoryview(old_column)[start:stop]
+            self.payloads[position * 8:(position + length) * 8] = memoryview(old_columns[4])[start * 8:stop * 8]
+            position += length
+        self.count = position
+        self.head = position % self.maxlen
+
+    def segments(self, k=None):
+        # FUNC: returns the index ranges of the newest k frames in chronological order
+        # INPUT: k (int, optional): number of frames. Defaults to all stored frames.
+        # RETURN: list of up to two tuples (start, stop)
+        k = self.count if k is None else min(max(k, 0), self.count)
+        if k == 0:
+            return []
+        start = self.head - k
+        if start >= 0:
+            return [(start, self.head)]
+        return [(start + self.maxlen, self.maxlen), (0, self.head)]
+
+    def newest_views(self, k=None):
+        # FUNC: returns zero-copy views of the newest k frames
+        # INPUT: k (int, optional): number of frames. Defaults to all stored frames.
+        # RETURN: list of up to two dictionaries with the column views "timestamps", "can_ids", "dlcs", "flags"
+        #         and "payloads" (k x 8) in chronological order. The views are numpy arrays if numpy is
+        #         installed, memoryviews otherwise. They are only valid until the buffer is resized.
+        views = []
+        for start, stop in self.segments(k):
+            if np is not None:
+                views.append({
+                    "timestamps": np.frombuffer(self.timestamps, dtype=np.int64)[start:stop],
+                    "can_ids": np.frombuffer(self.can_ids, dtype=np.uint32)[start:stop],
+                    "dlcs": np.frombuffer(self.dlcs, dtype=np.uint8)[start:stop],
+                    "flags": np.frombuffer(self.flags, dtype=np.uint8)[start:stop],
+                    "payloads": np.frombuffer(self.payloads, dtype=np.uint8).reshape(self.maxlen, 8)[start:stop],
+                })
+            else:
+                views.append({
+                    "timestamps": memoryview(self.timestamps)[start:stop],
+                    "can_ids": memoryview(self.can_ids)[start:stop],
+                    "dlcs": memoryview(self.dlcs)[start:stop],
+                    "flags": memoryview(self.flags)[start:stop],
+                    "payloads": memoryview(self.payloads)[start * 8:stop * 8].cast('B', (stop - start, 8)),
+                })
+        return views
+
+    def newest_columns(self, k=None):
+        # FUNC: returns the newest k frames as contiguous columns, only copied if the frames wrap around
+        # INPUT: k (int, optional): number of frames. Defaults to all stored frames.
+        # RETURN: dictionary with the same keys as newest_views
+        views = self.newest_views(k)
+        if len(views) == 1:
+            return views[0]
+        if np is not None:
+            if not views:
+                return {"timestamps": np.zeros(0, np.int64), "can_ids": np.zeros(0, np.uint32),
+                        "dlcs": np.zeros(0, np.uint8), "flags": np.zeros(0, np.uint8),
+                        "payloads": np.zeros((0, 8), np.uint8)}
+            return {key: np.concatenate([view[key] for view in views]) for key in views[0]}
+        columns = {"timestamps": array('q'), "can_ids": array('I'), "dlcs": bytearray(), "flags": bytearray(),
+                   "payloads": bytearray()}
+        for view in views:
+            columns["timestamps"].frombytes(view["timestamps"].tobytes())
+            columns["can_ids"].frombytes(view["can_ids"].tobytes())
+            columns["dlcs"] += view["dlcs"]
+            columns["flags"] += view["flags"]
+            columns["payloads"] += view["payloads"].tobytes()
+        return columns
+
+    def frame_at(self, index):
+        # FUNC: returns a stored frame
+        # INPUT: index as int; 0 is the oldest frame, -1 the newest frame
+        # RETURN: CanFrame
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("frame index out of range")
+        position = (self.head - self.count + index) % self.maxlen
+        dlc = self.dlcs[position]
+        return CanFrame(self.can_ids[position], bytes(self.payloads[position * 8:position * 8 + min(dlc, 8)]),
+                        self.flags[position], self.timestamps[position], dlc)
+
+    def __getitem__(self, index):
+        return self.frame_at(index)
+
+    def __iter__(self):
+        # yields the frames from the oldest to the newest as CanFrame
+        for start, stop in self.segments():
+            for position in range(start, stop):
+                dlc = self.dlcs[position]
+                yield CanFrame(self.can_ids[position], bytes(self.payloads[position * 8:position * 8 + min(dlc, 8)]),
+                               self.flags[position], self.timestamps[position], dlc)
+
+#*********************************************************************************************************
@@ -1,7 +1,90 @@
 import socket
-from struct import pack, unpack
+import sys
+from struct import Struct
 from collections import deque
 import datetime
+import time
+import select
+import threading
+import ipaddress
+from bisect import bisect_right
+
+try:
+    import numpy as np  # optional, only used for vectorized filtering of whole batches
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+# CANeth header: magic id (8 bytes), protocol version (1 byte), frame count (1 byte)
+# CANeth frame:  CAN ID (4 bytes), DLC (1 byte), data (8 bytes), ext flag (1 byte), rtr flag (1 byte)
+CANETH_MAGIC_ID = b'ISO11898'
+CANETH_PROTOCOL_VERSION = 1
+CANETH_HEADER_SIZE = 10
+CANETH_FRAME_SIZE = 15
+# Maximum number of frames in one datagram without IP fragmentation on a 1500 byte MTU
+CANETH_MAX_FRAMES_PER_DATAGRAM = (1472 - CANETH_HEADER_SIZE) // CANETH_FRAME_SIZE
+
+# precompiled structs for encoding and decoding, the ESP32 uses little endian byte order
+CANETH_HEADER_STRUCT = Struct('<8sBB')
+CANETH_FRAME_STRUCT = Struct('<IB8sBB')
+
+# bits of CanFrame.flags
+CAN_FLAG_EXT = 0x01
+CAN_FLAG_RTR = 0x02
+
+#*********************************************************************************************************
+class CanFrame:
+    # Compact record of one CAN frame. Hex and time strings are only created when the frame is displayed
+    # or exported, so keeping large numbers of frames in memory stays cheap.
+    __slots__ = ('can_id', 'dlc', 'data', 'flags', 'timestamp')
+
+    def __init__(self, can_id, data, flags=0, timestamp=0, dlc=None):
+        # FUNC: initialize a CAN frame
+        # INPUT: can_id as int
+        #        data as byte-string with up to 8 bytes; e.g.: b'\x01\x02'
+        #        flags as int, combination of CAN_FLAG_EXT and CAN_FLAG_RTR
+        #        timestamp as int, nanoseconds since the epoch
+        #        dlc (int, optional): data length code, defaults to len(data)
+        # RETURN: ---
+        self.can_id = can_id
+        self.dlc = len(data) if dlc is None else dlc
+        self.data = data
+        self.flags = flags
+        self.timestamp = timestamp
+
+    @property
+    def ext(self):
+        return bool(self.flags & CAN_FLAG_EXT)
+
+    @property
+    def rtr(self):
+        return bool(self.flags & CAN_FLAG_RTR)
+
+    def data_hex(self):
+        # FUNC: returns the data as hex string; e.g.: "01 02 FF"
+        return self.data.hex(' ').upper()
+
+    def time_string(self):
+        # FUNC: returns the time stamp as string with milliseconds; e.g.: "2024-01-31 12:00:00.123"
+        return datetime.datetime.fromtimestamp(self.timestamp / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+
+    def format_line(self):
+        # FUNC: returns the frame as one line of text for the live view and the log
+        return ("ID:" + str(self.can_id) + "\tData:" + self.data_hex() + "\tExt:" + str(self.ext) +
+                "\tRTR:" + str(self.rtr) + "\tTime stamp: " + self.time_string())
+
+    def to_dict(self):
+        # FUNC: returns the frame as dictionary with the keys of the former decoded messages
+        return {"ID": self.can_id, "Data": self.data_hex(), "Ext": self.ext, "RTR": self.rtr, "Time": self.time_string()}
+
+    def __eq__(self, other):
+        if not isinstance(other, CanFrame):
+            return NotImplemented
+        return (self.can_id == other.can_id and self.data == other.data and self.flags == other.flags and
+                self.timestamp == other.timestamp)
+
+    def __repr__(self):
+        return "CanFrame(can_id=0x%X, data=%r, flags=%d, timestamp=%d)" % (self.can_id, self.data, self.flags, self.timestamp)
 
 #*********************************************************************************************************
 def encode_caneth_message(can_id_hex, data_hex, ext_flag=False, rtr_flag=False):
@@ -10,59 +93,164 @@ def encode_caneth_message(can_id_hex, data_hex, ext_flag=False, rtr_flag=False):
     #           data_byte_string as byte-string; e.g.: b'\x01\x02\x03\x04\x05\xFD\xFE\xFF'
     # RETURN: message as string
 
-    magic_id = b'ISO11898'  # CANETH protocol magic identifier
-    protocol_version = 1
-    frame_count = 1
+    # struct pads the data with zeros and includes only the first 8 bytes
+    return (CANETH_HEADER_STRUCT.pack(CANETH_MAGIC_ID, CANETH_PROTOCOL_VERSION, 1) +
+            CANETH_FRAME_STRUCT.pack(can_id_hex, len(data_hex), data_hex, ext_flag, rtr_flag))
+# Test status: successfull tested
+
+#*********************************************************************************************************
+def decode_caneth_message(message, timestamp=None):
+    # FUNC: decoding the first frame of an caneth message
+    # INPUT:    message as byte-string
+    #           timestamp (int, optional): receive time in nanoseconds since the epoch, defaults to now
+    # RETURN: CanFrame, None if the message is invalid
+    frames = decode_caneth_messages(message, timestamp)
+    if frames:
+        return frames[0]
+    return None
+# Test status: successfull tested
 
-    # Ensure the CAN data is 8 bytes long
-    data_padded = data_hex.ljust(8, b'\x00')
+#*********************************************************************************************************
+def encode_caneth_messages(frames):
+    # FUNC: encoding several CAN frames into one caneth message
+    # INPUT:    frames as iterable of CanFrame or tuples (can_id_hex, data_hex) or (can_id_hex, data_hex, ext_flag, rtr_flag)
+    #           at most CANETH_MAX_FRAMES_PER_DATAGRAM frames; e.g.: [(0x123, b'\x01\x02'), (0x45, b'\xFF')]
+    # RETURN: message as byte-string
+    encoded_frames = []
+    pack_frame = CANETH_FRAME_STRUCT.pack
+    for frame in frames:
+        if isinstance(frame, CanFrame):
+            encoded_frames.append(pack_frame(frame.can_id, frame.dlc, frame.data, frame.flags & CAN_FLAG_EXT,
+                                             (frame.flags & CAN_FLAG_RTR) >> 1))
+        else:
+            ext_flag = frame[2] if len(frame) > 2 else False
+            rtr_flag = frame[3] if len(frame) > 3 else False
+            encoded_frames.append(pack_frame(frame[0], len(frame[1]), frame[1], ext_flag, rtr_flag))
 
-    # Creating the message buffer with the specified structure
-    message = pack('8sBB', magic_id, protocol_version, frame_count)
-    message += pack('I', can_id_hex)
-    message += pack('B', len(data_hex))
-    message += data_padded[:8]  # Ensure only the first 8 bytes are included
-    message += pack('BB', ext_flag, rtr_flag)
+    frame_count = len(encoded_frames)
+    if frame_count > CANETH_MAX_FRAMES_PER_DATAGRAM:
+        raise ValueError("too many frames for one caneth message: %d" % frame_count)
 
-    return message
+    return CANETH_HEADER_STRUCT.pack(CANETH_MAGIC_ID, CANETH_PROTOCOL_VERSION, frame_count) + b''.join(encoded_frames)
 # Test status: successfull tested
 
 #*********************************************************************************************************
-def decode_caneth_message(message):
-    # FUNC: decoding an caneth message
-    # INPUT:    can_id_hex as hex-number between  0x000 and 0x7FF 
-    #           data_byte_string as byte-string; e.g.: b'\x01\x02\x03\x04\x05\xFD\xFE\xFF'
-    # RETURN: dictionary
-
-    # Unpack the initial part of the message
-    magic_id, protocol_version, frame_count = unpack('8sBB', message[:10])
-    # Verify magic ID
-    if magic_id != b'ISO11898':
-        return
-    # Unpack the CAN ID and data length
-    can_id, = unpack('I', message[10:14])
-    data_length, = unpack('B', message[14:15])
-    # Extract the data; assuming it might not always be 8 bytes, use data_length to determine actual data
-    data = message[15:15+data_length]
-    data = data[:8]
-    data_hex = ' '.join([format(byte, '02X') for byte in data]) # Convert data to hex string
-    # Unpack flags
-    ext_flag, rtr_flag = unpack('BB', message[23:25])
-
-    # Adding time Stamp
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
-
-    # Create a dictionary with the decoded message components
-    decoded_message = {
-        "ID": can_id,
-        "Data": data_hex,
-        "Ext": bool(ext_flag),
-        "RTR": bool(rtr_flag),
-        "Time": timestamp
-    }
-    return decoded_message
+def decode_caneth_messages(message, timestamp=None):
+    # FUNC: decoding all frames of an caneth message
+    # INPUT:    message as byte-string, bytearray or memoryview with a header and frame_count frames
+    #           timestamp (int, optional): receive time in nanoseconds since the epoch, defaults to now
+    # RETURN: list of CanFrame, empty list if the message is invalid
+    message_length = len(message)
+    if message_length < CANETH_HEADER_SIZE + CANETH_FRAME_SIZE:
+        return []
+    view = memoryview(message)
+    # Unpack the initial part of the message and verify magic ID
+    magic_id, protocol_version, frame_count = CANETH_HEADER_STRUCT.unpack_from(view)
+    if magic_id != CANETH_MAGIC_ID:
+        return []
+    # Only decode frames which are completely contained in the message
+    frame_count = min(frame_count, (message_length - CANETH_HEADER_SIZE) // CANETH_FRAME_SIZE)
+
+    # One time stamp for all frames of the message
+    if timestamp is None:
+        timestamp = time.time_ns()
+
+    end = CANETH_HEADER_SIZE + frame_count * CANETH_FRAME_SIZE
+    return [CanFrame(can_id, data[:data_length], ext_flag | (rtr_flag << 1), timestamp, data_length)
+            for can_id, data_length, data, ext_flag, rtr_flag in CANETH_FRAME_STRUCT.iter_unpack(view[CANETH_HEADER_SIZE:end])]
 # Test status: successfull tested
 
+#*********************************************************************************************************
+class CanethTransmitBuffer:
+    # Encodes batches of frames for sending into one preallocated datagram: the header is packed once, per datagram
+    # only the frames and the frame count are written, no byte-strings are created and joined per frame.
+    # The returned view is reused by the next call, so it has to be sent before.
+    def __init__(self):
+        # FUNC: initialize the CanethTransmitBuffer class
+        # INPUT: ---
+        # RETURN: ---
+        self.datagram_buffer = bytearray(CANETH_HEADER_SIZE + CANETH_MAX_FRAMES_PER_DATAGRAM * CANETH_FRAME_SIZE)
+        CANETH_HEADER_STRUCT.pack_into(self.datagram_buffer, 0, CANETH_MAGIC_ID, CANETH_PROTOCOL_VERSION, 0)
+        self.datagram_view = memoryview(self.datagram_buffer)
+
+    def encode_messages(self, frames):
+        # FUNC: encoding several frames into the preallocated datagram
+        # INPUT: frames as sequence of CanFrame or tuples like for encode_caneth_messages,
+        #        at most CANETH_MAX_FRAMES_PER_DATAGRAM frames
+        # RETURN: message as memoryview, same content as encode_caneth_messages
+        frame_count = len(frames)
+        if frame_count > CANETH_MAX_FRAMES_PER_DATAGRAM:
+            raise ValueError("too many frames for one caneth message: %d" % frame_count)
+        pack_frame = CANETH_FRAME_STRUCT.pack_into
+        buffer = self.datagram_buffer
+        offset = CANETH_HEADER_SIZE
+        for frame in frames:
+            if isinstance(frame, CanFrame):
+                pack_frame(buffer, offset, frame.can_id, frame.dlc, frame.data, frame.flags & CAN_FLAG_EXT,
+                           (frame.flags & CAN_FLAG_RTR) >> 1)
+            else:
+                pack_frame(buffer, offset, frame[0], len(frame[1]), frame[1], frame[2] if len(frame) > 2 else False,
+                           frame[3] if len(frame) > 3 else False)
+            offset += CANETH_FRAME_SIZE
+        buffer[CANETH_HEADER_SIZE - 1] = frame_count
+        return self.datagram_view[:offset]
+
+#*********************************************************************************************************
+class TokenBucket:
+    # Token bucket rate limiter with one token per CAN frame: the tokens are refilled with rate per second up to
+    # burst. reserve() hands out tokens in advance and returns how long the caller has to wait, so the average rate
+    # is kept exactly even if the sleeps of the caller overshoot.
+    def __init__(self, rate, burst):
+        # FUNC: initialize the TokenBucket class, the bucket starts full
+        # INPUT: rate as frames per second
+        #        burst as maximum number of frames sent at once
+        # RETURN: ---
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.numb_of_delayed_requests = 0
+        self.total_wait_time = 0.0  # seconds
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def reserve(self, tokens, now=None):
+        # FUNC: taking tokens, also if they are not available yet
+        # INPUT: tokens as number of frames
+        #        now (float, optional): time.monotonic() of the request
+        # RETURN: seconds the caller has to wait before sending, 0.0 if the tokens were available
+        if now is None:
+            now = time.monotonic()
+        self.refill(now)
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        wait_time = -self.tokens / self.rate
+        self.numb_of_delayed_requests += 1
+        self.total_wait_time += wait_time
+        return wait_time
+
+    def try_consume(self, tokens, now=None):
+        # FUNC: taking tokens only if they are available
+        # RETURN: True if the tokens were taken
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+def get_max_frame_rate(bitrate, ext_flag=False, dlc=8):
+    # FUNC: returns the frames per second a CAN bus can carry in the worst case, e.g. as rate of a TokenBucket
+    # INPUT: bitrate as bit/s; e.g.: 500000
+    #        ext_flag (bool, optional): extended frames. Defaults to False.
+    #        dlc (int, optional): data bytes per frame. Defaults to 8.
+    # RETURN: frames per second as float
+    stuffed_bits = (54 if ext_flag else 34) + 8 * dlc  # SOF to CRC, the bits bit stuffing applies to
+    frame_bits = stuffed_bits + (stuffed_bits - 1) // 4 + 13  # worst-case stuff bits, delimiters, ACK, EOF and IFS
+    return bitrate / frame_bits
+
 #*********************************************************************************************************
 def convert_to_binary_string(input_string):
     # FUNC: converting a string to a binary-string
@@ -78,32 +266,750 @@ def convert_to_binary_string(input_string):
 # Test status: successfull tested
 
 #*********************************************************************************************************
-class Connector:
+def parse_IPv4_filter_entry(input_string):
+    # FUNC: parsing an IPv4 filter entry with an optional subnet prefix and port constraint
+    # INPUT: input_string as string; e.g.: "192.168.0.240", "192.168.0.0/24", "10.0.0.0/8:4210" or "10.1.2.3:4000-4300"
+    # RETURN: tuple (first_address, last_address, first_port, last_port) with the addresses as int
+    address, _, ports = input_string.strip().partition(':')
+    network = ipaddress.IPv4Network(address.strip(), strict=False)  # raises ValueError for invalid entries
+    first_port, last_port = 0, 0xFFFF
+    if ports.strip():
+        first_text, _, last_text = ports.partition('-')
+        first_port = int(first_text)
+        last_port = int(last_text) if last_text.strip() else first_port
+        if not 0 <= first_port <= last_port <= 0xFFFF:
+            raise ValueError("invalid port range: " + ports)
+    return int(network.network_address), int(network.broadcast_address), first_port, last_port
+
+#*********************************************************************************************************
+class CompiledAddressSet:
+    # Sorted-range lookup of IPv4 filter entries. The (possibly overlapping) subnets are split into disjoint
+    # address segments, each with the merged port ranges allowed for it, so a lookup is one binary search.
+    def __init__(self, entries):
+        # FUNC: compiling the entries
+        # INPUT: entries as iterable of strings, see parse_IPv4_filter_entry; invalid entries never match
+        # RETURN: ---
+        ranges = []
+        for entry in entries:
+            try:
+                ranges.append(parse_IPv4_filter_entry(entry))
+            except ValueError:
+                continue
+        boundaries = sorted({first for first, _, _, _ in ranges} | {last + 1 for _, last, _, _ in ranges})
+        self.segment_starts = []
+        self.segment_ports = []  # per segment: list of (first_port, last_port), empty if no entry covers it
+        for segment_start in boundaries:
+            ports = sorted((first_port, last_port) for first, last, first_port, last_port in ranges
+                           if first <= segment_start <= last)
+            self.segment_starts.append(segment_start)
+            self.segment_ports.append(ports)
+
+    def contains(self, address, port=None):
+        # FUNC: checks an address
+        # INPUT: address as int
+        #        port (int, optional): source port, None ignores port constraints
+        # RETURN: True if an entry covers the address and port
+        position = bisect_right(self.segment_starts, address) - 1
+        if position < 0:
+            return False
+        for first_port, last_port in self.segment_ports[position]:
+            if port is None or first_port <= port <= last_port:
+                return True
+        return False
+
+#*********************************************************************************************************
+class IPv4AddressFilter:
+    # Blacklist/whitelist filter for the IPv4 addresses of the gateways, shared by all connectors.
+    # Entries can be single addresses, CIDR subnets and port constraints, see parse_IPv4_filter_entry.
+    # The entries are compiled into a sorted-range lookup whenever the filter changes and the result is cached
+    # per source address, so steady-state traffic costs one dictionary lookup per datagram.
+    MAX_CACHED_SOURCES = 65536
+
+    def __init__(self):
+        self.whitelist_enabled = False  # Flag to enable whitelist filtering.
+        self.blacklist_enabled = False  # Flag to enable blacklist filtering.
+        self.whitelist_IPs = set()  # Set of whitelisted IP addresses and subnets.
+        self.blacklist_IPs = set()  # Set of blacklisted IP addresses and subnets.
+        self.enable_blacklist_IPv4_address()
+
+    def compile_IPv4_filter(self):
+        # FUNC: compiling all filter entries, has to be called after the sets were changed directly
+        # INPUT: ---
+        # RETURN: ---
+        self.compiled_whitelist_IPs = CompiledAddressSet(self.whitelist_IPs)
+        self.compiled_blacklist_IPs = CompiledAddressSet(self.blacklist_IPs)
+        self.IPv4_source_cache = {}  # (IP, port) -> return flag of check_IPv4_source
+
+    def check_IPv4_source(self, input_source):
+        # FUNC: checks the source of a datagram against the active blacklist or whitelist, the result is cached
+        # INPUT: input_source as tuple (IP, port); e.g.: ("192.168.0.240", 4210)
+        # RETURN: 0: blacklisted IP, 1: allowed IP, 2: IP is not whitelisted
+        flag = self.IPv4_source_cache.get(input_source)
+        if flag is None:
+            flag = self.evaluate_IPv4_source(input_source[0], input_source[1])
+            if len(self.IPv4_source_cache) >= self.MAX_CACHED_SOURCES:
+                self.IPv4_source_cache.clear()
+            self.IPv4_source_cache[input_source] = flag
+        return flag
+
+    def check_IPv4_address(self, input_IPv4_address):
+        # FUNC: checks an IPv4 address against the active blacklist or whitelist, port constraints are ignored
+        # INPUT: input_IPv4_address as string; e.g.: "192.168.0.240"
+        # RETURN: 0: blacklisted IP, 1: allowed IP, 2: IP is not whitelisted
+        return self.check_IPv4_source((input_IPv4_address, None))
+
+    def evaluate_IPv4_source(self, input_IPv4_address, input_port):
+        try:
+            address = int(ipaddress.IPv4Address(input_IPv4_address))
+        except ValueError:
+            address = None  # e.g. IPv6 sources never match an entry
+        if self.blacklist_enabled and address is not None and self.compiled_blacklist_IPs.contains(address, input_port):
+            # Message is from a blacklisted IP
+            return 0
+        if not self.whitelist_enabled or (address is not None and self.compiled_whitelist_IPs.contains(address, input_port)):
+            # blacklist enabled or message is allowed through whitelist filter.
+            return 1
+        # message is from a non-whitelisted IP when whitelist is enabled.
+        return 2
+
+    def enable_whitelist_IPv4_address(self):
+        # FUNC: enables or disables whitelist filtering for IPv4 adresses 
+        # INPUT: ---
+        # RETURN: ---
+        self.whitelist_enabled = True
+        self.blacklist_enabled = False
+        self.compile_IPv4_filter()
+
+    def whitelist_add_IPv4_address(self, input_IPv4_address):
+        # FUNC: adds an IPv4 address or subnet to the whitelist
+        # INPUT: input_IPv4_address as string; e.g.: "192.168.0.240", "192.168.0.0/24" or "192.168.0.0/24:4210"
+        # RETURN: ---
+        parse_IPv4_filter_entry(input_IPv4_address)  # raises ValueError for invalid entries
+        self.whitelist_IPs.add(input_IPv4_address)
+        self.compile_IPv4_filter()
+
+    def whitelist_remove_IPv4_address(self, input_IPv4_address):
+        # FUNC: removes an IPv4 address from the whitelist
+        # INPUT: input_IPv4_address as string
+        # RETURN: ---
+        self.whitelist_IPs.discard(input_IPv4_address)
+        self.compile_IPv4_filter()
+
+    def whitelist_clear_IPv4_addresses(self):
+        # FUNC: removes all IPv4 addresses from the whitelist
+        # RETURN: ---
+        self.whitelist_IPs.clear()
+        self.compile_IPv4_filter()
+
+    def enable_blacklist_IPv4_address(self):
+        # FUNC: enables blacklist filtering for IPv4 adresses 
+        # INPUT: ---
+        # RETURN: ---
+        self.whitelist_enabled = False
+        self.blacklist_enabled = True
+        self.compile_IPv4_filter()
+        
+    def blacklist_add_IPv4_address(self, input_IPv4_address):
+        # FUNC: adds an IPv4 address or subnet to the blacklist
+        # INPUT: input_IPv4_address as string; e.g.: "192.168.0.240", "192.168.0.0/24" or "192.168.0.0/24:4210"
+        # RETURN: ---
+        parse_IPv4_filter_entry(input_IPv4_address)  # raises ValueError for invalid entries
+        self.blacklist_IPs.add(input_IPv4_address)
+        self.compile_IPv4_filter()
+    
+    def blacklist_remove_IPv4_address(self, input_IPv4_address):
+        # FUNC: removes an IPv4 address from the blacklist
+        # INPUT: input_IPv4_address as string
+        # RETURN: ---
+        self.blacklist_IPs.discard(input_IPv4_address)
+        self.compile_IPv4_filter()
+
+    def blacklist_clear_IPv4_addresses(self):
+        # FUNC: removes all IPv4 addresses from the blacklist
+        # RETURN: ---
+        self.blacklist_IPs.clear()
+        self.compile_IPv4_filter()
+
+    def load_IPv4_filter(self, input_filter):
+        # FUNC: replacing the mode and all entries with the ones of another filter in one step, e.g. of a
+        #       filter built and validated from new settings
+        # INPUT: input_filter as IPv4AddressFilter
+        # RETURN: ---
+        self.whitelist_enabled = input_filter.whitelist_enabled
+        self.blacklist_enabled = input_filter.blacklist_enabled
+        self.whitelist_IPs = set(input_filter.whitelist_IPs)
+        self.blacklist_IPs = set(input_filter.blacklist_IPs)
+        self.compile_IPv4_filter()
+
+#*********************************************************************************************************
+CAN_STANDARD_ID_COUNT = 0x800  # 11 bit identifiers, 0x000 to 0x7FF
+CAN_EXTENDED_ID_MAX = 0x1FFFFFFF  # 29 bit identifiers
+
+class CompiledIdSet:
+    # Precomputed set of CAN-IDs built from exact IDs, ID ranges and acceptance code/mask pairs:
+    #   standard IDs: 2048-bit bitmap, one lookup per frame
+    #   extended IDs: exact IDs in a set, ranges as sorted merged intervals, code/mask pairs grouped by mask
+    # The cost per lookup depends on the number of distinct masks, not on the number of entries.
+    def __init__(self, IDs=(), ranges=(), masks=()):
+        # FUNC: compiling the entries
+        # INPUT: IDs as iterable of int
+        #        ranges as iterable of tuples (first_ID, last_ID), both included
+        #        masks as iterable of tuples (code, mask); an ID matches if ID & mask == code & mask
+        # RETURN: ---
+        bitmap = bytearray(CAN_STANDARD_ID_COUNT // 8)
+        extended_IDs = set()
+        for can_id in IDs:
+            if can_id < CAN_STANDARD_ID_COUNT:
+                bitmap[can_id >> 3] |= 1 << (can_id & 7)
+            else:
+                extended_IDs.add(can_id)
+
+        intervals = []
+        for first_ID, last_ID in ranges:
+            for can_id in range(first_ID, min(last_ID, CAN_STANDARD_ID_COUNT - 1) + 1):
+                bitmap[can_id >> 3] |= 1 << (can_id & 7)
+            if last_ID >= CAN_STANDARD_ID_COUNT:
+                intervals.append((max(first_ID, CAN_STANDARD_ID_COUNT), last_ID))
+        # merging overlapping and adjacent intervals
+        intervals.sort()
+        merged = []
+        for first_ID, last_ID in intervals:
+            if merged and first_ID <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last_ID)
+            else:
+                merged.append([first_ID, last_ID])
+
+        mask_table = {}
+        for code, mask in masks:
+            mask_table.setdefault(mask, set()).add(code & mask)
+            # standard IDs are resolved into the bitmap once
+            for can_id in range(CAN_STANDARD_ID_COUNT):
+                if can_id & mask == code & mask:
+                    bitmap[can_id >> 3] |= 1 << (can_id & 7)
+
+        self.bitmap = bytes(bitmap)
+        self.extended_IDs = frozenset(extended_IDs)
+        self.interval_starts = [first_ID for first_ID, _ in merged]
+        self.interval_ends = [last_ID for _, last_ID in merged]
+        self.mask_table = [(mask, frozenset(codes)) for mask, codes in mask_table.items()]
+
+    def contains_extended(self, can_id):
+        # FUNC: checks an ID above 0x7FF
+        if can_id in self.extended_IDs:
+            return True
+        if self.interval_starts:
+            position = bisect_right(self.interval_starts, can_id) - 1
+            if position >= 0 and can_id <= self.interval_ends[position]:
+                return True
+        for mask, codes in self.mask_table:
+            if can_id & mask in codes:
+                return True
+        return False
+
+    def __contains__(self, can_id):
+        if can_id < CAN_STANDARD_ID_COUNT:
+            return (self.bitmap[can_id >> 3] >> (can_id & 7)) & 1 == 1
+        return self.contains_extended(can_id)
+
+    def contains_array(self, can_ids):
+        # FUNC: vectorized lookup, needs numpy
+        # INPUT: can_ids as numpy array of int
+        # RETURN: numpy array of bool
+        can_ids = np.asarray(can_ids, dtype=np.uint32)
+        result = np.zeros(can_ids.shape, dtype=bool)
+        standard = can_ids < CAN_STANDARD_ID_COUNT
+        bits = np.unpackbits(np.frombuffer(self.bitmap, dtype=np.uint8), bitorder='little').astype(bool)
+        result[standard] = bits[can_ids[standard]]
+        extended_IDs = can_ids[~standard]
+        if extended_IDs.size:
+            matches = np.isin(extended_IDs, np.fromiter(self.extended_IDs, dtype=np.uint32, count=len(self.extended_IDs)))
+            if self.interval_starts:
+                position = np.searchsorted(np.asarray(self.interval_starts, dtype=np.uint32), extended_IDs, side='right') - 1
+                ends = np.asarray(self.interval_ends, dtype=np.uint32)
+                matches |= (position >= 0) & (extended_IDs <= ends[np.maximum(position, 0)])
+            for mask, codes in self.mask_table:
+                matches |= np.isin(extended_IDs & np.uint32(mask), np.fromiter(codes, dtype=np.uint32, count=len(codes)))
+            result[~standard] = matches
+        return result
+
+#*********************************************************************************************************
+def parse_msgID_filter_entry(input_string):
+    # FUNC: parsing a CAN-ID filter entry typed in the GUI, several entries can be separated by commas
+    # INPUT: input_string as string; e.g.: "69", "0x45", "0x100-0x1FF" (range) or "0x18FEF100/0x1FFFFF00" (code/mask)
+    # RETURN: list of tuples ("ID", can_id), ("range", first_ID, last_ID) or ("mask", code, mask)
+    def parse_int(text):
+        text = text.strip()
+        try:
+            return int(text, 0)
+        except ValueError:
+            return int(text, 10)  # decimal numbers with leading zeros
+
+    entries = []
+    for part in input_string.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '/' in part:
+            code, mask = part.split('/', 1)
+            entries.append(("mask", parse_int(code), parse_int(mask)))
+        elif '-' in part:
+            first_ID, last_ID = part.split('-', 1)
+            first_ID, last_ID = parse_int(first_ID), parse_int(last_ID)
+            entries.append(("range", min(first_ID, last_ID), max(first_ID, last_ID)))
+        else:
+            entries.append(("ID", parse_int(part)))
+    return entries
+
+#*********************************************************************************************************
+class CanIdFilter:
+    # Blacklist/whitelist filter for CAN-IDs, shared by the MessageLogger and the connectors.
+    # Besides exact IDs the lists accept ID ranges and acceptance code/mask pairs like a CAN controller.
+    # All entries are compiled into one CompiledIdSet per list whenever the filter changes, so checking
+    # a frame costs one bitmap lookup for standard IDs, independent of the list sizes.
+    def __init__(self):
+        self.whitelist_enabled = False
+        self.blacklist_enabled = True
+        self.whitelist_IDs = set()  # Set of whitelisted CAN-IDs.
+        self.blacklist_IDs = set()  # Set of blacklisted CAN-IDs.
+        self.whitelist_ID_ranges = set()  # Set of whitelisted CAN-ID ranges (first_ID, last_ID).
+        self.blacklist_ID_ranges = set()  # Set of blacklisted CAN-ID ranges (first_ID, last_ID).
+        self.whitelist_ID_masks = set()  # Set of whitelisted acceptance (code, mask) pairs.
+        self.blacklist_ID_masks = set()  # Set of blacklisted acceptance (code, mask) pairs.
+        self.compile_msgID_filter()
+
+    def compile_msgID_filter(self):
+        # FUNC: compiling all filter entries, has to be called after the sets were changed directly
+        # INPUT: ---
+        # RETURN: ---
+        self.compiled_whitelist = CompiledIdSet(self.whitelist_IDs, self.whitelist_ID_ranges, self.whitelist_ID_masks)
+        self.compiled_blacklist = CompiledIdSet(self.blacklist_IDs, self.blacklist_ID_ranges, self.blacklist_ID_masks)
+        # one combined bitmap of all accepted standard IDs for the active filter mode
+        accepted = bytearray(b'\xff' * (CAN_STANDARD_ID_COUNT // 8))
+        for index in range(len(accepted)):
+            if self.whitelist_enabled:
+                accepted[index] &= self.compiled_whitelist.bitmap[index]
+            if self.blacklist_enabled:
+                accepted[index] &= ~self.compiled_blacklist.bitmap[index] & 0xFF
+        self.accepted_standard_IDs = bytes(accepted)
+
+    def check_msgID(self, input_msgID):
+        # FUNC: checks a CAN-ID against the active blacklist or whitelist
+        # INPUT: input_msgID as int
+        # RETURN: True if the ID is allowed
+        if input_msgID < CAN_STANDARD_ID_COUNT:
+            return (self.accepted_standard_IDs[input_msgID >> 3] >> (input_msgID & 7)) & 1 == 1
+        if self.blacklist_enabled and self.compiled_blacklist.contains_extended(input_msgID):
+            # Message from blacklisted ID
+            return False
+        # Message not from an whitelisted ID, when the whitelist is enabled
+        return (not self.whitelist_enabled) or self.compiled_whitelist.contains_extended(input_msgID)
+
+    def filter_messages(self, messages):
+        # FUNC: returns the allowed messages of a batch
+        # INPUT: messages as list of CanFrame
+        # RETURN: list of CanFrame
+        accepted_standard_IDs = self.accepted_standard_IDs
+        check_msgID = self.check_msgID
+        return [message for message in messages
+                if ((accepted_standard_IDs[message.can_id >> 3] >> (message.can_id & 7)) & 1 if message.can_id < CAN_STANDARD_ID_COUNT
+                    else check_msgID(message.can_id))]
+
+    def check_msgIDs(self, can_ids):
+        # FUNC: vectorized check of a whole batch of CAN-IDs, e.g. a column of a FrameRingBuffer, needs numpy
+        # INPUT: can_ids as numpy array of int
+        # RETURN: numpy array of bool, True for allowed IDs
+        if np is None:
+            raise RuntimeError("numpy is required for CanIdFilter.check_msgIDs")
+        result = np.ones(np.shape(can_ids), dtype=bool)
+        if self.whitelist_enabled:
+            result &= self.compiled_whitelist.contains_array(can_ids)
+        if self.blacklist_enabled:
+            result &= ~self.compiled_blacklist.contains_array(can_ids)
+        return result
+
+    def enable_whitelist_msgID(self):
+        # FUNC: enables or disables whitelist filtering for ID
+        # INPUT: ---
+        # RETURN: ---
+        self.whitelist_enabled = True
+        self.blacklist_enabled = False
+        self.compile_msgID_filter()
+
+    def whitelist_add_msgID(self, input_msgID):
+        # FUNC: adds an ID to the whitelist
+        # INPUT: input_msgID as int
+        # RETURN: ---
+        self.whitelist_IDs.add(input_msgID)
+        self.compile_msgID_filter()
+
+    def whitelist_add_msgID_range(self, input_first_msgID, input_last_msgID):
+        # FUNC: adds an ID range to the whitelist; e.g.: 0x18FEF000, 0x18FEF0FF
+        # INPUT: input_first_msgID, input_last_msgID as int, both included
+        # RETURN: ---
+        self.whitelist_ID_ranges.add((min(input_first_msgID, input_last_msgID), max(input_first_msgID, input_last_msgID)))
+        self.compile_msgID_filter()
+
+    def whitelist_add_msgID_mask(self, input_code, input_mask):
+        # FUNC: adds an acceptance code/mask pair to the whitelist; e.g.: 0x0CF00400, 0x03FFFF00 for a J1939 PGN
+        # INPUT: input_code, input_mask as int; an ID matches if ID & mask == code & mask
+        # RETURN: ---
+        self.whitelist_ID_masks.add((input_code & input_mask, input_mask))
+        self.compile_msgID_filter()
+
+    def whitelist_remove_msgID(self, input_msgID):
+        # FUNC: removes an ID from the whitelist
+        # INPUT: input_msgID as int
+        # RETURN: ---
+        self.whitelist_IDs.discard(input_msgID)
+        self.compile_msgID_filter()
+    
+    def whitelist_clear_msgIDs(self):
+        # FUNC: removes all IDs, ranges and code/mask pairs from the whitelist
+        # RETURN: ---
+        self.whitelist_IDs.clear()
+        self.whitelist_ID_ranges.clear()
+        self.whitelist_ID_masks.clear()
+        self.compile_msgID_filter()
+
+    def enable_blacklist_msgID(self):
+        # FUNC: enables blacklist filtering for ID 
+        # INPUT: ---
+        # RETURN: ---
+        self.whitelist_enabled = False
+        self.blacklist_enabled = True
+        self.compile_msgID_filter()
+
+    def blacklist_add_msgID(self, input_msgID):
+        # FUNC: adds an ID to the blacklist
+        # INPUT: input_msgID as int
+        # RETURN: ---
+        self.blacklist_IDs.add(input_msgID)
+        self.compile_msgID_filter()
+
+    def blacklist_add_msgID_range(self, input_first_msgID, input_last_msgID):
+        # FUNC: adds an ID range to the blacklist
+        # INPUT: input_first_msgID, input_last_msgID as int, both included
+        # RETURN: ---
+        self.blacklist_ID_ranges.add((min(input_first_msgID, input_last_msgID), max(input_first_msgID, input_last_msgID)))
+        self.compile_msgID_filter()
+
+    def blacklist_add_msgID_mask(self, input_code, input_mask):
+        # FUNC: adds an acceptance code/mask pair to the blacklist
+        # INPUT: input_code, input_mask as int; an ID matches if ID & mask == code & mask
+        # RETURN: ---
+        self.blacklist_ID_masks.add((input_code & input_mask, input_mask))
+        self.compile_msgID_filter()
+    
+    def blacklist_remove_msgID(self, input_msgID):
+        # FUNC: removes an ID from the blacklist
+        # INPUT: input_msgID as int
+        # RETURN: ---
+        self.blacklist_IDs.discard(input_msgID)
+        self.compile_msgID_filter()
+    
+    def blacklist_clear_msgIDs(self):
+        # FUNC: removes all IDs, ranges and code/mask pairs from the blacklist
+        # RETURN: ---
+        self.blacklist_IDs.clear()
+        self.blacklist_ID_ranges.clear()
+        self.blacklist_ID_masks.clear()
+        self.compile_msgID_filter()
+
+    def add_msgID_filter_entries(self, input_string, whitelist):
+        # FUNC: adds IDs, ranges and code/mask pairs typed in the GUI to a list
+        # INPUT: input_string as string, see parse_msgID_filter_entry
+        #        whitelist as bool, False for the blacklist
+        # RETURN: list of parsed entries
+        entries = parse_msgID_filter_entry(input_string)
+        IDs, ranges, masks = ((self.whitelist_IDs, self.whitelist_ID_ranges, self.whitelist_ID_masks) if whitelist
+                              else (self.blacklist_IDs, self.blacklist_ID_ranges, self.blacklist_ID_masks))
+        for entry in entries:
+            if entry[0] == "ID":
+                IDs.add(entry[1])
+            elif entry[0] == "range":
+                ranges.add((entry[1], entry[2]))
+            else:
+                masks.add((entry[1] & entry[2], entry[2]))
+        self.compile_msgID_filter()
+        return entries
+
+    def load_msgID_filter(self, input_filter):
+        # FUNC: replacing the mode and all entries with the ones of another filter in one step, e.g. of a
+        #       filter built and validated from new settings
+        # INPUT: input_filter as CanIdFilter
+        # RETURN: ---
+        self.whitelist_enabled = input_filter.whitelist_enabled
+        self.blacklist_enabled = input_filter.blacklist_enabled
+        self.whitelist_IDs = set(input_filter.whitelist_IDs)
+        self.blacklist_IDs = set(input_filter.blacklist_IDs)
+        self.whitelist_ID_ranges = set(input_filter.whitelist_ID_ranges)
+        self.blacklist_ID_ranges = set(input_filter.blacklist_ID_ranges)
+        self.whitelist_ID_masks = set(input_filter.whitelist_ID_masks)
+        self.blacklist_ID_masks = set(input_filter.blacklist_ID_masks)
+        self.compile_msgID_filter()
+
+#*********************************************************************************************************
+# Receive time stamps, always integer nanoseconds since the epoch
+# kernel:    time stamp taken by the kernel when the datagram arrived (SO_TIMESTAMPNS), free of Python scheduling jitter
+# monotonic: time.monotonic_ns() read right at recvfrom, converted to the epoch with the offset taken at socket creation
+TIMESTAMP_MODE_KERNEL = "kernel"
+TIMESTAMP_MODE_MONOTONIC = "monotonic"
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35 if sys.platform.startswith("linux") else None)  # not exported by every Python
+TIMESPEC_STRUCT = Struct('@ll')  # struct timespec of the SCM_TIMESTAMPNS control message: seconds, nanoseconds
+# Kernel drop counter: with SO_RXQ_OVFL every datagram carries the number of datagrams the kernel dropped on the socket
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+DROP_COUNTER_STRUCT = Struct('@I')
+MAX_COUNTED_GATEWAYS = 1024  # further sources are counted as "other", so spoofed sources can not grow the counters
+
+#*********************************************************************************************************
+class LatencyHistogram:
+    # Histogram of latencies with power of two buckets from 1 us to 16 s. Adding a value costs one bit_length
+    # and one list increment, so the histograms can stay enabled in production.
+    MIN_EXPONENT = 10  # upper bound of the first bucket: 2^10 ns ~ 1 us
+    NUMB_OF_BUCKETS = 25  # upper bound of the last finite bucket: 2^34 ns ~ 17 s, larger values go to +Inf
+
     def __init__(self):
+        self.bucket_counts = [0] * (self.NUMB_OF_BUCKETS + 1)
+        self.count = 0
+        self.sum = 0  # ns
+
+    def add(self, latency):
+        # FUNC: adding a latency
+        # INPUT: latency as int, ns
+        # RETURN: ---
+        index = latency.bit_length() - self.MIN_EXPONENT if latency > 0 else 0
+        self.bucket_counts[min(max(index, 0), self.NUMB_OF_BUCKETS)] += 1
+        self.count += 1
+        self.sum += latency
+
+    def get_bucket_bounds(self):
+        # FUNC: returns the upper bounds of the buckets in ns, the last bucket has no bound (None)
+        return [1 << (self.MIN_EXPONENT + index) for index in range(self.NUMB_OF_BUCKETS)] + [None]
+
+    def get_percentile(self, fraction):
+        # FUNC: returns the upper bound of the bucket containing the given percentile in ns
+        # INPUT: fraction as float; e.g.: 0.99
+        # RETURN: int, None if empty or the percentile is in the +Inf bucket
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        cumulative_count = 0
+        for bound, bucket_count in zip(self.get_bucket_bounds(), self.bucket_counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                return bound
+        return None
+
+    def clear(self):
+        self.bucket_counts = [0] * (self.NUMB_OF_BUCKETS + 1)
+        self.count = 0
+        self.sum = 0
+
+#*********************************************************************************************************
+class Connector(IPv4AddressFilter):
+    def __init__(self, timestamp_mode=TIMESTAMP_MODE_KERNEL, receive_buffer_size=None, UDP_IP="0.0.0.0",
+                 shared_UDP_port=4210, reuse_port=False):
+        # FUNC: initialize the Connector class and open the UDP socket
+        # INPUT: timestamp_mode (string, optional): TIMESTAMP_MODE_KERNEL or TIMESTAMP_MODE_MONOTONIC. Defaults to kernel.
+        #        receive_buffer_size (int, optional): requested SO_RCVBUF in bytes. Defaults to the OS default.
+        #        UDP_IP (string, optional): IP to listen on. Defaults to all network interfaces.
+        #        shared_UDP_port (int, optional): UDP port. Defaults to 4210.
+        #        reuse_port (bool, optional): set SO_REUSEPORT, so several sockets can share the port. Defaults to False.
+        # RETURN: ---
+        super().__init__()
 
         self.target_IP = "192.168.0.240"  # Target IP to send messages to.
-        self.UDP_IP = "0.0.0.0"  # Listen on all network interfaces.
-        self.shared_UDP_port = 4210  # Designated UDP port for communication. Recommenadtion: Using Userports from 1024 to 49151 for IPv4
+        self.UDP_IP = UDP_IP  # Listen on all network interfaces.
+        self.shared_UDP_port = shared_UDP_port  # Designated UDP port for communication. Recommenadtion: Using Userports from 1024 to 49151 for IPv4
+        self.receive_buffer_size = receive_buffer_size  # Requested socket receive buffer in bytes, None for the OS default.
+        self.effective_receive_buffer_size = 0  # Receive buffer size the OS actually granted.
+        self.reuse_port = reuse_port  # SO_REUSEPORT, the kernel distributes the datagrams over all sockets of the port.
+        self.sock = None
         self.recieve_flag = False  # Flag to control message receiving.
-        self.whitelist_enabled = False  # Flag to enable whitelist filtering.
-        self.blacklist_enabled = False  # Flag to enable blacklist filtering.
-        self.whitelist_IPs = set()  # Set of whitelisted IP addresses.
-        self.blacklist_IPs = set()  # Set of blacklisted IP addresses.
+        self.max_batch_size = 256  # Maximum number of datagrams drained from the socket per call of recieve_messages.
+        self.recieve_buffer_pool = [bytearray(2048) for _ in range(self.max_batch_size)]  # Preallocated receive buffers.
+        self.pending_frames = deque()  # Frames of the last datagram not returned by recieve_message yet.
+        self.timestamp_mode = timestamp_mode  # Requested receive time stamp mode, TIMESTAMP_MODE_KERNEL or TIMESTAMP_MODE_MONOTONIC.
+        self.kernel_timestamps_enabled = False  # True if the socket delivers kernel time stamps.
+        self.monotonic_epoch_offset = 0  # time.time_ns() - time.monotonic_ns() at socket creation.
+        self.ancillary_buffer_size = 0  # Size of the control message buffer of recvmsg_into.
+        self.drop_counter_enabled = False  # True if the socket reports kernel drops (SO_RXQ_OVFL).
+
+        # Counters, read by the metrics registry (connector_metrics.py)
+        self.numb_of_received_datagrams = 0
+        self.numb_of_accepted_datagrams = 0
+        self.numb_of_accepted_frames = 0
+        self.numb_of_blacklisted_datagrams = 0  # filtered by the IPv4 blacklist
+        self.numb_of_not_whitelisted_datagrams = 0  # filtered by the IPv4 whitelist
+        self.numb_of_malformed_datagrams = 0  # wrong magic or too short
+        self.numb_of_timeouts = 0
+        self.numb_of_socket_dropped_datagrams = 0  # kernel drops of the current socket
+        self.numb_of_closed_socket_dropped_datagrams = 0  # kernel drops of previous sockets
+        self.datagrams_per_gateway = {}  # IP -> number of received datagrams
+        self.receive_latency = LatencyHistogram()  # receive time stamp -> decoded, per batch
+
+        # Transmit: preallocated datagram and the rate limits per gateway (see set_transmit_rate)
+        self.my_transmit_buffer = CanethTransmitBuffer()
+        self.transmit_lock = threading.Lock()  # the GUI, the cyclic scheduler and the replay may send concurrently
+        self.default_transmit_limit = None  # (rate, burst) of gateways without own limit, None for unlimited
+        self.transmit_limits = {}  # target IP -> (rate, burst) or None
+        self.transmit_buckets = {}  # target IP -> TokenBucket
+        self.numb_of_sent_frames = 0
+        self.numb_of_sent_datagrams = 0
 
         # setup UDP socket with default values
         self.update_UDP_socket(self.UDP_IP, self.shared_UDP_port)
-        self.enable_blacklist_IPv4_address()
 
     def update_UDP_socket(self, input_UDP_IP, input_shared_UDP_port):
         # FUNC: updating the UDP socket with the new UDP_IP the connector should listen
         # INPUT: input_UDP_IP as string;     e.g.: "0.0.0.0"
         #        input_shared_UDP_port as int
         # RETURN: ---
+        # the new socket is bound while the previous one is still open, so a failed bind keeps the previous socket;
+        # only if the bind fails (e.g. "address in use" by the previous socket itself) the previous socket is closed
+        # and the bind is tried again, the previous address is bound again if that fails too
+        previous_sock = self.sock
+        previous_address = previous_sock.getsockname() if previous_sock is not None else None
+        try:
+            new_sock = self.create_UDP_socket(input_UDP_IP, input_shared_UDP_port)
+        except OSError:
+            if previous_sock is None:
+                raise
+            previous_sock.close()
+            self.sock = None
+            try:
+                new_sock = self.create_UDP_socket(input_UDP_IP, input_shared_UDP_port)
+            except OSError:
+                # keep listening on the previous address
+                self.sock = self.create_UDP_socket(*previous_address)
+                self.setup_timestamping()
+                self.setup_drop_counter()
+                raise
+        if previous_sock is not None:
+            previous_sock.close()
+        self.sock = new_sock
         self.UDP_IP = input_UDP_IP
         self.shared_UDP_port = input_shared_UDP_port
-        # updating UDP socket
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((self.UDP_IP, self.shared_UDP_port))
+        self.setup_timestamping()
+        self.setup_drop_counter()
+
+    def create_UDP_socket(self, input_UDP_IP, input_shared_UDP_port):
+        # FUNC: creating and binding a UDP socket with the configured socket options
+        # INPUT: input_UDP_IP as string, input_shared_UDP_port as int
+        # RETURN: socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self.reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            if self.receive_buffer_size:
+                self.apply_receive_buffer_size(sock, self.receive_buffer_size)
+            sock.bind((input_UDP_IP, input_shared_UDP_port))
+        except (OSError, AttributeError) as error:
+            sock.close()
+            if isinstance(error, AttributeError):  # no SO_REUSEPORT, e.g. on Windows
+                raise OSError("SO_REUSEPORT is not supported on this platform") from error
+            raise
+        self.effective_receive_buffer_size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        return sock
+
+    def apply_receive_buffer_size(self, sock, size):
+        # the OS limits SO_RCVBUF (Linux: net.core.rmem_max), SO_RCVBUFFORCE ignores the limit with CAP_NET_ADMIN
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+        SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33 if sys.platform.startswith("linux") else None)
+        if SO_RCVBUFFORCE is not None and sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) < size:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, size)
+            except OSError:
+                pass  # not permitted, the OS limit stays
+
+    def set_receive_buffer_size(self, input_receive_buffer_size):
+        # FUNC: changing the receive buffer size of the socket
+        # INPUT: input_receive_buffer_size as int, bytes; None keeps the current size for future sockets
+        # RETURN: effective receive buffer size in bytes, Linux reports twice the requested size for its bookkeeping
+        self.receive_buffer_size = input_receive_buffer_size
+        if input_receive_buffer_size:
+            self.apply_receive_buffer_size(self.sock, input_receive_buffer_size)
+        self.effective_receive_buffer_size = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        return self.effective_receive_buffer_size
+
+    def setup_timestamping(self):
+        # FUNC: enabling the requested receive time stamps on the socket, falls back to monotonic time stamps
+        #       if the platform has no kernel time stamps
+        # INPUT: ---
+        # RETURN: ---
+        # the epoch offset is anchored once per socket, so all time stamps of a socket share the same clock
+        self.monotonic_epoch_offset = time.time_ns() - time.monotonic_ns()
+        self.kernel_timestamps_enabled = False
+        if self.timestamp_mode == TIMESTAMP_MODE_KERNEL and SO_TIMESTAMPNS is not None:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                self.kernel_timestamps_enabled = True
+            except OSError:
+                pass
+        self.update_ancillary_buffer_size()
+
+    def setup_drop_counter(self):
+        # FUNC: enabling the kernel drop counter (SO_RXQ_OVFL) of a new socket, if the platform has it
+        # INPUT: ---
+        # RETURN: ---
+        self.numb_of_closed_socket_dropped_datagrams += self.numb_of_socket_dropped_datagrams
+        self.numb_of_socket_dropped_datagrams = 0
+        self.drop_counter_enabled = False
+        if SO_RXQ_OVFL is not None:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.drop_counter_enabled = True
+            except OSError:
+                pass
+        self.update_ancillary_buffer_size()
+
+    def update_ancillary_buffer_size(self):
+        # control messages are only received with recvmsg_into if time stamps or drop counters are enabled
+        self.ancillary_buffer_size = 0
+        if self.kernel_timestamps_enabled:
+            self.ancillary_buffer_size += socket.CMSG_SPACE(TIMESPEC_STRUCT.size)
+        if getattr(self, "drop_counter_enabled", False):
+            self.ancillary_buffer_size += socket.CMSG_SPACE(DROP_COUNTER_STRUCT.size)
+
+    def get_numb_of_kernel_dropped_datagrams(self):
+        # FUNC: returns the number of datagrams the kernel dropped because the socket buffer was full
+        # INPUT: ---
+        # RETURN: int, counted since the Connector was created; only updated when a datagram is received
+        return self.numb_of_closed_socket_dropped_datagrams + self.numb_of_socket_dropped_datagrams
+
+    def set_timestamp_mode(self, input_timestamp_mode):
+        # FUNC: changing the receive time stamp mode
+        # INPUT: input_timestamp_mode as TIMESTAMP_MODE_KERNEL or TIMESTAMP_MODE_MONOTONIC
+        # RETURN: True if kernel time stamps are used
+        if input_timestamp_mode not in (TIMESTAMP_MODE_KERNEL, TIMESTAMP_MODE_MONOTONIC):
+            raise ValueError("unknown time stamp mode: " + str(input_timestamp_mode))
+        self.timestamp_mode = input_timestamp_mode
+        if self.kernel_timestamps_enabled and input_timestamp_mode != TIMESTAMP_MODE_KERNEL:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 0)
+        self.setup_timestamping()
+        return self.kernel_timestamps_enabled
+
+    def recieve_datagram_into(self, buffer):
+        # FUNC: recieving one datagram into a buffer with its receive time stamp
+        # INPUT: buffer as bytearray
+        # RETURN: nbytes as int
+        #         addr as tuple (IP, port) of the sender
+        #         timestamp as int, nanoseconds since the epoch
+        if self.ancillary_buffer_size:
+            nbytes, ancdata, _, addr = self.sock.recvmsg_into((buffer,), self.ancillary_buffer_size)
+            timestamp = None
+            for level, message_type, data in ancdata:
+                if level == socket.SOL_SOCKET:
+                    if message_type == SO_TIMESTAMPNS:  # SCM_TIMESTAMPNS == SO_TIMESTAMPNS
+                        seconds, nanoseconds = TIMESPEC_STRUCT.unpack_from(data)
+                        timestamp = seconds * 1000000000 + nanoseconds
+                    elif message_type == SO_RXQ_OVFL:
+                        self.numb_of_socket_dropped_datagrams = DROP_COUNTER_STRUCT.unpack_from(data)[0]
+            if timestamp is None:
+                timestamp = time.monotonic_ns() + self.monotonic_epoch_offset
+            return nbytes, addr, timestamp
+        nbytes, addr = self.sock.recvfrom_into(buffer)
+        return nbytes, addr, time.monotonic_ns() + self.monotonic_epoch_offset
     
     def get_UDP_socket_info(self):
         # FUNC: returns the current Socket information
@@ -118,39 +1024,118 @@ class Connector:
         # RETURN: ---
         self.target_IP = input_target_IP
 
-    def send_message(self, input_can_id_hex, input_can_data_hex):
+    def set_transmit_rate(self, rate, burst=CANETH_MAX_FRAMES_PER_DATAGRAM, target_IP=None):
+        # FUNC: limiting the frames sent to a gateway with a token bucket. The gateway blocks while the TX queue of its
+        #       CAN controller (5 frames) is full, datagrams arriving meanwhile are dropped inside the gateway.
+        # INPUT: rate as frames per second, None removes the limit; e.g.: 0.9 * get_max_frame_rate(500000)
+        #        burst (int, optional): frames sent at once, also the maximum frames per datagram. Defaults to 97.
+        #        target_IP (string, optional): limit of one gateway. Defaults to all gateways without own limit.
+        # RETURN: ---
+        limit = (rate, max(1, int(burst))) if rate else None
+        with self.transmit_lock:
+            if target_IP is None:
+                self.default_transmit_limit = limit
+                self.transmit_buckets.clear()
+            else:
+                self.transmit_limits[target_IP] = limit
+                self.transmit_buckets.pop(target_IP, None)
+
+    def get_transmit_bucket(self, target_IP):
+        # returns the token bucket of a gateway, None if it is not limited; called with the transmit_lock
+        bucket = self.transmit_buckets.get(target_IP)
+        if bucket is None:
+            limit = self.transmit_limits.get(target_IP, self.default_transmit_limit)
+            if limit is None:
+                return None
+            bucket = self.transmit_buckets[target_IP] = TokenBucket(*limit)
+        return bucket
+
+    def reserve_transmit(self, bucket, numb_of_frames):
+        # taking the tokens of a datagram from the token bucket of its gateway under the transmit_lock
+        # RETURN: seconds the caller has to wait before sending, the caller sleeps without holding the lock,
+        #         so other senders and gateways are not blocked by a paced datagram
+        if bucket is None:
+            return 0.0
+        with self.transmit_lock:
+            return bucket.reserve(numb_of_frames)
+
+    def transmit(self, address, numb_of_frames, encoded_message):
+        # sending an encoded datagram; called with the transmit_lock if encoded_message is the shared datagram buffer
+        self.sock.sendto(encoded_message, address)
+        self.numb_of_sent_frames += numb_of_frames
+        self.numb_of_sent_datagrams += 1
+
+    def get_transmit_statistics(self):
+        # FUNC: returns the transmit counters of all gateways
+        # RETURN: dictionary
+        with self.transmit_lock:
+            buckets = list(self.transmit_buckets.values())
+        return {"sent_frames": self.numb_of_sent_frames, "sent_datagrams": self.numb_of_sent_datagrams,
+                "delayed_datagrams": sum(bucket.numb_of_delayed_requests for bucket in buckets),
+                "wait_time": sum(bucket.total_wait_time for bucket in buckets)}
+
+    def send_message(self, input_can_id_hex, input_can_data_hex, ext_flag=False, rtr_flag=False):
         # FUNC: sending a caneth message
         # INPUT:    input_can_id_hex as hex-number;     e.g.: 0x123
         #           input_can_data_hex as byte-string;  e.g.: b'\x01\x02\x03\x04\x05\xFH\xFG\xFF'
+        #           ext_flag, rtr_flag (bool, optional): extended ID and remote frame. Defaults to False.
         # RETURN: ---
-        encoded_message = encode_caneth_message(input_can_id_hex, input_can_data_hex)
-        self.sock.sendto(encoded_message, (self.target_IP, self.shared_UDP_port))
+        encoded_message = encode_caneth_message(input_can_id_hex, input_can_data_hex, ext_flag, rtr_flag)
+        address = (self.target_IP, self.shared_UDP_port)
+        if self.default_transmit_limit is not None or self.transmit_limits:  # without any limit nothing needs the lock
+            with self.transmit_lock:
+                bucket = self.get_transmit_bucket(address[0])
+            wait_time = self.reserve_transmit(bucket, 1)
+            if wait_time > 0:
+                time.sleep(wait_time)
+        self.transmit(address, 1, encoded_message)
     # Test status: successfull tested
 
+    def send_messages(self, input_frames):
+        # FUNC: sending several CAN frames with as few caneth messages as possible, paced by the rate limit of the gateway
+        # INPUT:    input_frames as list of CanFrame or tuples (can_id_hex, data_hex) or (can_id_hex, data_hex, ext_flag, rtr_flag)
+        #           e.g.: [(0x123, b'\x01\x02\x03'), (0x45, b'\xFF', False, False)]
+        # RETURN: number of sent caneth messages
+        address = (self.target_IP, self.shared_UDP_port)
+        numb_of_sent_messages = 0
+        with self.transmit_lock:
+            bucket = self.get_transmit_bucket(address[0])
+        # a datagram never needs more tokens than the bucket holds
+        frames_per_datagram = CANETH_MAX_FRAMES_PER_DATAGRAM if bucket is None else \
+            min(CANETH_MAX_FRAMES_PER_DATAGRAM, int(bucket.burst))
+        for start in range(0, len(input_frames), frames_per_datagram):
+            frames = input_frames[start:start + frames_per_datagram]
+            wait_time = self.reserve_transmit(bucket, len(frames))
+            if wait_time > 0:
+                time.sleep(wait_time)
+            with self.transmit_lock:  # the datagram buffer is shared by all senders
+                self.transmit(address, len(frames), self.my_transmit_buffer.encode_messages(frames))
+            numb_of_sent_messages += 1
+        return numb_of_sent_messages
+
     def recieve_message(self):
-        # FUNC: recieving a caneth message and decoding it
+        # FUNC: recieving a caneth message and decoding it; a datagram can contain up to 97 frames, the frames
+        #       after the first one are returned by the next calls. recieve_messages returns whole batches at once.
         # INPUT: ---
-        # RETURN: message
+        # RETURN: return_flag as int, message as CanFrame or None
 
         return_flag = -1 
         return_message = None
 
+        if self.pending_frames:
+            return 1, self.pending_frames.popleft()
+
         if True == self.recieve_flag:
             self.sock.settimeout(1.0)  # set timeout to 1 second for non-blocking receive
 
             try:
-                rec_data, addr = self.sock.recvfrom(2048)  # attempt to receive data.
-                if self.blacklist_enabled and addr[0] in self.blacklist_IPs:
-                    # Message is from a blacklisted IP
-                    return_flag = 0  # special flag indicating blocked message.
-                elif not self.whitelist_enabled or addr[0] in self.whitelist_IPs:
-                    # blacklist enabled or message is allowed through whitelist filter.
-                    decoded_message = decode_caneth_message(rec_data)
-                    return_message = decoded_message
-                    return_flag = 1  # flag indicating successful message reception.
-                else:
-                    # message is from a non-whitelisted IP when whitelist is enabled.
-                    return_flag = 2  # flag indicating message ignored.
+                buffer = self.recieve_buffer_pool[0]
+                nbytes, addr, timestamp = self.recieve_datagram_into(buffer)  # attempt to receive data.
+                return_flag = self.check_IPv4_source(addr)
+                if 1 == return_flag:
+                    self.pending_frames.extend(decode_caneth_messages(buffer[:nbytes], timestamp))
+                    if self.pending_frames:
+                        return_message = self.pending_frames.popleft()
             except socket.timeout:
                 # no data received within timeout period.
                 pass
@@ -158,6 +1143,75 @@ class Connector:
         return return_flag, return_message
     # Test status: successfull tested
 
+    def recieve_messages(self, timeout=1.0):
+        # FUNC: waiting for caneth messages and draining all pending messages of the socket in one batch
+        # INPUT: timeout (float, optional): maximum time in seconds to wait for the first message
+        # RETURN: return_flag as int; -1: nothing received, 1: at least one accepted message,
+        #                             0/2: only messages from blacklisted/non-whitelisted IPs
+        #         messages as list of CanFrame of all accepted caneth messages
+
+        return_flag = -1
+        return_messages = []
+
+        if self.pending_frames:  # frames of a datagram partly returned by recieve_message
+            return_messages = list(self.pending_frames)
+            self.pending_frames.clear()
+            return 1, return_messages
+
+        if True == self.recieve_flag:
+            sock = self.sock
+            if sock.gettimeout() != 0.0:
+                sock.setblocking(False)  # the socket stays non blocking, waiting is done by select
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                # no data received within timeout period.
+                self.numb_of_timeouts += 1
+                return return_flag, return_messages
+
+            # drain the socket first to empty the kernel queue fast, decode afterwards
+            received = []
+            recieve_datagram_into = self.recieve_datagram_into
+            for buffer in self.recieve_buffer_pool[:self.max_batch_size]:
+                try:
+                    received.append((buffer,) + recieve_datagram_into(buffer))
+                except (BlockingIOError, InterruptedError):
+                    break
+
+            check_IPv4_source = self.check_IPv4_source
+            datagrams_per_gateway = self.datagrams_per_gateway
+            for buffer, nbytes, address, timestamp in received:
+                gateway = address[0]
+                if gateway in datagrams_per_gateway:
+                    datagrams_per_gateway[gateway] += 1
+                elif len(datagrams_per_gateway) < MAX_COUNTED_GATEWAYS:
+                    datagrams_per_gateway[gateway] = 1
+                else:
+                    datagrams_per_gateway["other"] = datagrams_per_gateway.get("other", 0) + 1
+                flag = check_IPv4_source(address)
+                if 1 == flag:
+                    messages = decode_caneth_messages(memoryview(buffer)[:nbytes], timestamp)
+                    if not messages:
+                        self.numb_of_malformed_datagrams += 1
+                        continue
+                    return_messages += messages
+                    self.numb_of_accepted_datagrams += 1
+                    return_flag = 1
+                else:
+                    if 0 == flag:
+                        self.numb_of_blacklisted_datagrams += 1
+                    else:
+                        self.numb_of_not_whitelisted_datagrams += 1
+                    if 1 != return_flag:
+                        return_flag = flag
+            self.numb_of_received_datagrams += len(received)
+            self.numb_of_accepted_frames += len(return_messages)
+            if received:
+                # the oldest datagram of the batch waited longest
+                self.receive_latency.add(time.time_ns() - received[0][3])
+
+        return return_flag, return_messages
+    # Test status: successfull tested
+
     def toggle_recieving_message(self, input_rec_flag):
         # FUNC: toggeling to recieve messages on and off
         # INPUT: input_rec_falg as boolean
@@ -165,110 +1219,114 @@ class Connector:
         self.recieve_flag =  input_rec_flag
     # Test status: successfull tested
 
-    def enable_whitelist_IPv4_address(self):
-        # FUNC: enables or disables whitelist filtering for IPv4 adresses 
-        # INPUT: ---
-        # RETURN: ---
-        self.whitelist_enabled = True
-        self.blacklist_enabled = False
-
-    def whitelist_add_IPv4_address(self, input_IPv4_address):
-        # FUNC: adds an IPv4 address to the whitelist
-        # INPUT: input_IPv4_address as string; e.g.: "192.168.0.240"
-        # RETURN: ---
-        self.whitelist_IPs.add(input_IPv4_address)
-
-    def whitelist_remove_IPv4_address(self, input_IPv4_address):
-        # FUNC: removes an IPv4 address from the whitelist
-        # INPUT: input_IPv4_address as string
-        # RETURN: ---
-        self.whitelist_IPs.discard(input_IPv4_address)
-
-    def whitelist_clear_IPv4_addresses(self):
-        # FUNC: removes all IPv4 addresses from the whitelist
-        # RETURN: ---
-        self.whitelist_IPs.clear()
-
-    def enable_blacklist_IPv4_address(self):
-        # FUNC: enables blacklist filtering for IPv4 adresses 
+    def close(self):
+        # FUNC: closing the UDP socket
         # INPUT: ---
         # RETURN: ---
-        self.whitelist_enabled = False
-        self.blacklist_enabled = True
-        
-    def blacklist_add_IPv4_address(self, input_IPv4_address):
-        # FUNC: adds an IPv4 address to the blacklist
-        # INPUT: input_IPv4_address as string
-        # RETURN: ---
-        self.blacklist_IPs.add(input_IPv4_address)
-    
-    def blacklist_remove_IPv4_address(self, input_IPv4_address):
-        # FUNC: removes an IPv4 address from the blacklist
-        # INPUT: input_IPv4_address as string
-        # RETURN: ---
-        self.blacklist_IPs.discard(input_IPv4_address)
-
-    def blacklist_clear_IPv4_addresses(self):
-        # FUNC: removes all IPv4 addresses from the blacklist
-        # RETURN: ---
-        self.blacklist_IPs.clear()
+        self.recieve_flag = False
+        self.sock.close()
 
 #*********************************************************************************************************
 #from collections import deque
-class MessageLogger:
-    def __init__(self, max_recent_messages=10, exact_message_count=10):
+class MessageLogger(CanIdFilter):
+    def __init__(self, max_recent_messages=10, exact_message_count=10, storage_factory=None):
         # FUNC: initialize the MessageLogger class
         # INPUT: max_recent_messages (int, optional): Maximum number of recent messages to be stored. Defaults to 10.
         #        exact_message_count (int, optional): Exact number of messages to be stored. Defaults to 10.
+        #                                             None stores all messages, 0 none, see create_storage.
+        #        storage_factory (callable, optional): creates the storage for a maximum number of messages,
+        #                                              e.g. FrameRingBuffer. Defaults to a deque.
         # RETURN: ---
+        super().__init__()
+        self.storage_factory = storage_factory
         self.max_recent_messages = max_recent_messages  # Maximum number of recent messages
-        self.recent_messages = deque(maxlen=max_recent_messages) if max_recent_messages else []  # Recent messages deque
+        self.recent_messages = self.create_storage(max_recent_messages)  # Recent messages deque
 
         self.exact_message_count = exact_message_count  # Exact number of messages to be stored
-        self.exact_messages = deque(maxlen=exact_message_count) if exact_message_count else []  # Exact messages deque
+        self.exact_messages = self.create_storage(exact_message_count)  # Exact messages deque
 
-        self.whitelist_enabled = False
-        self.blacklist_enabled = True
-        self.whitelist_IDs = set()  # Set of whitelisted IP addresses.
-        self.blacklist_IDs = set()  # Set of blacklisted IP addresses.
+        self.capture_writer = None  # optional CaptureWriter, accepted messages are recorded to disk
+        self.numb_of_ID_filtered_messages = 0  # messages rejected by the CAN-ID filter
+
+    def create_storage(self, maxlen, messages=()):
+        # FUNC: creating the storage for messages
+        # INPUT: maxlen (int or None): maximum number of messages, 0 stores no messages, None stores all messages
+        #        messages (iterable, optional): messages to be stored, the newest are kept
+        # RETURN: storage with append, extend, clear and iteration like a deque
+        if maxlen is not None and maxlen < 0:
+            raise ValueError("maxlen must not be negative")
+        if self.storage_factory is None or not maxlen:  # the storage factory needs a positive maximum
+            return deque(messages, maxlen=maxlen)
+        storage = self.storage_factory(maxlen)
+        storage.extend(messages)
+        return storage
+
+    def resize_storage(self, storage, maxlen):
+        # FUNC: changing the maximum number of messages of a storage
+        # INPUT: storage as returned by create_storage
+        #        maxlen (int or None): new maximum number of messages, see create_storage
+        # RETURN: resized storage
+        if maxlen and hasattr(storage, "resize"):
+            storage.resize(maxlen)  # storages like the FrameRingBuffer resize without copying every message
+            return storage
+        return self.create_storage(maxlen, storage)
 
     def log_recent_message(self, message_flag, message):
         # Funktion: Protokollieren einer kürzlich empfangenen Nachricht
         # Eingabe:    message_flag (int): Wenn 1, dann Nachricht von gültiger IPv4-Adresse
-        #            message (dict): Die zu protokollierende Nachricht
+        #            message (CanFrame): Die zu protokollierende Nachricht
         # Rückgabe: ---
-        if 1 == message_flag:
-            if self.blacklist_enabled and message["ID"] in self.blacklist_IDs:
-                # Message from blacklisted ID
-                return
-            if (not self.whitelist_enabled) or (self.whitelist_enabled and message["ID"] in self.whitelist_IDs):
-                self.recent_messages.append(message)
-            else:
-                # Message not from an whitelisted ID
-                pass
-        else:
-            pass
+        if 1 == message_flag and self.check_msgID(message.can_id):
+            self.recent_messages.append(message)
+            if self.capture_writer is not None:
+                self.capture_writer.write_frame(message)
 
     def log_exact_message(self, message_flag, message):
         # Funktion: Protokollieren einer exakten Nachricht
         # Eingabe:    message_flag (int): Wenn 1, dann Nachricht von gültiger IPv4-Adresse
-        #            message (dict): Die zu protokollierende Nachricht
+        #            message (CanFrame): Die zu protokollierende Nachricht
         # Rückgabe: ---
-        if len(self.exact_messages) >= self.exact_message_count:
+        if self.exact_message_count is not None and len(self.exact_messages) >= self.exact_message_count:
             # exact message count limit is exceeded
             return
 
-        if 1 == message_flag:
-            if self.blacklist_enabled and message["ID"] in self.blacklist_IDs:
-                # Message from blacklisted ID
-                return
-            if (not self.whitelist_enabled) or (self.whitelist_enabled and message["ID"] in self.whitelist_IDs):
-                self.exact_messages.append(message)
-            else:
-                # Message not from an whitelisted ID
-                pass
-        else:
-            pass
+        if 1 == message_flag and self.check_msgID(message.can_id):
+            self.exact_messages.append(message)
+
+    def log_recent_messages(self, message_flag, messages):
+        # FUNC: logging a batch of recently received messages
+        # INPUT: message_flag (int): if 1, the messages are from a valid IPv4 address
+        #        messages (list of CanFrame): messages to be logged
+        # RETURN: list of CanFrame accepted by the CAN-ID filter
+        if 1 != message_flag:
+            return []
+        accepted_messages = self.filter_messages(messages)
+        self.numb_of_ID_filtered_messages += len(messages) - len(accepted_messages)
+        self.recent_messages.extend(accepted_messages)
+        if self.capture_writer is not None:
+            self.capture_writer.write_frames(accepted_messages)
+        return accepted_messages
+
+    def log_exact_messages(self, message_flag, messages):
+        # FUNC: logging a batch of messages until the exact message count is reached
+        # INPUT: message_flag (int): if 1, the messages are from a valid IPv4 address
+        #        messages (list of CanFrame): messages to be logged
+        # RETURN: list of logged CanFrame
+        if 1 != message_flag:
+            return []
+        free_space = (None if self.exact_message_count is None
+                      else max(self.exact_message_count - len(self.exact_messages), 0))
+        logged_messages = self.filter_messages(messages)[:free_space]
+        self.exact_messages.extend(logged_messages)
+        return logged_messages
+
+    def set_capture_writer(self, capture_writer):
+        # FUNC: setting the writer all accepted messages are recorded with
+        # INPUT: capture_writer as CaptureWriter, None stops recording
+        # RETURN: previous capture writer, which is not closed
+        previous_capture_writer = self.capture_writer
+        self.capture_writer = capture_writer
+        return previous_capture_writer
 
     def clear_recent_messages(self):
         # FUNC: Clear all stored recent messages
@@ -287,14 +1345,22 @@ class MessageLogger:
         # INPUT: new_max_recent (int): New maximum number of recent messages
         # RETURN: ---
         self.max_recent_messages = new_max_recent  # Update the maximum number of recent messages
-        self.recent_messages = deque(self.recent_messages, maxlen=new_max_recent)  # Reinitialize the deque with updated max length
+        self.recent_messages = self.resize_storage(self.recent_messages, new_max_recent)  # Reinitialize the deque with updated max length
+
+    def update_storage_factory(self, new_storage_factory):
+        # FUNC: Change the storage of the recent and exact messages, the stored messages are kept
+        # INPUT: new_storage_factory (callable or None): e.g. FrameRingBuffer, None stores the messages in a deque
+        # RETURN: ---
+        self.storage_factory = new_storage_factory
+        self.recent_messages = self.create_storage(self.max_recent_messages, self.recent_messages)
+        self.exact_messages = self.create_storage(self.exact_message_count, self.exact_messages)
 
     def update_exact_message_count(self, new_exact_count):
         # FUNC: Update the maximum number of exact messages to be stored
         # INPUT:  new_exact_count (int): New exact number of messages
         # RETURN: ---
         self.exact_message_count = new_exact_count  # Update the exact number of messages
-        self.exact_messages = deque(self.exact_messages, maxlen=new_exact_count)  # Reinitialize the deque with updated max length
+        self.exact_messages = self.resize_storage(self.exact_messages, new_exact_count)  # Reinitialize the deque with updated max length
     
     def get_recent_messages(self):
         # FUNC: Get all recent stored messages
@@ -308,52 +1374,211 @@ class MessageLogger:
         # RETURN: deque: Deque containing all exact messages
         return self.exact_messages
     
-    def enable_whitelist_msgID(self):
-        # FUNC: enables or disables whitelist filtering for ID
-        # INPUT: ---
-        # RETURN: ---
-        self.whitelist_enabled = True
-        self.blacklist_enabled = False
+#*********************************************************************************************************
+#*********************************************************************************************************
+CAN_TRACE_EXT_KEY = 0x80000000  # added to the key of extended IDs, so 0x123 and extended 0x123 get separate rows
+MISSED_CYCLE_FACTOR = 1.5  # a period longer than this factor times the cycle time counts as missed cycle
 
-    def whitelist_add_msgID(self, input_msgID):
-        # FUNC: adds an ID to the whitelist
-        # INPUT: input_msgID as int
-        # RETURN: ---
-        self.whitelist_IDs.add(input_msgID)
+class CanIdStatistics:
+    # Statistics of one CAN-ID for the fixed trace. Every frame updates the record in place in O(1);
+    # the jitter is the standard deviation of the period, calculated incrementally (Welford).
+    __slots__ = ('can_id', 'flags', 'dlc', 'data', 'count', 'first_timestamp', 'last_timestamp', 'last_period',
+                 'min_period', 'max_period', 'mean_period', 'period_m2', 'numb_of_missed_cycles')
 
-    def whitelist_remove_msgID(self, input_msgID):
-        # FUNC: removes an ID from the whitelist
-        # INPUT: input_msgID as int
+    def __init__(self, can_id, flags=0):
+        self.can_id = can_id
+        self.flags = flags
+        self.dlc = 0
+        self.data = b''
+        self.count = 0
+        self.first_timestamp = 0  # ns
+        self.last_timestamp = 0  # ns
+        self.last_period = 0  # ns
+        self.min_period = 0  # ns
+        self.max_period = 0  # ns
+        self.mean_period = 0.0  # ns, the measured cycle time
+        self.period_m2 = 0.0  # sum of squared deviations of the period
+        self.numb_of_missed_cycles = 0
+
+    def update(self, frame):
+        # FUNC: adding a frame of this CAN-ID
+        # INPUT: frame as CanFrame
         # RETURN: ---
-        self.whitelist_IDs.discard(input_msgID)
-    
-    def whitelist_clear_msgIDs(self):
-        # FUNC: removes all IDs from the whitelist
+        self.dlc = frame.dlc
+        self.data = frame.data
+        self.count += 1
+        if self.count == 1:
+            self.first_timestamp = self.last_timestamp = frame.timestamp
+            return
+        period = frame.timestamp - self.last_timestamp
+        self.last_timestamp = frame.timestamp
+        self.last_period = period
+        numb_of_periods = self.count - 1
+        if numb_of_periods == 1:
+            self.min_period = self.max_period = period
+        else:
+            if period > MISSED_CYCLE_FACTOR * self.mean_period:
+                self.numb_of_missed_cycles += 1
+            if period < self.min_period:
+                self.min_period = period
+            elif period > self.max_period:
+                self.max_period = period
+        delta = period - self.mean_period
+        self.mean_period += delta / numb_of_periods
+        self.period_m2 += delta * (period - self.mean_period)
+
+    def get_jitter(self):
+        # FUNC: returns the standard deviation of the period in ns
+        if self.count < 3:
+            return 0.0
+        return (self.period_m2 / (self.count - 2)) ** 0.5
+
+    def format_line(self):
+        # FUNC: returns the statistics as one line of text
+        return ("ID:" + str(self.can_id) + "\tData:" + self.data.hex(' ').upper() + "\tCount:" + str(self.count) +
+                "\tCycle: %.3f ms\tMin: %.3f ms\tMax: %.3f ms\tJitter: %.3f ms\tMissed: %d" % (
+                    self.mean_period / 1e6, self.min_period / 1e6, self.max_period / 1e6, self.get_jitter() / 1e6,
+                    self.numb_of_missed_cycles))
+
+#*********************************************************************************************************
+class CanIdTrace:
+    # Fixed trace: the latest frame and the timing statistics of every CAN-ID, one record per ID.
+    # The records are created once per ID and updated in place, so a steady-state bus only needs
+    # a few hundred records, independent of the message rate.
+    def __init__(self):
+        self.statistics = {}  # key -> CanIdStatistics, key is the CAN-ID plus CAN_TRACE_EXT_KEY for extended IDs
+        self.updated_keys = set()  # keys updated since the last take_updated_keys
+
+    def update(self, frames):
+        # FUNC: adding received frames
+        # INPUT: frames as list of CanFrame
         # RETURN: ---
-        self.whitelist_IDs.clear()
+        statistics = self.statistics
+        updated_keys = self.updated_keys
+        for frame in frames:
+            key = frame.can_id | CAN_TRACE_EXT_KEY if frame.flags & CAN_FLAG_EXT else frame.can_id
+            record = statistics.get(key)
+            if record is None:
+                record = statistics[key] = CanIdStatistics(frame.can_id, frame.flags & CAN_FLAG_EXT)
+            record.update(frame)
+            updated_keys.add(key)
 
-    def enable_blacklist_msgID(self):
-        # FUNC: enables blacklist filtering for ID 
+    def take_updated_keys(self):
+        # FUNC: returns the keys updated since the last call
         # INPUT: ---
-        # RETURN: ---
-        self.whitelist_enabled = False
-        self.blacklist_enabled = True        
+        # RETURN: set of keys of the statistics dictionary
+        updated_keys = self.updated_keys
+        self.updated_keys = set()
+        return updated_keys
 
-    def blacklist_add_msgID(self, input_msgID):
-        # FUNC: adds an ID to the blacklist
-        # INPUT: input_msgID as int
-        # RETURN: ---
-        self.blacklist_IDs.add(input_msgID)
+    def get_statistics(self, key):
+        # FUNC: returns the statistics of a key
+        return self.statistics[key]
+
+    def clear(self):
+        # FUNC: removing all statistics
+        self.statistics = {}
+        self.updated_keys = set()
+
+    def __len__(self):
+        return len(self.statistics)
+
+#*********************************************************************************************************
+class MessageReceiver:
+    # Receive loop for non blocking recieving messages, run in its own thread by the GUI or headless.
+    # The receive thread only collects the new frames; the GUI takes them on its own refresh tick with
+    # take_new_messages, so the receiver keeps its full rate independent of repaints.
+
+    def __init__(self, connector: Connector, message_logger: MessageLogger):
+        self.my_connector = connector
+        self.my_msg_logger = message_logger
+        self.new_message_lock = threading.Lock()
+        self.new_recent_messages = deque(maxlen=message_logger.max_recent_messages)
+        self.new_logged_messages = []
+        self.my_trace = CanIdTrace()  # fixed trace, updated with every accepted message
+        self.is_running = False
+        self.is_logging = False
+        self.max_numb_of_logged_msg = 0
+        self.numb_of_logged_msg = 0
+        self.numb_of_accepted_messages = 0  # messages accepted by both filters since the start
+        self.numb_of_batches = 0
+        self.processing_latency = LatencyHistogram()  # batch received -> logged and handed to the GUI
+        self.end_to_end_latency = LatencyHistogram()  # receive time stamp of the oldest message -> handed to the GUI
+        self.my_trigger_engine = None  # optional TriggerEngine of trigger_engine.py, evaluated on the accepted messages
+
+    def run(self):
+        while self.is_running:
+            # all pending messages are processed in one batch per wakeup
+            message_flag, messages =  self.my_connector.recieve_messages()
+            if 1 == message_flag:
+                start_time = time.time_ns()
+                accepted_messages = self.my_msg_logger.log_recent_messages(message_flag, messages)
+                self.numb_of_accepted_messages += len(accepted_messages)
+                logged_messages = []
+                if self.is_logging:
+                    logged_messages = self.my_msg_logger.log_exact_messages(message_flag, messages[:self.max_numb_of_logged_msg - self.numb_of_logged_msg])
+                    self.numb_of_logged_msg += len(messages)
+                with self.new_message_lock:
+                    self.my_trace.update(accepted_messages)
+                    self.new_recent_messages.extend(accepted_messages)
+                    self.new_logged_messages += logged_messages
+                if self.my_trigger_engine is not None:
+                    self.my_trigger_engine.process(accepted_messages)
+                end_time = time.time_ns()
+                self.numb_of_batches += 1
+                self.processing_latency.add(end_time - start_time)
+                if messages:
+                    self.end_to_end_latency.add(end_time - messages[0].timestamp)
+            elif self.my_trigger_engine is not None:
+                self.my_trigger_engine.process([])  # missing cycles also fire without any traffic
+
+            if self.is_logging and self.numb_of_logged_msg >= self.max_numb_of_logged_msg:
+                self.stop_logging()
+
+    def take_new_messages(self):
+        # FUNC: returns the frames received and logged since the last call, called on the GUI refresh tick
+        # INPUT: ---
+        # RETURN: recent messages as list of CanFrame, at most max_recent_messages of the MessageLogger
+        #         logged messages as list of CanFrame
+        with self.new_message_lock:
+            recent_messages = list(self.new_recent_messages)
+            self.new_recent_messages.clear()
+            logged_messages = self.new_logged_messages
+            self.new_logged_messages = []
+        return recent_messages, logged_messages
+
+    def take_trace_updates(self):
+        # FUNC: returns the keys of the fixed trace updated since the last call, called on the GUI refresh tick
+        # INPUT: ---
+        # RETURN: set of keys of the CanIdTrace statistics
+        with self.new_message_lock:
+            return self.my_trace.take_updated_keys()
+
+    def clear_trace(self):
+        # FUNC: removing all statistics of the fixed trace
+        with self.new_message_lock:
+            self.my_trace.clear()
+
+    def start(self):
+        self.my_connector.toggle_recieving_message(True)
+        self.is_running = True
+
+    def stop(self):
+        self.my_connector.toggle_recieving_message(False)
+        self.is_running = False
+
+    def update_max_numb_of_log_msg(self, input_max_numb_of_logged_msg):
+        self.max_numb_of_logged_msg = input_max_numb_of_logged_msg
     
-    def blacklist_remove_msgID(self, input_msgID):
-        # FUNC: removes an ID from the blacklist
-        # INPUT: input_msgID as int
-        # RETURN: ---
-        self.blacklist_IDs.discard(input_msgID)
+    def start_logging(self):
+        with self.new_message_lock:
+            self.new_logged_messages = []
+        self.numb_of_logged_msg = 0
+        self.my_msg_logger.clear_exact_messages()
+        self.is_logging = True
     
-    def blacklist_clear_msgIDs(self):
-        # FUNC: removes all IDs from the blacklist
-        # RETURN: ---
-        self.blacklist_IDs.clear()
+    def stop_logging(self):
+        self.is_logging = False
+        self.numb_of_logged_msg = 0
 
-#*********************************************************************************************************
\ No newline at end of file
+#*********************************************************************************************************
@@ -1,14 +1,18 @@
-from qt_application_backend import ( Connector, MessageLogger,convert_to_binary_string)
+from qt_application_backend import ( Connector, MessageLogger, MessageReceiver, CanIdTrace, convert_to_binary_string)
 import sys
 import os
-from collections import deque
 from PyQt5 import QtWidgets, uic
 from PyQt5.QtWidgets import (
     QPushButton, QTextBrowser, QVBoxLayout, 
-    QLabel, QLineEdit, QRadioButton, QPlainTextEdit, QDialog
+    QLabel, QLineEdit, QRadioButton, QPlainTextEdit, QDialog,
+    QTableView, QAbstractItemView, QTabWidget, QFileDialog, QCheckBox
 )
+from bisect import bisect_left
 import threading
-from PyQt5.QtCore import pyqtSignal, QObject
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+
+LIVE_VIEW_MAX_ROWS = 1000  # number of recent messages shown in the live view
+VIEW_REFRESH_INTERVAL_MS = 50  # refresh tick of the live view and the log
 
 #*********************************************************************************************************
 class PopupWindow(QDialog):
@@ -49,65 +53,148 @@ class PopupWindow(QDialog):
         self.my_connector.update_UDP_socket(in_UDP_IP, UPD_Port )
 
 #*********************************************************************************************************
-class MessageReceiver(QObject):
-    # Multithreading Object for non blocking recieving messages
-    deque_updated_rec_msg = pyqtSignal(deque)
-    deque_updated_log_msg = pyqtSignal(deque)
+class CanFrameTableModel(QAbstractTableModel):
+    # Table model of CAN frames for the live view and the log. Frames are appended in batches and only
+    # the rows the view actually shows are formatted, so high message rates do not freeze the GUI.
+    HEADERS = ("ID", "Data", "Ext", "RTR", "Time stamp")
 
-    def __init__(self, connector: Connector, message_logger: MessageLogger):
+    def __init__(self, max_rows=None):
         super().__init__()
-        self.my_connector = connector
-        self.my_msg_logger = message_logger
-        self.recent_message_deque = deque(maxlen=10)
-        self.logging_message_deque = deque()
-        self.is_running = False
-        self.is_logging = False
-        self.max_numb_of_logged_msg = 0
-        self.numb_of_logged_msg = 0
-
-    def run(self):
-        while self.is_running:
-            message_flag, dict_message =  self.my_connector.recieve_message()
-            self.my_msg_logger.log_recent_message(message_flag, dict_message)
-            self.recent_message_deque = self.my_msg_logger.get_recent_messages()
-            self.deque_updated_rec_msg.emit(self.recent_message_deque)
-
-            if self.is_logging:
-                if 1 == message_flag:
-                    self.my_msg_logger.log_exact_message(message_flag, dict_message)
-                    self.logging_message_deque = self.my_msg_logger.get_exact_messages()
-                    self.deque_updated_log_msg.emit(self.logging_message_deque)
-
-                    self.numb_of_logged_msg +=1
-            if self.is_logging and self.numb_of_logged_msg >= self.max_numb_of_logged_msg:
-                self.stop_logging()
-
-    def start(self):
-        self.my_connector.toggle_recieving_message(True)
-        self.is_running = True
-
-    def stop(self):
-        self.my_connector.toggle_recieving_message(False)
-        self.is_running = False
-
-    def update_max_numb_of_log_msg(self, input_max_numb_of_logged_msg):
-        self.max_numb_of_logged_msg = input_max_numb_of_logged_msg
-    
-    def start_logging(self):
-        self.is_logging = True
-        self.numb_of_logged_msg = 0
-        self.logging_message_deque.clear()
-        self.my_msg_logger.clear_exact_messages()
-    
-    def stop_logging(self):
-        self.is_logging = False
-        self.numb_of_logged_msg = 0
+        self.max_rows = max_rows  # None: unlimited, otherwise the oldest rows are removed
+        self.frames = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.frames)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        frame = self.frames[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(frame.can_id)
+        if column == 1:
+            return frame.data_hex()
+        if column == 2:
+            return str(frame.ext)
+        if column == 3:
+            return str(frame.rtr)
+        return frame.time_string()
+
+    def append_frames(self, frames):
+        # FUNC: appending new frames as one delta and removing the oldest rows above max_rows
+        # INPUT: frames as list of CanFrame
+        # RETURN: ---
+        if self.max_rows is not None and len(frames) > self.max_rows:
+            frames = frames[-self.max_rows:]
+        if not frames:
+            return
+        if self.max_rows is not None:
+            excess = len(self.frames) + len(frames) - self.max_rows
+            if excess > 0:
+                self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+                del self.frames[:excess]
+                self.endRemoveRows()
+        first_row = len(self.frames)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(frames) - 1)
+        self.frames.extend(frames)
+        self.endInsertRows()
+
+    def update_max_rows(self, max_rows):
+        # FUNC: changing the maximum number of rows
+        self.max_rows = max_rows
+        if max_rows is not None and len(self.frames) > max_rows:
+            self.beginRemoveRows(QModelIndex(), 0, len(self.frames) - max_rows - 1)
+            del self.frames[:len(self.frames) - max_rows]
+            self.endRemoveRows()
+
+    def clear(self):
+        # FUNC: removing all rows
+        self.beginResetModel()
+        self.frames = []
+        self.endResetModel()
+
+#*********************************************************************************************************
+class CanIdTraceModel(QAbstractTableModel):
+    # Table model of the fixed trace: one row per CAN-ID, sorted by ID, with the latest payload and the
+    # timing statistics. Only the rows of updated IDs are repainted on a refresh tick.
+    HEADERS = ("ID", "Ext", "Data", "Count", "Cycle [ms]", "Min [ms]", "Max [ms]", "Jitter [ms]", "Missed")
+
+    def __init__(self, trace: CanIdTrace):
+        super().__init__()
+        self.my_trace = trace
+        self.keys = []  # sorted keys of the trace statistics, one per row
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        statistics = self.my_trace.get_statistics(self.keys[index.row()])
+        column = index.column()
+        if column == 0:
+            return str(statistics.can_id)
+        if column == 1:
+            return str(bool(statistics.flags))
+        if column == 2:
+            return statistics.data.hex(' ').upper()
+        if column == 3:
+            return str(statistics.count)
+        if column == 4:
+            return "%.3f" % (statistics.mean_period / 1e6)
+        if column == 5:
+            return "%.3f" % (statistics.min_period / 1e6)
+        if column == 6:
+            return "%.3f" % (statistics.max_period / 1e6)
+        if column == 7:
+            return "%.3f" % (statistics.get_jitter() / 1e6)
+        return str(statistics.numb_of_missed_cycles)
+
+    def update_keys(self, updated_keys):
+        # FUNC: inserting rows of new IDs and repainting the rows of updated IDs
+        # INPUT: updated_keys as set of keys of the trace statistics
+        # RETURN: ---
+        if not updated_keys:
+            return
+        for key in sorted(updated_keys):
+            row = bisect_left(self.keys, key)
+            if row == len(self.keys) or self.keys[row] != key:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.keys.insert(row, key)
+                self.endInsertRows()
+        rows = [bisect_left(self.keys, key) for key in updated_keys]
+        self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(self.HEADERS) - 1))
+
+    def clear(self):
+        # FUNC: removing all rows
+        self.beginResetModel()
+        self.keys = []
+        self.endResetModel()
 
 #*********************************************************************************************************
 class ConnectorApp(QtWidgets.QMainWindow):
     # main window of the Connector Application
-    def __init__(self):
+    def __init__(self, use_shared_memory_pipeline=False, use_ring_buffer=False):
         super(ConnectorApp, self).__init__()
+        self.use_shared_memory_pipeline = use_shared_memory_pipeline
+        self.use_ring_buffer = use_ring_buffer
         current_dir = os.path.dirname(os.path.abspath(__file__))
         ui_path = os.path.join(current_dir, 'qt_application.ui') # loading .ui file from QT5 Designer
         uic.loadUi(ui_path, self)
@@ -117,11 +204,15 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.initUI()
 
     def init_backend(self):
-        self.my_connector = Connector()
-        self.my_msg_logger = MessageLogger()
+        if self.use_shared_memory_pipeline:
+            # a dedicated receiver process fills a shared memory ring, GUI repaints can not stall the socket
+            from shared_memory_pipeline import SharedRingConnector
+            self.my_connector = SharedRingConnector()
+        else:
+            self.my_connector = Connector()
+        self.my_msg_logger = MessageLogger(max_recent_messages=LIVE_VIEW_MAX_ROWS,
+                                           storage_factory=self.get_storage_factory(self.use_ring_buffer))
         self.my_message_receiver = MessageReceiver(self.my_connector,self.my_msg_logger)
-        self.my_message_receiver.deque_updated_rec_msg.connect(self.display_rec_message_deque)
-        self.my_message_receiver.deque_updated_log_msg.connect(self.display_log_message_deque)
     
     def init_variables(self):
         self.IPv4_blacklist_elements= 0
@@ -131,11 +222,36 @@ class ConnectorApp(QtWidgets.QMainWindow):
 
     def initUI(self):
         # init live view of recieved messages, logged messages and info texts
-        self.textBrowser_rec_msg = self.findChild(QTextBrowser, 'textBrowser_rec_msg')
-        self.textBrowser_log_msg = self.findChild(QTextBrowser, 'textBrowser_log_msg')
-
-        self.textBrowser_rec_msg.setText("Here, received filtered messages will be continuously displayed.")
-        self.textBrowser_log_msg.setText("Here, logged filtered messages will be displayed.")
+        # the text browsers of the .ui file are replaced by table views, which only format the visible rows
+        self.rec_msg_model = CanFrameTableModel(max_rows=LIVE_VIEW_MAX_ROWS)
+        self.log_msg_model = CanFrameTableModel()
+        self.trace_model = CanIdTraceModel(self.my_message_receiver.my_trace)
+        self.tableView_rec_msg = self.create_table_view(
+            self.rec_msg_model, "Here, received filtered messages will be continuously displayed.")
+        self.tableView_trace = self.create_table_view(
+            self.trace_model, "Here, the latest message and the cycle time of every received CAN-ID will be displayed.")
+        self.tableView_log_msg = self.create_table_view(
+            self.log_msg_model, "Here, logged filtered messages will be displayed.")
+        # the live view shows either the scrolling list or the fixed trace with one row per CAN-ID
+        self.tabWidget_rec_msg = QTabWidget()
+        self.tabWidget_rec_msg.addTab(self.tableView_rec_msg, "Scrolling")
+        self.tabWidget_rec_msg.addTab(self.tableView_trace, "Fixed per CAN-ID")
+        self.replace_text_browser('textBrowser_rec_msg', 'verticalLayout', self.tabWidget_rec_msg)
+        self.replace_text_browser('textBrowser_log_msg', 'verticalLayout_2', self.tableView_log_msg)
+        self.pushButton_export_log = QPushButton("Export logged messages ...")
+        self.pushButton_export_log.clicked.connect(self.pushed_pushButton_export_log)
+        self.checkBox_ring_buffer = QCheckBox("Store messages in a ring buffer")
+        self.checkBox_ring_buffer.setToolTip("Stores the messages in a columnar ring buffer of 22 bytes per frame "
+                                             "instead of a deque of message objects.")
+        self.checkBox_ring_buffer.setChecked(self.use_ring_buffer)
+        self.checkBox_ring_buffer.toggled.connect(self.toggled_checkBox_ring_buffer)
+        self.findChild(QVBoxLayout, 'verticalLayout_2').addWidget(self.checkBox_ring_buffer)
+        self.findChild(QVBoxLayout, 'verticalLayout_2').addWidget(self.pushButton_export_log)
+
+        # new messages are taken from the receiver on a fixed refresh tick
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_message_views)
+        self.refresh_timer.start(VIEW_REFRESH_INTERVAL_MS)
 
         self.pushButton_start_stop = self.findChild(QPushButton, 'pushButton_start_stop')
         self.pushButton_start_stop.clicked.connect(self.toggle_button_text_start_stop)
@@ -200,7 +316,7 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.pushButton_add_canid_blacklist.clicked.connect(self.pushed_pushButton_add_canid_blacklist)
 
         self.textBrowser_canID_blacklist = self.findChild(QTextBrowser, 'textBrowser_canID_blacklist')
-        self.textBrowser_canID_blacklist.setText("Here, blacklisted CAN-IDs will be listed.\nCurrently the blacklist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF.")
+        self.textBrowser_canID_blacklist.setText("Here, blacklisted CAN-IDs will be listed.\nCurrently the blacklist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF,\na range like 0x100-0x1FF or a code/mask pair like 0x18FEF100/0x1FFFFF00.")
             #whitelist
         self.radioButton_enable_canid_whitelist = self.findChild(QRadioButton, 'radioButton_enable_canid_whitelist')
         self.radioButton_enable_canid_whitelist.clicked.connect(self.my_msg_logger.enable_whitelist_msgID)
@@ -211,7 +327,7 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.pushButton_add_canid_whitelist.clicked.connect(self.pushed_pushButton_add_canid_whitelist)
 
         self.textBrowser_canID_whitelist = self.findChild(QTextBrowser, 'textBrowser_canID_whitelist')
-        self.textBrowser_canID_whitelist.setText("Here, whitelisted CAN-IDs will be listed.\nCurrently the whitelist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF.")
+        self.textBrowser_canID_whitelist.setText("Here, whitelisted CAN-IDs will be listed.\nCurrently the whitelist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF,\na range like 0x100-0x1FF or a code/mask pair like 0x18FEF100/0x1FFFFF00.")
 
         # sending CAN message
         self.plainTextEdit_target_ESP_IPv4_adress = self.findChild(QPlainTextEdit, 'plainTextEdit_target_ESP_IPv4_adress')
@@ -237,6 +353,12 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.plainTextEdit_hexadecimal_pair_7 = self.findChild(QPlainTextEdit, 'plainTextEdit_hexadecimal_pair_7')
         self.plainTextEdit_hexadecimal_pair_7.setPlainText('00')
 
+        # the CAN-ID and the data are parsed once after they were edited, not on every send
+        self.can_msg_to_send = None
+        self.plainTextEdit_target_can_id.textChanged.connect(self.invalidate_can_msg_to_send)
+        for index in range(8):
+            getattr(self, 'plainTextEdit_hexadecimal_pair_%d' % index).textChanged.connect(self.invalidate_can_msg_to_send)
+
         self.pushButton_send_can_msg = self.findChild(QPushButton, 'pushButton_send_can_msg')
         self.pushButton_send_can_msg.clicked.connect(self.pushed_pushButton_send_can_msg)
         self.pushButton_send_can_msg.setStyleSheet('''
@@ -250,23 +372,25 @@ class ConnectorApp(QtWidgets.QMainWindow):
     
     #************************************************************************************
     # Methods for sending single messages
+    def invalidate_can_msg_to_send(self):
+        self.can_msg_to_send = None
+
     def pushed_pushButton_send_can_msg(self):
         self.my_connector.updated_target_IP(self.plainTextEdit_target_ESP_IPv4_adress.toPlainText())
 
-        hex_string_can_id = self.plainTextEdit_target_can_id.toPlainText()
-        int_value_can_id = int(hex_string_can_id, 16)
-
-        can_data_str = (self.plainTextEdit_hexadecimal_pair_0.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_1.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_2.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_3.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_4.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_5.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_6.toPlainText() + 
-                        self.plainTextEdit_hexadecimal_pair_7.toPlainText())
-        binary_can_data_str = convert_to_binary_string(can_data_str)
-        
-        self.my_connector.send_message(int_value_can_id, binary_can_data_str)
+        if self.can_msg_to_send is None:
+            hex_string_can_id = self.plainTextEdit_target_can_id.toPlainText()
+            can_data_str = ''.join([getattr(self, 'plainTextEdit_hexadecimal_pair_%d' % index).toPlainText()
+                                    for index in range(8)])
+            try:
+                int_value_can_id = int(hex_string_can_id, 16)
+                binary_can_data_str = convert_to_binary_string(can_data_str)
+            except ValueError:
+                return  # invalid hex input, nothing is sent
+            # IDs above 0x7FF can only be sent as extended frames
+            self.can_msg_to_send = (int_value_can_id, binary_can_data_str, int_value_can_id > 0x7FF)
+
+        self.my_connector.send_message(*self.can_msg_to_send)
 
     #************************************************************************************
     # Methods for updating the Socket for recieving messages
@@ -279,6 +403,9 @@ class ConnectorApp(QtWidgets.QMainWindow):
     def toggle_button_text_start_stop(self):
         current_text = self.pushButton_start_stop.text()
         if current_text == 'Start':
+            # every start begins a new fixed trace
+            self.trace_model.clear()
+            self.my_message_receiver.clear_trace()
             self.my_message_receiver.start()
             self.my_thread = threading.Thread(target=self.my_message_receiver.run)
             self.my_thread.start()  # Startet den Thread
@@ -317,27 +444,67 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.my_message_receiver.update_max_numb_of_log_msg(new_max_numb_of_log_msg)
         self.my_msg_logger.update_exact_message_count(new_max_numb_of_log_msg)
 
+    def get_storage_factory(self, use_ring_buffer):
+        if not use_ring_buffer:
+            return None  # the MessageLogger stores the messages in a deque
+        from frame_ring_buffer import FrameRingBuffer  # only needed for the ring buffer storage
+        return FrameRingBuffer
+
+    def toggled_checkBox_ring_buffer(self, checked):
+        self.use_ring_buffer = checked
+        self.my_msg_logger.update_storage_factory(self.get_storage_factory(checked))
+
     def pushed_pushButton_start_recording(self):
-        self.textBrowser_log_msg.clear()
+        self.log_msg_model.clear()
         self.my_message_receiver.start_logging()
 
-    def display_rec_message_deque(self, message_deque):
-        self.textBrowser_rec_msg.clear()
+    def pushed_pushButton_export_log(self):
+        from capture_export import export_frames  # only needed for the export
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export logged messages", "",
+                                                   "CSV (*.csv);;Vector ASC (*.asc);;Parquet (*.parquet);;Arrow (*.arrow)")
+        if not file_path:
+            return
         try:
-            for message in message_deque:
-                print_string = "ID:" +  str(message["ID"])  +"\tData:" + str(message["Data"]) + "\tExt:" + str(message["Ext"]) + "\tRTR:" + str(message["RTR"]) + "\tTime stamp: " + message["Time"]
-                self.textBrowser_rec_msg.append(print_string)
-        except:
-            pass
-    
-    def display_log_message_deque(self, message_deque):
-        self.textBrowser_log_msg.clear()
-        try:
-            for message in message_deque:
-                print_string = "ID:" +  str(message["ID"])  +"\tData:" + str(message["Data"]) + "\tExt:" + str(message["Ext"]) + "\tRTR:" + str(message["RTR"]) + "\tTime stamp: " + message["Time"]
-                self.textBrowser_log_msg.append(print_string)
-        except:
-            pass
+            export_frames(self.my_msg_logger.exact_messages, file_path)
+        except (OSError, ValueError, RuntimeError) as error:
+            print("Export failed: %s" % error, file=sys.stderr)
+
+    def create_table_view(self, model, tool_tip):
+        # creates a compact table view of a model
+        table_view = QTableView()
+        table_view.setModel(model)
+        table_view.setToolTip(tool_tip)
+        table_view.verticalHeader().setVisible(False)
+        table_view.verticalHeader().setDefaultSectionSize(table_view.fontMetrics().height() + 4)
+        table_view.horizontalHeader().setStretchLastSection(True)
+        table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        return table_view
+
+    def replace_text_browser(self, text_browser_name, layout_name, widget):
+        # replaces a text browser of the .ui file by a widget at the same position
+        text_browser = self.findChild(QTextBrowser, text_browser_name)
+        widget.setSizePolicy(text_browser.sizePolicy())
+        widget.setMinimumSize(text_browser.minimumSize())
+        self.findChild(QVBoxLayout, layout_name).replaceWidget(text_browser, widget)
+        text_browser.hide()
+        text_browser.deleteLater()
+
+    def refresh_message_views(self):
+        # appends the frames received since the last tick to the views
+        recent_messages, logged_messages = self.my_message_receiver.take_new_messages()
+        self.append_to_view(self.tableView_rec_msg, self.rec_msg_model, recent_messages)
+        self.append_to_view(self.tableView_log_msg, self.log_msg_model, logged_messages)
+        self.trace_model.update_keys(self.my_message_receiver.take_trace_updates())
+
+    def append_to_view(self, table_view, model, messages):
+        if not messages:
+            return
+        # keep following the newest messages, unless the user scrolled up
+        scroll_bar = table_view.verticalScrollBar()
+        follow = scroll_bar.value() == scroll_bar.maximum()
+        model.append_frames(messages)
+        if follow:
+            table_view.scrollToBottom()
 
     #************************************************************************************
     # IPv4 adress filter methods
@@ -350,8 +517,12 @@ class ConnectorApp(QtWidgets.QMainWindow):
         self.IPv4_whitlist_elements= 0
 
     def pushed_pushButton_add_IPv4_blacklist(self):
-        new_IPv4_address = (self.lineEdit_add_IPv4_blacklist.text())
-        self.my_connector.blacklist_add_IPv4_address(new_IPv4_address)
+        new_IPv4_address = (self.lineEdit_add_IPv4_blacklist.text().strip())
+        try:
+            # single addresses, subnets like 192.168.0.0/24 and port constraints like 192.168.0.0/24:4210
+            self.my_connector.blacklist_add_IPv4_address(new_IPv4_address)
+        except ValueError:
+            return
         if 0 == self.IPv4_blacklist_elements:
             self.textBrowser_IPv4_blacklist.setText(new_IPv4_address)
             self.IPv4_blacklist_elements= 1
@@ -359,8 +530,12 @@ class ConnectorApp(QtWidgets.QMainWindow):
             self.textBrowser_IPv4_blacklist.append(new_IPv4_address)
 
     def pushed_pushButton_add_IPv4_whitelist(self):
-        new_IPv4_address = (self.lineEdit_add_IPv4_whitelist.text())
-        self.my_connector.whitelist_add_IPv4_address(new_IPv4_address)
+        new_IPv4_address = (self.lineEdit_add_IPv4_whitelist.text().strip())
+        try:
+            # single addresses, subnets like 192.168.0.0/24 and port constraints like 192.168.0.0/24:4210
+            self.my_connector.whitelist_add_IPv4_address(new_IPv4_address)
+        except ValueError:
+            return
         if 0 == self.IPv4_whitlist_elements:
             self.textBrowser_IPv4_whitelist.setText(new_IPv4_address)
             self.IPv4_whitlist_elements= 1
@@ -372,14 +547,19 @@ class ConnectorApp(QtWidgets.QMainWindow):
     def pushed_pushButton_clear_canid_filter(self):
         self.my_msg_logger.blacklist_clear_msgIDs()
         self.my_msg_logger.whitelist_clear_msgIDs()
-        self.textBrowser_canID_blacklist.setText("Here, blacklisted CAN-IDs will be listed.\nCurrently the blacklist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF.")
-        self.textBrowser_canID_whitelist.setText("Here, whitelisted CAN-IDs will be listed.\nCurrently the whitelist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF.")
+        self.textBrowser_canID_blacklist.setText("Here, blacklisted CAN-IDs will be listed.\nCurrently the blacklist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF,\na range like 0x100-0x1FF or a code/mask pair like 0x18FEF100/0x1FFFFF00.")
+        self.textBrowser_canID_whitelist.setText("Here, whitelisted CAN-IDs will be listed.\nCurrently the whitelist is empty.\nInput CAN-ID as Integer from 0x000 to 0x7FF,\na range like 0x100-0x1FF or a code/mask pair like 0x18FEF100/0x1FFFFF00.")
         self.canid_blacklist_elements= 0
         self.canid_whitlist_elements= 0
 
     def pushed_pushButton_add_canid_blacklist(self):
-        new_canid = int(self.lineEdit_add_canid_blacklist.text())
-        self.my_msg_logger.blacklist_add_msgID(new_canid)
+        new_canid = self.lineEdit_add_canid_blacklist.text().strip()
+        try:
+            # IDs, ranges like 0x100-0x1FF and code/mask pairs like 0x18FEF100/0x1FFFFF00
+            if not self.my_msg_logger.add_msgID_filter_entries(new_canid, whitelist=False):
+                return
+        except ValueError:
+            return
         if 0 == self.canid_blacklist_elements:
             self.textBrowser_canID_blacklist.setText(str(new_canid))
             self.canid_blacklist_elements= 1
@@ -387,17 +567,28 @@ class ConnectorApp(QtWidgets.QMainWindow):
             self.textBrowser_canID_blacklist.append(str(new_canid))
 
     def pushed_pushButton_add_canid_whitelist(self):
-        new_canid = int(self.lineEdit_add_canid_whitelist.text())
-        self.my_msg_logger.whitelist_add_msgID(new_canid)
+        new_canid = self.lineEdit_add_canid_whitelist.text().strip()
+        try:
+            # IDs, ranges like 0x100-0x1FF and code/mask pairs like 0x18FEF100/0x1FFFFF00
+            if not self.my_msg_logger.add_msgID_filter_entries(new_canid, whitelist=True):
+                return
+        except ValueError:
+            return
         if 0 == self.canid_whitlist_elements:
             self.textBrowser_canID_whitelist.setText(str(new_canid))
             self.canid_whitlist_elements= 1
         else:
             self.textBrowser_canID_whitelist.append(str(new_canid))  
 
-if __name__ == "__main__":
-    import sys
-    app = QtWidgets.QApplication(sys.argv)
-    mainWin = ConnectorApp()
+def main(argv=None, use_shared_memory_pipeline=False, use_ring_buffer=False):
+    # starts the GUI, also used by connector_cli.py --gui
+    app = QtWidgets.QApplication(sys.argv if argv is None else argv)
+    mainWin = ConnectorApp(use_shared_memory_pipeline, use_ring_buffer)
     mainWin.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+    mainWin.my_message_receiver.stop()
+    mainWin.my_connector.close()
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,189 @@
+import heapq
+import queue
+import threading
+from collections import deque
+
+from qt_application_backend import Connector, LatencyHistogram, TIMESTAMP_MODE_KERNEL
+
+#*********************************************************************************************************
+class ShardedConnector(Connector):
+    # Connector with N SO_REUSEPORT sockets on the same port. The kernel distributes the datagrams of the gateways
+    # over the sockets, so a burst of many gateways has N receive buffers instead of one. Every socket is drained by
+    # its own receiver worker thread; recieve_messages merges the batches of all workers in time stamp order.
+    # Drop-in replacement of the Connector for the MessageReceiver, the IPv4 filter is shared by all sockets.
+    def __init__(self, numb_of_shards=2, timestamp_mode=TIMESTAMP_MODE_KERNEL, receive_buffer_size=None,
+                 UDP_IP="0.0.0.0", shared_UDP_port=4210, max_queued_batches=10000):
+        # FUNC: initialize the ShardedConnector class and open the sockets
+        # INPUT: numb_of_shards (int, optional): number of sockets and receiver workers. Defaults to 2.
+        #        timestamp_mode, receive_buffer_size, UDP_IP, shared_UDP_port like the Connector
+        #        max_queued_batches (int, optional): batches queued by the workers before they are dropped.
+        # RETURN: ---
+        if numb_of_shards < 1:
+            raise ValueError("numb_of_shards must be at least 1")
+        self.numb_of_shards = numb_of_shards
+        self.shards = []  # one Connector per socket
+        self.shard_threads = []
+        self.shard_queue = queue.Queue(maxsize=max_queued_batches)  # (shard index, frames)
+        self.numb_of_dropped_batches = 0  # batches dropped because recieve_messages was not called often enough
+        self.pending_frames = deque()  # merged frames not returned by recieve_message yet
+        self.workers_running = False
+        super().__init__(timestamp_mode, receive_buffer_size, UDP_IP, shared_UDP_port, reuse_port=True)
+
+    def create_UDP_socket(self, input_UDP_IP, input_shared_UDP_port):
+        # opens the sockets of all shards, the first socket is also used for sending
+        was_running = self.workers_running
+        self.stop_workers()
+        self.close_shards()
+        shards = []
+        try:
+            for _ in range(self.numb_of_shards):
+                shard = Connector(self.timestamp_mode, self.receive_buffer_size, input_UDP_IP,
+                                  # port 0: the other shards join the port the first shard got
+                                  shards[0].sock.getsockname()[1] if shards else input_shared_UDP_port,
+                                  reuse_port=True)
+                # all shards use the IPv4 filter and its cache of this connector
+                shard.check_IPv4_source = self.check_IPv4_source
+                shards.append(shard)
+        except OSError:
+            for shard in shards:
+                shard.close()
+            raise
+        self.shards = shards
+        self.effective_receive_buffer_size = shards[0].effective_receive_buffer_size
+        if was_running:
+            self.start_workers()
+        return shards[0].sock
+
+    def update_UDP_socket(self, input_UDP_IP, input_shared_UDP_port):
+        # the workers are stopped before any socket is closed, a worker blocked in recvmsg_into of a closed socket
+        # would die; they are restarted on the new sockets or, if binding failed, on the restored previous sockets
+        was_running = self.workers_running
+        self.stop_workers()
+        try:
+            super().update_UDP_socket(input_UDP_IP, input_shared_UDP_port)
+        finally:
+            if was_running and self.shards:
+                self.start_workers()
+
+    def setup_timestamping(self):
+        for shard in self.shards:
+            shard.set_timestamp_mode(self.timestamp_mode)
+        self.kernel_timestamps_enabled = all(shard.kernel_timestamps_enabled for shard in self.shards)
+
+    def setup_drop_counter(self):
+        pass  # every shard counts the kernel drops of its own socket
+
+    def set_receive_buffer_size(self, input_receive_buffer_size):
+        self.receive_buffer_size = input_receive_buffer_size
+        self.effective_receive_buffer_size = min(shard.set_receive_buffer_size(input_receive_buffer_size)
+                                                 for shard in self.shards)
+        return self.effective_receive_buffer_size
+
+    def get_numb_of_kernel_dropped_datagrams(self):
+        return sum(shard.get_numb_of_kernel_dropped_datagrams() for shard in self.shards)
+
+    def get_merged_receive_latency(self):
+        # FUNC: returns the receive latency histogram of all shards
+        merged_histogram = LatencyHistogram()
+        for shard in self.shards:
+            merged_histogram.bucket_counts = [a + b for a, b in zip(merged_histogram.bucket_counts,
+                                                                    shard.receive_latency.bucket_counts)]
+            merged_histogram.count += shard.receive_latency.count
+            merged_histogram.sum += shard.receive_latency.sum
+        return merged_histogram
+
+    #************************************************************************************
+    # Receiver workers
+    def start_workers(self):
+        self.workers_running = True
+        self.shard_threads = [threading.Thread(target=self.run_worker, args=(index, shard), daemon=True,
+                                               name="ShardReceiver-%d" % index)
+                              for index, shard in enumerate(self.shards)]
+        for shard_thread in self.shard_threads:
+            shard_thread.start()
+
+    def stop_workers(self):
+        self.workers_running = False
+        for shard_thread in self.shard_threads:
+            shard_thread.join()
+        self.shard_threads = []
+
+    def run_worker(self, index, shard):
+        # receiver worker of one socket, queues the accepted frames of every batch
+        shard.toggle_recieving_message(True)
+        while self.workers_running:
+            flag, frames = shard.recieve_messages(timeout=0.1)
+            if 1 == flag and frames:
+                try:
+                    self.shard_queue.put_nowait((index, frames))
+                except queue.Full:
+                    self.numb_of_dropped_batches += 1
+        shard.toggle_recieving_message(False)
+
+    def close_shards(self):
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+    #************************************************************************************
+    # Receiving messages
+    def toggle_recieving_message(self, input_rec_flag):
+        # FUNC: starting or stopping the receiver workers
+        # INPUT: input_rec_flag as boolean
+        # RETURN: ---
+        self.recieve_flag = input_rec_flag
+        if input_rec_flag and not self.workers_running:
+            self.start_workers()
+        elif not input_rec_flag and self.workers_running:
+            self.stop_workers()
+
+    def recieve_messages(self, timeout=1.0):
+        # FUNC: waiting for frames of the workers and merging all queued batches in time stamp order
+        # INPUT: timeout (float, optional): maximum time in seconds to wait for the first batch
+        # RETURN: return_flag as int; -1: nothing received, 1: at least one accepted message
+        #         messages as list of CanFrame
+        if not self.recieve_flag:
+            return -1, []
+        if self.pending_frames:  # older than everything queued by the workers
+            frames = list(self.pending_frames)
+            self.pending_frames.clear()
+            return 1, frames
+        try:
+            batches = [self.shard_queue.get(timeout=timeout)]
+        except queue.Empty:
+            self.numb_of_timeouts += 1
+            return -1, []
+        while True:
+            try:
+                batches.append(self.shard_queue.get_nowait())
+            except queue.Empty:
+                break
+        # the batches of one shard are in time stamp order, so the frames of each shard only need to be merged
+        frames_per_shard = {}
+        for index, frames in batches:
+            frames_per_shard.setdefault(index, []).extend(frames)
+        if len(frames_per_shard) == 1:
+            return 1, next(iter(frames_per_shard.values()))
+        return 1, list(heapq.merge(*frames_per_shard.values(), key=lambda frame: frame.timestamp))
+
+    def recieve_message(self):
+        # FUNC: returning the next merged message, the other messages of its batch are returned by the next calls
+        # RETURN: return_flag as int, message as CanFrame or None
+        if not self.pending_frames:
+            flag, frames = self.recieve_messages(1.0)
+            if not frames:
+                return flag, None
+            self.pending_frames.extend(frames)
+        return 1, self.pending_frames.popleft()
+
+    def close(self):
+        # FUNC: stopping the workers and closing all sockets
+        # INPUT: ---
+        # RETURN: ---
+        self.recieve_flag = False
+        self.stop_workers()
+        self.close_shards()
+        self.pending_frames.clear()
+        self.sock = None
+
+#*********************************************************************************************************
@@ -0,0 +1,405 @@
+import multiprocessing
+import queue
+import signal
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+from struct import Struct
+
+from qt_application_backend import CanFrame, Connector, TIMESTAMP_MODE_KERNEL
+from capture_file import CAPTURE_RECORD_STRUCT, CAPTURE_RECORD_SIZE
+
+try:
+    import numpy as np  # optional, only used to hand out the records as a structured numpy array
+    from capture_file import CAPTURE_RECORD_DTYPE
+except ImportError:
+    np = None
+
+#*********************************************************************************************************
+# Shared memory ring: a dedicated receiver process writes the received frames as fixed size records, consumers
+# in other processes read them by sequence number, without pickling and without sharing a GIL with the receiver.
+# layout: header (magic, capacity) | write and claim sequence on their own cache line | socket counters of the
+#         receiver process on their own cache line | capacity records
+# The records have the layout of the capture file records, so they can be written to a capture file unchanged.
+# The write sequence counts all frames written so far, the record of sequence number n is stored in slot
+# n % capacity. Before a batch is written, the claim sequence is set to the write sequence after the batch;
+# the write sequence is only increased after the records were written. Consumers read below the write sequence
+# and use the claim sequence to detect records overwritten while they copied them, so they never hand out a
+# partly written record. A consumer which falls more than capacity frames behind loses the overwritten frames.
+RING_MAGIC = b'CANRING1'
+RING_HEADER_STRUCT = Struct('<8sQ')
+RING_SEQUENCE_STRUCT = Struct('<Q')
+RING_WRITE_SEQUENCE_OFFSET = 64
+RING_CLAIM_SEQUENCE_OFFSET = 72
+RING_COUNTERS_OFFSET = 128
+RING_RECORDS_OFFSET = 192
+# Connector counters of the receiver process, published through the ring so the metrics of the consuming process
+# (connector_metrics.py) see the socket of the receiver process
+RING_SOCKET_COUNTERS = ("numb_of_received_datagrams", "numb_of_accepted_datagrams", "numb_of_accepted_frames",
+                        "numb_of_blacklisted_datagrams", "numb_of_not_whitelisted_datagrams",
+                        "numb_of_malformed_datagrams", "numb_of_kernel_dropped_datagrams")
+RING_COUNTERS_STRUCT = Struct('<%dQ' % len(RING_SOCKET_COUNTERS))
+RECEIVER_START_TIMEOUT = 30.0  # seconds, spawning the receiver process imports the backend again
+RECEIVER_COMMAND_TIMEOUT = 5.0  # seconds until a socket command of the receiver process has to be answered
+
+#*********************************************************************************************************
+class SharedFrameRing:
+    # Single producer, multi consumer ring of frame records in a multiprocessing.shared_memory block
+    def __init__(self, name=None, capacity=1 << 16):
+        # FUNC: initialize the SharedFrameRing class, creates a new ring or attaches to an existing one
+        # INPUT: name (string, optional): name of an existing ring. Defaults to a new ring.
+        #        capacity (int, optional): number of records of a new ring. Defaults to 65536.
+        # RETURN: ---
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_RECORDS_OFFSET + capacity * CAPTURE_RECORD_SIZE)
+            RING_HEADER_STRUCT.pack_into(self.shm.buf, 0, RING_MAGIC, capacity)
+            RING_SEQUENCE_STRUCT.pack_into(self.shm.buf, RING_WRITE_SEQUENCE_OFFSET, 0)
+            RING_SEQUENCE_STRUCT.pack_into(self.shm.buf, RING_CLAIM_SEQUENCE_OFFSET, 0)
+            RING_COUNTERS_STRUCT.pack_into(self.shm.buf, RING_COUNTERS_OFFSET, *([0] * len(RING_SOCKET_COUNTERS)))
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+            magic, capacity = RING_HEADER_STRUCT.unpack_from(self.shm.buf, 0)
+            if magic != RING_MAGIC:
+                raise ValueError("not a shared frame ring: " + name)
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.buf = self.shm.buf
+        self.records = self.buf[RING_RECORDS_OFFSET:RING_RECORDS_OFFSET + capacity * CAPTURE_RECORD_SIZE]
+
+    def get_write_sequence(self):
+        # FUNC: returns the number of frames written so far
+        return RING_SEQUENCE_STRUCT.unpack_from(self.buf, RING_WRITE_SEQUENCE_OFFSET)[0]
+
+    def get_claim_sequence(self):
+        # FUNC: returns the write sequence after the batch which is currently written
+        return RING_SEQUENCE_STRUCT.unpack_from(self.buf, RING_CLAIM_SEQUENCE_OFFSET)[0]
+
+    def write_socket_counters(self, connector):
+        # FUNC: publishing the counters of the receiving Connector, only called by the receiver process
+        # INPUT: connector as Connector
+        # RETURN: ---
+        RING_COUNTERS_STRUCT.pack_into(self.buf, RING_COUNTERS_OFFSET, connector.numb_of_received_datagrams,
+                                       connector.numb_of_accepted_datagrams, connector.numb_of_accepted_frames,
+                                       connector.numb_of_blacklisted_datagrams, connector.numb_of_not_whitelisted_datagrams,
+                                       connector.numb_of_malformed_datagrams, connector.get_numb_of_kernel_dropped_datagrams())
+
+    def read_socket_counters(self):
+        # FUNC: returns the counters of the receiving Connector
+        # RETURN: dictionary counter name of RING_SOCKET_COUNTERS -> int
+        return dict(zip(RING_SOCKET_COUNTERS, RING_COUNTERS_STRUCT.unpack_from(self.buf, RING_COUNTERS_OFFSET)))
+
+    def write_frames(self, frames):
+        # FUNC: writing frames, only called by the receiver process
+        # INPUT: frames as list of CanFrame
+        # RETURN: ---
+        if not frames:
+            return
+        capacity = self.capacity
+        end_sequence = self.get_write_sequence() + len(frames)
+        RING_SEQUENCE_STRUCT.pack_into(self.buf, RING_CLAIM_SEQUENCE_OFFSET, end_sequence)
+        # a batch larger than the ring only keeps its newest frames
+        sequence = end_sequence - min(len(frames), capacity)
+        records = self.records
+        pack_record = CAPTURE_RECORD_STRUCT.pack_into
+        for frame in frames[-capacity:]:
+            pack_record(records, (sequence % capacity) * CAPTURE_RECORD_SIZE,
+                        frame.timestamp, frame.can_id, frame.dlc, frame.flags, frame.data)
+            sequence += 1
+        # published after the records, consumers only read records below the write sequence
+        RING_SEQUENCE_STRUCT.pack_into(self.buf, RING_WRITE_SEQUENCE_OFFSET, end_sequence)
+
+    def read_records(self, read_sequence, max_numb_of_frames=None):
+        # FUNC: copying the records from read_sequence up to the write sequence
+        # INPUT: read_sequence as int, sequence number of the first record to read
+        #        max_numb_of_frames (int, optional): maximum number of records. Defaults to all available.
+        # RETURN: records as bytes, a multiple of CAPTURE_RECORD_SIZE
+        #         next read sequence as int
+        #         numb_of_lost_frames as int, frames overwritten before they could be read
+        write_sequence = self.get_write_sequence()
+        numb_of_lost_frames = 0
+        if write_sequence - read_sequence > self.capacity:
+            numb_of_lost_frames = write_sequence - self.capacity - read_sequence
+            read_sequence = write_sequence - self.capacity
+        stop_sequence = write_sequence
+        if max_numb_of_frames is not None:
+            stop_sequence = min(stop_sequence, read_sequence + max_numb_of_frames)
+        if stop_sequence <= read_sequence:
+            return b'', read_sequence, numb_of_lost_frames
+
+        start = (read_sequence % self.capacity) * CAPTURE_RECORD_SIZE
+        stop = (stop_sequence % self.capacity) * CAPTURE_RECORD_SIZE
+        if start < stop:
+            records = bytes(self.records[start:stop])
+        else:
+            records = bytes(self.records[start:]) + bytes(self.records[:stop])
+
+        # records the producer overwrote (or started to overwrite) while they were copied are dropped
+        overwritten = self.get_claim_sequence() - self.capacity - read_sequence
+        if overwritten > 0:
+            records = records[overwritten * CAPTURE_RECORD_SIZE:]
+            numb_of_lost_frames += min(overwritten, stop_sequence - read_sequence)
+        return records, stop_sequence, numb_of_lost_frames
+
+    def close(self):
+        # FUNC: detaching from the ring, the owner also removes the shared memory block
+        # INPUT: ---
+        # RETURN: ---
+        self.records.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+#*********************************************************************************************************
+class SharedFrameRingReader:
+    # Consumer of a SharedFrameRing, e.g. the logger, the recorder or the GUI model, each with its own position
+    def __init__(self, ring, start_at_end=True):
+        # FUNC: initialize the SharedFrameRingReader class
+        # INPUT: ring as SharedFrameRing
+        #        start_at_end (bool, optional): only read frames written after the reader was created. Defaults to True.
+        # RETURN: ---
+        self.my_ring = ring
+        self.read_sequence = ring.get_write_sequence() if start_at_end else 0
+        self.numb_of_lost_frames = 0
+
+    def skip_to_end(self):
+        # FUNC: skipping all frames which were not read yet
+        self.read_sequence = self.my_ring.get_write_sequence()
+
+    def numb_of_pending_frames(self):
+        # FUNC: returns the number of frames which were not read yet
+        return self.my_ring.get_write_sequence() - self.read_sequence
+
+    def read_records(self, max_numb_of_frames=None):
+        # FUNC: reading the new records
+        # INPUT: max_numb_of_frames (int, optional): maximum number of records. Defaults to all available.
+        # RETURN: records as bytes in the capture record layout
+        records, self.read_sequence, numb_of_lost_frames = self.my_ring.read_records(self.read_sequence, max_numb_of_frames)
+        self.numb_of_lost_frames += numb_of_lost_frames
+        return records
+
+    def read_frames(self, max_numb_of_frames=None):
+        # FUNC: reading the new frames
+        # INPUT: max_numb_of_frames (int, optional): maximum number of frames. Defaults to all available.
+        # RETURN: list of CanFrame
+        return [CanFrame(can_id, data[:dlc], flags, timestamp, dlc)
+                for timestamp, can_id, dlc, flags, data in CAPTURE_RECORD_STRUCT.iter_unpack(self.read_records(max_numb_of_frames))]
+
+    def read_array(self, max_numb_of_frames=None):
+        # FUNC: reading the new records as structured numpy array, needs numpy
+        # INPUT: max_numb_of_frames (int, optional): maximum number of records. Defaults to all available.
+        # RETURN: numpy array with the fields timestamp, can_id, dlc, flags and data
+        if np is None:
+            raise RuntimeError("numpy is required for SharedFrameRingReader.read_array")
+        return np.frombuffer(self.read_records(max_numb_of_frames), dtype=CAPTURE_RECORD_DTYPE)
+
+    def wait_for_frames(self, timeout, poll_interval=0.0005):
+        # FUNC: waiting until new frames are available
+        # INPUT: timeout as float, seconds
+        # RETURN: True if new frames are available
+        deadline = time.monotonic() + timeout
+        while self.numb_of_pending_frames() == 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+#*********************************************************************************************************
+def report_status(status_queue, command_name, connector, error=None):
+    # answers a command of the SharedRingConnector: (command name, errno, error text, effective receive buffer size)
+    if error is None:
+        status_queue.put((command_name, None, None, connector.effective_receive_buffer_size))
+    else:
+        status_queue.put((command_name, error.errno, error.strerror or str(error),
+                          connector.effective_receive_buffer_size if connector is not None else 0))
+
+def run_receiver_process(ring_name, command_queue, status_queue, UDP_IP, UDP_port, timestamp_mode, receive_buffer_size):
+    # receiver process: receives, decodes and filters by IPv4 source with a Connector, writes the frames to the ring
+    # and applies the commands of the SharedRingConnector between two batches. Socket commands are answered over the
+    # status queue; a socket which cannot be changed is reported and the previous socket stays in use.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the whole process group, the owner stops the receiver
+    ring = SharedFrameRing(ring_name)
+    try:
+        connector = Connector(timestamp_mode, receive_buffer_size, UDP_IP, UDP_port)
+    except OSError as error:
+        report_status(status_queue, "start", None, error)
+        ring.close()
+        return
+    report_status(status_queue, "start", connector)
+    connector.toggle_recieving_message(True)
+    is_running = True
+    while is_running:
+        while True:
+            try:
+                command = command_queue.get_nowait()
+            except queue.Empty:
+                break
+            if command[0] == "stop":
+                is_running = False
+            elif command[0] in ("socket", "receive_buffer_size"):
+                try:
+                    if command[0] == "socket":
+                        connector.update_UDP_socket(command[1], command[2])
+                    else:
+                        connector.set_receive_buffer_size(command[1])
+                except OSError as error:
+                    report_status(status_queue, command[0], connector, error)
+                else:
+                    report_status(status_queue, command[0], connector)
+            elif command[0] == "timestamp_mode":
+                connector.set_timestamp_mode(command[1])
+            elif command[0] == "IPv4_filter":
+                (connector.whitelist_enabled, connector.blacklist_enabled,
+                 connector.whitelist_IPs, connector.blacklist_IPs) = command[1:]
+                connector.compile_IPv4_filter()
+        flag, frames = connector.recieve_messages(timeout=0.05)
+        if 1 == flag:
+            ring.write_frames(frames)
+        ring.write_socket_counters(connector)
+    connector.close()
+    ring.close()
+
+#*********************************************************************************************************
+class SharedRingConnector(Connector):
+    # Drop-in replacement of the Connector for the pipeline mode: the socket is owned by a dedicated receiver
+    # process, which fills a SharedFrameRing. recieve_messages reads from the ring, so the receive capacity does not
+    # depend on what the consuming process (e.g. the GUI) is doing. Socket, time stamp and IPv4 filter changes are
+    # forwarded to the receiver process; sending uses an unbound socket of this process.
+    def __init__(self, timestamp_mode=TIMESTAMP_MODE_KERNEL, receive_buffer_size=None, UDP_IP="0.0.0.0",
+                 shared_UDP_port=4210, capacity=1 << 16):
+        # FUNC: initialize the SharedRingConnector class and start the receiver process
+        # INPUT: timestamp_mode, receive_buffer_size, UDP_IP, shared_UDP_port like the Connector, used by the receiver process
+        #        capacity (int, optional): number of frames of the ring. Defaults to 65536.
+        # RETURN: ---
+        self.my_ring = SharedFrameRing(capacity=capacity)
+        self.my_reader = SharedFrameRingReader(self.my_ring)
+        # spawn instead of fork, forking a process with a running Qt application is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.command_queue = context.Queue()
+        self.status_queue = context.Queue()  # answers of the socket commands, see report_status
+        self.command_lock = threading.Lock()  # pairs a socket command with its answer
+        self.receiver_process = None
+        super().__init__(timestamp_mode, receive_buffer_size, UDP_IP, shared_UDP_port)
+        self.receiver_process = context.Process(
+            target=run_receiver_process, name="CanethReceiver", daemon=True,
+            args=(self.my_ring.name, self.command_queue, self.status_queue, self.UDP_IP, self.shared_UDP_port,
+                  self.timestamp_mode, self.receive_buffer_size))
+        self.forward_IPv4_filter()
+        self.receiver_process.start()
+        try:
+            self.wait_for_status("start", RECEIVER_START_TIMEOUT)
+        except OSError:
+            self.close()
+            raise
+
+    def wait_for_status(self, command_name, timeout=RECEIVER_COMMAND_TIMEOUT):
+        # FUNC: waiting for the answer of the receiver process to a socket command
+        # INPUT: command_name as string; timeout (float, optional): seconds
+        # RETURN: ---, raises OSError if the command failed or the receiver process did not answer
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                status = self.status_queue.get(timeout=max(0.0, min(0.1, deadline - time.monotonic())))
+            except queue.Empty:
+                if not self.receiver_process.is_alive():
+                    raise OSError("receiver process stopped")
+                if time.monotonic() >= deadline:
+                    raise OSError("receiver process did not answer the %s command" % command_name)
+                continue
+            if status[0] != command_name:
+                continue  # late answer of a command which timed out
+            self.effective_receive_buffer_size = status[3]
+            if status[1] is not None:
+                raise OSError(status[1], status[2])
+            return
+
+    def update_UDP_socket(self, input_UDP_IP, input_shared_UDP_port):
+        # the receiver process binds the socket, this process only needs a socket for sending; if the receiver process
+        # cannot bind the new address it keeps the previous socket and the OSError is raised here
+        if getattr(self, "sock", None) is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.receiver_process is not None:
+            with self.command_lock:
+                self.command_queue.put(("socket", input_UDP_IP, input_shared_UDP_port))
+                self.wait_for_status("socket")
+        self.UDP_IP = input_UDP_IP
+        self.shared_UDP_port = input_shared_UDP_port
+
+    def set_receive_buffer_size(self, input_receive_buffer_size):
+        # the receive buffer belongs to the socket of the receiver process
+        with self.command_lock:
+            self.command_queue.put(("receive_buffer_size", input_receive_buffer_size))
+            self.wait_for_status("receive_buffer_size")
+        self.receive_buffer_size = input_receive_buffer_size
+        return self.effective_receive_buffer_size
+
+    def setup_timestamping(self):
+        if self.receiver_process is not None:
+            self.command_queue.put(("timestamp_mode", self.timestamp_mode))
+
+    def compile_IPv4_filter(self):
+        super().compile_IPv4_filter()
+        self.forward_IPv4_filter()
+
+    def forward_IPv4_filter(self):
+        # the IPv4 filter is applied by the receiver process
+        if getattr(self, "receiver_process", None) is not None:
+            self.command_queue.put(("IPv4_filter", self.whitelist_enabled, self.blacklist_enabled,
+                                    set(self.whitelist_IPs), set(self.blacklist_IPs)))
+
+    def read_socket_counters(self):
+        # FUNC: returns the counters of the Connector of the receiver process
+        # RETURN: dictionary counter name of RING_SOCKET_COUNTERS -> int
+        return self.my_ring.read_socket_counters()
+
+    def get_numb_of_kernel_dropped_datagrams(self):
+        return self.my_ring.read_socket_counters()["numb_of_kernel_dropped_datagrams"]
+
+    def toggle_recieving_message(self, input_rec_flag):
+        # frames received while receiving was switched off are skipped
+        if input_rec_flag and not self.recieve_flag:
+            self.my_reader.skip_to_end()
+        self.recieve_flag = input_rec_flag
+
+    def recieve_messages(self, timeout=1.0):
+        # FUNC: waiting for frames in the ring and reading all of them in one batch
+        # INPUT: timeout (float, optional): maximum time in seconds to wait for the first frame
+        # RETURN: return_flag as int; -1: nothing received, 1: at least one frame
+        #         messages as list of CanFrame
+        if not self.recieve_flag or not self.my_reader.wait_for_frames(timeout):
+            return -1, []
+        frames = self.my_reader.read_frames()
+        return (1 if frames else -1), frames
+
+    def recieve_message(self):
+        # FUNC: reading one frame of the ring
+        # RETURN: return_flag as int, message as CanFrame or None
+        if not self.recieve_flag or not self.my_reader.wait_for_frames(1.0):
+            return -1, None
+        frames = self.my_reader.read_frames(1)
+        if not frames:  # the record was overwritten or is still being written
+            return -1, None
+        return 1, frames[0]
+
+    def get_numb_of_lost_frames(self):
+        # FUNC: returns the number of frames overwritten in the ring before they were read
+        return self.my_reader.numb_of_lost_frames
+
+    def close(self):
+        # FUNC: stopping the receiver process and removing the ring
+        # INPUT: ---
+        # RETURN: ---
+        self.recieve_flag = False
+        if self.receiver_process is not None:
+            self.command_queue.put(("stop",))
+            self.receiver_process.join(2.0)
+            if self.receiver_process.is_alive():
+                self.receiver_process.terminate()
+            self.receiver_process = None
+        self.sock.close()
+        self.my_ring.close()
+
+#*********************************************************************************************************
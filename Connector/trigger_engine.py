@@ -0,0 +1,316 @@
+import operator
+import threading
+import time
+from collections import deque
+
+from qt_application_backend import CAN_FLAG_EXT, CAN_TRACE_EXT_KEY
+
+# Triggered recording: the TriggerEngine keeps the last frames in a pre-trigger ring, evaluates the trigger conditions
+# on every accepted frame and, once a condition fires, collects a post-trigger window. The pre-trigger frames, the
+# trigger and the post-trigger frames form a TriggerEvent. The conditions are stored per CAN-ID, so a frame of an ID
+# without a condition costs one dictionary lookup.
+
+TRIGGER_STATE_ARMED = "armed"
+TRIGGER_STATE_TRIGGERED = "triggered"  # collecting the post-trigger window
+TRIGGER_STATE_STOPPED = "stopped"
+
+COMPARISON_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+                        "==": operator.eq, "!=": operator.ne}
+
+def get_frame_key(can_id, ext=False):
+    # key of a CAN-ID like in the CanIdTrace: the CAN-ID plus CAN_TRACE_EXT_KEY for extended IDs
+    return can_id | CAN_TRACE_EXT_KEY if ext else can_id
+
+#*********************************************************************************************************
+class IdCondition:
+    # fires on every frame of the CAN-ID
+    def __init__(self, can_id, ext=False):
+        self.key = get_frame_key(can_id, ext)
+        self.description = "ID 0x%X" % can_id
+
+    def check(self, frame):
+        return True
+
+    def reset(self):
+        pass
+
+class PayloadCondition:
+    # fires on a frame of the CAN-ID whose payload bits under mask equal value; e.g. mask b'\x00\x80', value b'\x00\x80'
+    def __init__(self, can_id, mask, value, ext=False):
+        if len(mask) > 8 or len(value) > 8:
+            raise ValueError("mask and value must not be longer than 8 bytes")
+        self.key = get_frame_key(can_id, ext)
+        self.mask = int.from_bytes(bytes(mask).ljust(8, b'\x00'), 'little')
+        self.value = int.from_bytes(bytes(value).ljust(8, b'\x00'), 'little') & self.mask
+        self.description = "ID 0x%X payload & %s == %s" % (can_id, bytes(mask).hex().upper(), bytes(value).hex().upper())
+
+    def check(self, frame):
+        return int.from_bytes(frame.data.ljust(8, b'\x00'), 'little') & self.mask == self.value
+
+    def reset(self):
+        pass
+
+class SignalCondition:
+    # fires when a decoded signal crosses a threshold, i.e. on the first frame the comparison is true after a frame
+    # where it was false; a signal already beyond the threshold at arming fires on its first frame
+    def __init__(self, signal_database, message_name, signal_name, comparison, threshold):
+        # INPUT: signal_database as SignalDatabase of dbc_decoder
+        #        message_name, signal_name as string
+        #        comparison as string, one of COMPARISON_OPERATORS; e.g. ">"
+        #        threshold as number, physical value
+        message_definition = signal_database.get_message(message_name)
+        if message_definition is None:
+            raise ValueError("unknown message: %s" % message_name)
+        if signal_name not in [signal.name for signal in message_definition.signals]:
+            raise ValueError("unknown signal %s of message %s" % (signal_name, message_name))
+        if comparison not in COMPARISON_OPERATORS:
+            raise ValueError("unknown comparison: %s" % comparison)
+        self.key = message_definition.get_key()
+        self.plan = signal_database.get_plan(self.key)
+        self.signal_name = signal_name
+        self.compare = COMPARISON_OPERATORS[comparison]
+        self.threshold = threshold
+        self.was_true = False
+        self.description = "%s.%s %s %s" % (message_name, signal_name, comparison, threshold)
+
+    def check(self, frame):
+        value = self.plan.decode(frame.data).get(self.signal_name)  # None if the multiplexer selects other signals
+        is_true = value is not None and self.compare(value, self.threshold)
+        fired = is_true and not self.was_true
+        if value is not None:
+            self.was_true = is_true
+        return fired
+
+    def reset(self):
+        self.was_true = False
+
+class MissingCycleCondition:
+    # fires if no frame of the CAN-ID was received for timeout seconds, checked against the time stamp of every
+    # frame and on every receive timeout, so the trigger is placed at the first frame after the expiry
+    def __init__(self, can_id, timeout, ext=False):
+        self.key = get_frame_key(can_id, ext)
+        self.timeout = int(timeout * 1e9)
+        self.last_timestamp = None  # ns, the last frame or the arming
+        self.description = "ID 0x%X missing for %.3f s" % (can_id, timeout)
+
+    def check(self, frame):
+        self.last_timestamp = frame.timestamp
+        return False
+
+    def check_timeout(self, now):
+        # returns the time the timeout expired in ns, None if it did not expire; now is the time stamp of a frame
+        # or the current time
+        if self.last_timestamp is None:
+            self.last_timestamp = now  # counted from the arming
+        elif now - self.last_timestamp > self.timeout:
+            expiry_time = self.last_timestamp + self.timeout
+            self.last_timestamp = now  # fires once per gap
+            return expiry_time
+        return None
+
+    def reset(self):
+        self.last_timestamp = None
+
+#*********************************************************************************************************
+class TriggerEvent:
+    # Frames around one trigger: pre_frames before the trigger, post_frames from the trigger frame on
+    __slots__ = ('index', 'trigger_time', 'trigger_frame', 'description', 'pre_frames', 'post_frames')
+
+    def __init__(self, index, trigger_time, trigger_frame, description, pre_frames):
+        self.index = index
+        self.trigger_time = trigger_time  # ns since the epoch
+        self.trigger_frame = trigger_frame  # CanFrame, None for a missing cycle
+        self.description = description
+        self.pre_frames = pre_frames
+        self.post_frames = []
+
+    def get_frames(self):
+        return self.pre_frames + self.post_frames
+
+    def format_line(self):
+        return "Trigger %d: %s at %.6f s, %d pre-trigger and %d post-trigger frames" % (
+            self.index, self.description, self.trigger_time / 1e9, len(self.pre_frames), len(self.post_frames))
+
+#*********************************************************************************************************
+class TriggerEngine:
+    # Evaluates the trigger conditions on the accepted frames of the MessageReceiver.
+    # The post-trigger window ends after post_trigger_frames frames or post_trigger_time seconds after the trigger,
+    # whichever comes first. With rearm the engine is armed again after each event, otherwise it stops.
+    def __init__(self, pre_trigger_frames=1000, post_trigger_frames=1000, post_trigger_time=None, rearm=False,
+                 max_events=100):
+        # FUNC: initialize the TriggerEngine class
+        # INPUT: pre_trigger_frames (int, optional): frames kept before the trigger. Defaults to 1000.
+        #        post_trigger_frames (int, optional): frames recorded from the trigger on, None for no limit. Defaults to 1000.
+        #        post_trigger_time (float, optional): seconds recorded after the trigger, None for no limit. Defaults to None.
+        #        rearm (bool, optional): arming again after each event. Defaults to False.
+        #        max_events (int, optional): completed events kept until take_events. Defaults to 100.
+        # RETURN: ---
+        if post_trigger_frames is None and post_trigger_time is None:
+            raise ValueError("the post-trigger window needs a frame count or a time")
+        self.pre_trigger_ring = deque(maxlen=max(int(pre_trigger_frames), 0))
+        self.post_trigger_frames = post_trigger_frames
+        self.post_trigger_time = None if post_trigger_time is None else int(post_trigger_time * 1e9)
+        self.rearm = rearm
+        self.conditions_per_key = {}  # key -> list of conditions evaluated on the frames of this key
+        self.timeout_conditions = []
+        self.state = TRIGGER_STATE_STOPPED
+        self.current_event = None
+        self.completed_events = deque(maxlen=max_events)
+        self.event_lock = threading.Lock()
+        self.numb_of_events = 0
+        self.on_event = None  # optional callback with the completed TriggerEvent, called in the receiver thread
+
+    def add_condition(self, condition):
+        # FUNC: adding a trigger condition, any condition fires the trigger
+        # INPUT: condition as IdCondition, PayloadCondition, SignalCondition or MissingCycleCondition
+        # RETURN: ---
+        self.conditions_per_key.setdefault(condition.key, []).append(condition)
+        if isinstance(condition, MissingCycleCondition):
+            self.timeout_conditions.append(condition)
+
+    def clear_conditions(self):
+        self.conditions_per_key = {}
+        self.timeout_conditions = []
+
+    def arm(self):
+        # FUNC: arming the trigger, the pre-trigger ring starts empty
+        # INPUT: ---
+        # RETURN: ---
+        self.pre_trigger_ring.clear()
+        self.current_event = None
+        for conditions in self.conditions_per_key.values():
+            for condition in conditions:
+                condition.reset()
+        self.state = TRIGGER_STATE_ARMED
+
+    def disarm(self):
+        self.state = TRIGGER_STATE_STOPPED
+        self.current_event = None
+
+    def take_events(self):
+        # FUNC: returns the events completed since the last call
+        with self.event_lock:
+            events = list(self.completed_events)
+            self.completed_events.clear()
+        return events
+
+    def process(self, frames, now=None):
+        # FUNC: evaluating a batch of accepted frames, called by the MessageReceiver for every batch and timeout
+        # INPUT: frames as list of CanFrame in receive order
+        #        now (int, optional): current time in ns since the epoch for the missing cycle conditions
+        # RETURN: ---
+        start = 0
+        numb_of_frames = len(frames)
+        while start < numb_of_frames:
+            if self.state == TRIGGER_STATE_ARMED:
+                start = self.search_trigger(frames, start)
+            elif self.state == TRIGGER_STATE_TRIGGERED:
+                start = self.collect_post_trigger(frames, start)
+            else:
+                return
+        if self.state == TRIGGER_STATE_ARMED and self.timeout_conditions:
+            now = time.time_ns() if now is None else now
+            for condition in self.timeout_conditions:
+                expiry_time = condition.check_timeout(now)
+                if expiry_time is not None:
+                    self.fire(expiry_time, None, condition.description)
+                    break
+        elif self.state == TRIGGER_STATE_TRIGGERED and self.post_trigger_time is not None:
+            # the post-trigger time also ends without further frames
+            now = time.time_ns() if now is None else now
+            if now > self.current_event.trigger_time + self.post_trigger_time:
+                self.complete_event()
+
+    def search_trigger(self, frames, start):
+        # evaluates the conditions from start on, returns the index after the trigger frame or the end of the batch;
+        # an expired missing cycle fires before the first frame after the expiry, which starts the post-trigger window
+        conditions_per_key = self.conditions_per_key
+        next_expiry_time = None
+        if self.timeout_conditions:
+            for condition in self.timeout_conditions:
+                if condition.last_timestamp is None:
+                    condition.check_timeout(frames[start].timestamp)  # counted from the first frame after the arming
+            next_expiry_time = self.get_next_expiry_time()
+        for index in range(start, len(frames)):
+            frame = frames[index]
+            if next_expiry_time is not None and frame.timestamp > next_expiry_time:
+                for condition in self.timeout_conditions:
+                    expiry_time = condition.check_timeout(frame.timestamp)
+                    if expiry_time is not None:
+                        self.pre_trigger_ring.extend(frames[start:index])
+                        self.fire(expiry_time, None, condition.description)
+                        return index
+            conditions = conditions_per_key.get(frame.can_id | CAN_TRACE_EXT_KEY if frame.flags & CAN_FLAG_EXT
+                                                else frame.can_id)
+            if conditions is None:
+                continue
+            for condition in conditions:
+                if condition.check(frame):
+                    self.pre_trigger_ring.extend(frames[start:index])
+                    self.fire(frame.timestamp, frame, condition.description)
+                    self.current_event.post_frames.append(frame)
+                    return self.check_post_trigger_end(index + 1)
+            if next_expiry_time is not None:
+                next_expiry_time = self.get_next_expiry_time()  # a missing cycle condition may have seen its frame
+        self.pre_trigger_ring.extend(frames[start:])
+        return len(frames)
+
+    def get_next_expiry_time(self):
+        # earliest expiry time of the missing cycle conditions in ns, None if none of them is counting
+        expiry_times = [condition.last_timestamp + condition.timeout for condition in self.timeout_conditions
+                        if condition.last_timestamp is not None]
+        return min(expiry_times) if expiry_times else None
+
+    def fire(self, trigger_time, trigger_frame, description):
+        self.numb_of_events += 1
+        self.current_event = TriggerEvent(self.numb_of_events, trigger_time, trigger_frame, description,
+                                          list(self.pre_trigger_ring))
+        self.state = TRIGGER_STATE_TRIGGERED
+
+    def collect_post_trigger(self, frames, start):
+        # adds frames to the post-trigger window until it ends, returns the index after the window
+        event = self.current_event
+        stop = len(frames)
+        if self.post_trigger_frames is not None:
+            stop = min(stop, start + self.post_trigger_frames - len(event.post_frames))
+        if self.post_trigger_time is not None:
+            end_time = event.trigger_time + self.post_trigger_time
+            for index in range(start, stop):
+                if frames[index].timestamp > end_time:
+                    event.post_frames.extend(frames[start:index])
+                    self.complete_event()
+                    return index
+        event.post_frames.extend(frames[start:stop])
+        return self.check_post_trigger_end(stop)
+
+    def check_post_trigger_end(self, index):
+        if self.post_trigger_frames is not None and len(self.current_event.post_frames) >= self.post_trigger_frames:
+            self.complete_event()
+        return index
+
+    def complete_event(self):
+        event = self.current_event
+        with self.event_lock:
+            self.completed_events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+        # the frames after the trigger are the history of the next event
+        self.pre_trigger_ring.clear()
+        self.pre_trigger_ring.extend(event.post_frames)
+        self.current_event = None
+        if self.rearm:
+            for condition in self.timeout_conditions:
+                condition.reset()  # the gaps are counted from the re-arming, not from before the event
+            self.state = TRIGGER_STATE_ARMED
+        else:
+            self.state = TRIGGER_STATE_STOPPED
+
+#*********************************************************************************************************
+def write_trigger_event(event, file_path):
+    # FUNC: writing the frames of an event to a capture file
+    # INPUT: event as TriggerEvent
+    #        file_path as string
+    # RETURN: ---
+    from capture_file import create_capture_writer  # only needed for saving events
+    with create_capture_writer(file_path) as capture_writer:
+        capture_writer.write_frames(event.get_frames())
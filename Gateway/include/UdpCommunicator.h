@@ -13,6 +13,7 @@ public:
     void begin();
     void send(uint32_t id, const uint8_t *data, uint8_t length, bool extFlag, bool rtrFlag);
     bool receive(uint32_t &id, uint8_t *data, uint8_t &length, bool &extFlag, bool &rtrFlag);
+    bool hasPendingFrames() const;
     void updateRemoteIp(const IPAddress &newRemoteIp);
     void setAllowAll(bool allow);
     void addToWhitelist(uint32_t id);
@@ -30,6 +31,12 @@ private:
     std::vector<uint32_t> blacklist;
     bool allowAll = true;
 
+    // Buffer of the last received CANeth message, which can contain several CAN frames
+    uint8_t _rxBuffer[1472];
+    int _rxLength = 0;
+    int _rxFrameCount = 0;
+    int _rxFrameIndex = 0;
+
     int encodeCanEthMessage(uint32_t id, const uint8_t *data, uint8_t length, bool extFlag, bool rtrFlag, uint8_t *buffer);
     bool decodeCanEthMessage(const uint8_t *buffer, int len, uint32_t &id, uint8_t *data, uint8_t &length, bool &extFlag, bool &rtrFlag);
     bool isAllowed(uint32_t id);
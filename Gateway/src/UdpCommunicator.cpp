@@ -126,25 +126,48 @@ int UdpCommunicator::encodeCanEthMessage(uint32_t id, const uint8_t *data, uint8
 }
 
 //Receive the UDP-Messages
+//A CANeth message can contain several CAN frames, every call returns the next frame of the last message
 bool UdpCommunicator::receive(uint32_t &id, uint8_t *data, uint8_t &length, bool &extFlag, bool &rtrFlag)
 {
-  int packetSize = _udp.parsePacket();
-  if (packetSize)
+  if (_rxFrameIndex >= _rxFrameCount)
   {
-    uint8_t buffer[packetSize];
-    int len = _udp.read(buffer, sizeof(buffer));
-    return decodeCanEthMessage(buffer, len, id, data, length, extFlag, rtrFlag);
+    int packetSize = _udp.parsePacket();
+    if (!packetSize)
+    {
+      return false;
+    }
+    _rxLength = _udp.read(_rxBuffer, sizeof(_rxBuffer));
+    _rxFrameIndex = 0;
+    _rxFrameCount = 0;
+    if (_rxLength >= 25 && strncmp((const char *)_rxBuffer, "ISO11898", 8) == 0)
+    {
+      // Only use frames which are completely contained in the message
+      _rxFrameCount = std::min((int)_rxBuffer[9], (_rxLength - 10) / 15);
+    }
+    if (_rxFrameCount == 0)
+    {
+      return false;
+    }
   }
-  return false;
+  const uint8_t *frame = _rxBuffer + 15 * _rxFrameIndex;
+  _rxFrameIndex++;
+  return decodeCanEthMessage(frame, 25, id, data, length, extFlag, rtrFlag);
+}
+
+//True if the last received CANeth message has frames which were not returned by receive yet
+bool UdpCommunicator::hasPendingFrames() const
+{
+  return _rxFrameIndex < _rxFrameCount;
 }
 
 //Decode the CAN-Message to a UDP-Message
+//The buffer has to start 10 bytes before the frame, like the header of a single frame message
 bool UdpCommunicator::decodeCanEthMessage(const uint8_t *buffer, int len, uint32_t &id, uint8_t *data, uint8_t &length, bool &extFlag, bool &rtrFlag)
 {
-  if (len >= 25 && strncmp((const char *)buffer, "ISO11898", 8) == 0)
+  if (len >= 25)
   {
     id = buffer[10] | buffer[11] << 8 | buffer[12] << 16 | buffer[13] << 24;
-    length = buffer[14];
+    length = std::min((int)buffer[14], 8);
     for (int i = 0; i < length; i++)
     {
       data[i] = buffer[15 + i];
@@ -155,4 +178,3 @@ bool UdpCommunicator::decodeCanEthMessage(const uint8_t *buffer, int len, uint32
   }
   return false;
 }
-
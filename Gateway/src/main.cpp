@@ -20,6 +20,7 @@ const char *hotspot_password = Hotspot_PASSWORD;
 IPAddress remoteIp(192, 168, 42, 182);
 
 #define POLLING_RATE_MS 100 // Reduced polling rate for more responsive handling
+#define MAX_UDP_MESSAGES_PER_LOOP 8 // CANeth messages forwarded to CAN per loop, so a UDP burst cannot starve CAN -> UDP
 
 CanController canController(RX_PIN, TX_PIN);
 UdpCommunicator udpCommunicator(remoteIp);
@@ -69,7 +70,11 @@ void loop()
   uint8_t length;
   bool extFlag, rtrFlag;
 
-  if (udpCommunicator.receive(id, data, length, extFlag, rtrFlag))
+  // A CANeth message can contain several CAN frames, forward all of them. At most MAX_UDP_MESSAGES_PER_LOOP new
+  // messages are read per loop, the remaining messages wait in the UDP buffer until the CAN messages were handled
+  int numbOfUdpMessages = 0;
+  while ((udpCommunicator.hasPendingFrames() || numbOfUdpMessages++ < MAX_UDP_MESSAGES_PER_LOOP) &&
+         udpCommunicator.receive(id, data, length, extFlag, rtrFlag))
   {
     twai_message_t canMessage;
     canMessage.identifier = id;
@@ -1,37 +1,198 @@
-import can
+import argparse
+import os
+import socket
+import sys
+import threading
 import time
 
-def listen_and_send(bus, send_interval=1):
+import can
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Connector"))
+from qt_application_backend import encode_caneth_message, decode_caneth_messages  # noqa: E402
+
+GATEWAY_UDP_PORT = 4210  # the firmware listens on and sends to this port
+
+
+class GatewayEmulator(can.Listener):
     """
-    Listens for incoming messages and sends a message every 'send_interval' seconds.
+    Emulates the ESP32 gateway on a PC: bridges a python-can bus to CANeth UDP in both directions, like the
+    UdpCommunicator of the firmware.
+      CAN -> UDP: every frame which passes the ID filter is sent as one single-frame CANeth message to the remote IP.
+                  Allow all: all IDs except the blacklisted ones. Block all: only the whitelisted IDs.
+      UDP -> CAN: every complete frame of a received CANeth message is sent to the bus, without ID filter.
+    Frames from the bus are received event-driven by a can.Notifier, the UDP side blocks in its own thread.
     """
-    last_send_time = None  # Track when the last message was sent
-    data_change = 0
+    def __init__(self, bus, remote_ip, remote_port=GATEWAY_UDP_PORT, listen_ip="0.0.0.0", listen_port=GATEWAY_UDP_PORT,
+                 allow_all=True, whitelist=(), blacklist=()):
+        self.bus = bus
+        self.remote_address = (remote_ip, remote_port)
+        self.allow_all = allow_all
+        self.whitelist = set(whitelist)
+        self.blacklist = set(blacklist)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((listen_ip, listen_port))
+        self.sock.settimeout(0.5)  # the receiver thread checks is_running at least every 0.5 s
+        self.notifier = None
+        self.udp_thread = None
+        self.is_running = False
+        self.print_frames = False
+        self.numb_of_can_frames = 0  # received from the bus
+        self.numb_of_filtered_frames = 0  # not forwarded because of the ID filter
+        self.numb_of_sent_datagrams = 0
+        self.numb_of_udp_frames = 0  # received over UDP and sent to the bus
+        self.numb_of_bus_errors = 0  # frames the bus did not accept
 
-    while True:
-        current_time = time.time()
+    def is_allowed(self, can_id):
+        """
+        Returns True if a frame of the CAN-ID is forwarded to UDP, the same rule as UdpCommunicator::isAllowed.
+        """
+        if self.allow_all:
+            return can_id not in self.blacklist
+        return can_id in self.whitelist
 
-        # Send a message if the interval has passed
-        if last_send_time is None or (current_time - last_send_time) >= send_interval:
-            msg = can.Message(arbitration_id=0x45, data=[data_change, 255, 0, 1, 3, 1, 4, 1], is_extended_id=False)
-            print(msg)
+    def on_message_received(self, msg):
+        """
+        Called by the can.Notifier for every frame of the bus.
+        """
+        if msg.is_error_frame:
+            return
+        self.numb_of_can_frames += 1
+        if self.print_frames:
+            print("CAN -> UDP: %s" % msg)
+        if not self.is_allowed(msg.arbitration_id):
+            self.numb_of_filtered_frames += 1
+            return
+        data = bytes(msg.data) if not msg.is_remote_frame else b''
+        try:
+            self.sock.sendto(encode_caneth_message(msg.arbitration_id, data, msg.is_extended_id, msg.is_remote_frame),
+                             self.remote_address)
+            self.numb_of_sent_datagrams += 1
+        except OSError as error:
+            print("UDP send failed: %s" % error, file=sys.stderr)
+
+    def on_error(self, exc):
+        print("CAN receive failed: %s" % exc, file=sys.stderr)
+
+    def run_udp_receiver(self):
+        """
+        Receives CANeth messages and sends their frames to the bus, until stop() is called.
+        """
+        while self.is_running:
             try:
-                bus.send(msg)
-                print(f"Message sent on {bus.channel_info}")
-                last_send_time = current_time  # Update the last send time
-                data_change += 1 # increas number
-                if 256 == data_change:
-                    data_change = 0
-            except can.CanError:
-                print("Message NOT sent")
-
-        # Non-blocking check for incoming messages
-        message = bus.recv(timeout=0)  # Non-blocking
-        if message:
-            print(f"Received message: {message}") # message format: Timestamp   sender_can_ID  msg_info    data_length     msg_content     channel_info
-
-        time.sleep(0.1) # Short sleep to prevent a tight loop that consumes too much CPU
+                message, _ = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            for frame in decode_caneth_messages(message):
+                dlc = min(frame.dlc, 8)
+                msg = can.Message(arbitration_id=frame.can_id, data=frame.data[:dlc], dlc=dlc,
+                                  is_extended_id=frame.ext, is_remote_frame=frame.rtr)
+                if self.print_frames:
+                    print("UDP -> CAN: %s" % msg)
+                try:
+                    self.bus.send(msg)
+                    self.numb_of_udp_frames += 1
+                except can.CanError as error:
+                    self.numb_of_bus_errors += 1
+                    print("Message NOT sent: %s" % error, file=sys.stderr)
+
+    def start(self):
+        self.is_running = True
+        self.notifier = can.Notifier(self.bus, [self])
+        self.udp_thread = threading.Thread(target=self.run_udp_receiver, name="GatewayUdpReceiver", daemon=True)
+        self.udp_thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self.notifier is not None:
+            self.notifier.stop()
+        if self.udp_thread is not None:
+            self.udp_thread.join()
+        self.sock.close()
+
+    def get_status_line(self):
+        return ("CAN frames: %d (%d filtered), CANeth messages sent: %d, UDP frames to CAN: %d (%d bus errors)" % (
+            self.numb_of_can_frames, self.numb_of_filtered_frames, self.numb_of_sent_datagrams,
+            self.numb_of_udp_frames, self.numb_of_bus_errors))
+
+
+def parse_cyclic_message(text):
+    """
+    Parses a cyclic test message "ID:period_ms[:data_hex]", e.g. "0x45:1000:00FF000103010401".
+    """
+    parts = text.split(":")
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError("expected ID:period_ms[:data_hex], got %s" % text)
+    can_id = int(parts[0], 0)
+    data = bytes.fromhex(parts[2]) if len(parts) == 3 else bytes(8)
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=can_id > 0x7FF), float(parts[1]) / 1000
+
+
+def create_argument_parser():
+    parser = argparse.ArgumentParser(description="CANeth gateway emulator, bridges a python-can bus to UDP like the ESP32")
+    parser.add_argument("--interface", default="virtual", help="python-can interface: virtual, socketcan, vector, ...")
+    parser.add_argument("--channel", help="channel of the interface, e.g. vcan0 or 0 for vector. Defaults to vcan0, 0 for vector")
+    parser.add_argument("--bitrate", type=int, default=500000, help="bit rate, only used by hardware interfaces")
+    parser.add_argument("--app-name", default="CANalyzer", help="application name of the vector interface")
+    parser.add_argument("--remote-ip", default="127.0.0.1", help="IP of the Connector the frames are sent to")
+    parser.add_argument("--remote-port", type=int, default=GATEWAY_UDP_PORT)
+    parser.add_argument("--listen-ip", default="0.0.0.0",
+                        help="IP the emulator receives on, e.g. 127.0.0.2 next to a Connector on 127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=GATEWAY_UDP_PORT)
+    parser.add_argument("--block-all", action="store_true",
+                        help="only forward whitelisted IDs, like 'Block all Messages' on the web server")
+    parser.add_argument("--whitelist", action="append", default=[], type=lambda text: int(text, 0),
+                        help="whitelisted CAN-ID, can be repeated")
+    parser.add_argument("--blacklist", action="append", default=[], type=lambda text: int(text, 0),
+                        help="blacklisted CAN-ID, can be repeated")
+    parser.add_argument("--cyclic", action="append", default=[], type=parse_cyclic_message,
+                        help="frame sent periodically on the bus as ID:period_ms[:data_hex], can be repeated")
+    parser.add_argument("--print", dest="print_frames", action="store_true", help="print every bridged frame")
+    parser.add_argument("--status-interval", type=float, default=10.0, help="seconds between two status lines")
+    return parser
+
+
+def main(argv=None):
+    args = create_argument_parser().parse_args(argv)
+    if args.channel is None:
+        args.channel = "0" if args.interface == "vector" else "vcan0"
+    bus_options = {"interface": args.interface, "channel": args.channel}
+    if args.interface == "vector":
+        # the vector interface takes channel numbers, other values are passed on to python-can unchanged
+        bus_options.update(app_name=args.app_name, bitrate=args.bitrate,
+                           channel=int(args.channel) if args.channel.isdigit() else args.channel)
+    elif args.interface not in ("virtual", "socketcan"):
+        bus_options["bitrate"] = args.bitrate
+
+    with can.Bus(**bus_options) as bus:
+        emulator = GatewayEmulator(bus, args.remote_ip, args.remote_port, args.listen_ip, args.listen_port,
+                                   allow_all=not args.block_all, whitelist=args.whitelist, blacklist=args.blacklist)
+        emulator.print_frames = args.print_frames
+        cyclic_bus = None
+        if args.cyclic:
+            # a bus handle does not receive its own frames, so the cyclic frames are sent from a second handle
+            cyclic_bus = can.Bus(**bus_options) if args.interface in ("virtual", "socketcan") else bus
+            for msg, period in args.cyclic:
+                cyclic_bus.send_periodic(msg, period)
+        emulator.start()
+        print("bridging %s %s <-> udp %s:%d -> %s:%d" % (args.interface, args.channel, args.listen_ip,
+                                                       args.listen_port, args.remote_ip, args.remote_port))
+        try:
+            while True:
+                time.sleep(args.status_interval or 3600)
+                if args.status_interval:
+                    print(emulator.get_status_line())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            emulator.stop()
+            if cyclic_bus is not None:
+                cyclic_bus.stop_all_periodic_tasks()
+                if cyclic_bus is not bus:
+                    cyclic_bus.shutdown()
+            print(emulator.get_status_line())
+
 
 if __name__ == "__main__":
-    with can.Bus(interface='vector', app_name='CANalyzer', channel=0, bitrate=500000) as bus:
-        listen_and_send(bus)
+    main()
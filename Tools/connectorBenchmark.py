@@ -0,0 +1,237 @@
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from array import array
+from struct import Struct
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Connector"))
+from qt_application_backend import (  # noqa: E402
+    Connector, MessageLogger, MessageReceiver, CANETH_MAX_FRAMES_PER_DATAGRAM, encode_caneth_messages)
+
+SEND_TIME_STRUCT = Struct('<q')  # every generated frame carries its send time in ns as payload
+
+
+def parse_id_distribution(text):
+    """
+    Returns the CAN-IDs and weights of an ID distribution:
+      uniform:N           N standard IDs with equal rates
+      zipf:N              N standard IDs, the rate of the k-th ID is proportional to 1/k
+      fixed:0x100,0x200   the given IDs with equal rates
+    """
+    kind, _, argument = text.partition(":")
+    if kind == "uniform":
+        ids = list(range(int(argument, 0)))
+        return ids, [1.0] * len(ids)
+    if kind == "zipf":
+        ids = list(range(int(argument, 0)))
+        return ids, [1.0 / (rank + 1) for rank in range(len(ids))]
+    if kind == "fixed":
+        ids = [int(part, 0) for part in argument.split(",") if part.strip()]
+        return ids, [1.0] * len(ids)
+    raise ValueError("unknown ID distribution: " + text)
+
+
+def run_gateway(target, rate, frames_per_datagram, duration, id_distribution, seed, result_queue):
+    """
+    Simulates one ESP32 gateway: sends CANeth datagrams of frames_per_datagram frames at rate frames/s
+    to target for duration seconds. The datagrams are paced with absolute deadlines, so the rate does not drift.
+    """
+    ids, weights = parse_id_distribution(id_distribution)
+    generator = random.Random(seed)
+    id_sequence = generator.choices(ids, weights=weights, k=4096)  # precomputed, the send loop only cycles
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+    datagram_interval = frames_per_datagram / rate * 1e9
+    numb_of_sent_frames = 0
+    numb_of_send_errors = 0
+    position = 0
+    start_time = time.monotonic_ns()
+    end_time = start_time + int(duration * 1e9)
+    numb_of_datagrams = 0
+    while True:
+        deadline = start_time + int(numb_of_datagrams * datagram_interval)
+        if deadline >= end_time:
+            break
+        remaining = deadline - time.monotonic_ns()
+        if remaining > 1000000:
+            time.sleep((remaining - 500000) / 1e9)
+        payload = SEND_TIME_STRUCT.pack(time.time_ns())
+        frames = []
+        for _ in range(frames_per_datagram):
+            frames.append((id_sequence[position], payload))
+            position = (position + 1) & 4095
+        try:
+            sock.sendto(encode_caneth_messages(frames), target)
+            numb_of_sent_frames += frames_per_datagram
+        except OSError:
+            numb_of_send_errors += 1
+        numb_of_datagrams += 1
+    sock.close()
+    result_queue.put((numb_of_sent_frames, numb_of_send_errors))
+
+
+class LatencyMessageLogger(MessageLogger):
+    """
+    MessageLogger which additionally measures the latency of every n-th accepted frame:
+      receive latency: receive time stamp of the Connector (kernel or monotonic) - send time
+      end-to-end latency: time the frame reaches the MessageLogger - send time
+    """
+    def __init__(self, sample_interval, **kwargs):
+        super().__init__(**kwargs)
+        self.sample_interval = sample_interval
+        self.numb_of_accepted_frames = 0
+        self.receive_latencies = array('q')
+        self.end_to_end_latencies = array('q')
+
+    def log_recent_messages(self, message_flag, messages):
+        accepted_messages = super().log_recent_messages(message_flag, messages)
+        now = time.time_ns()
+        first = -self.numb_of_accepted_frames % self.sample_interval
+        for frame in accepted_messages[first::self.sample_interval]:
+            if frame.dlc == 8:
+                send_time = SEND_TIME_STRUCT.unpack(frame.data)[0]
+                self.receive_latencies.append(frame.timestamp - send_time)
+                self.end_to_end_latencies.append(now - send_time)
+        self.numb_of_accepted_frames += len(accepted_messages)
+        return accepted_messages
+
+
+def read_kernel_drops(port):
+    """
+    Returns the number of datagrams the kernel dropped on the UDP sockets bound to port (Linux only, else None).
+    """
+    try:
+        with open("/proc/net/udp") as udp_table:
+            lines = udp_table.readlines()[1:]
+    except OSError:
+        return None
+    drops = 0
+    for line in lines:
+        columns = line.split()
+        if int(columns[1].split(":")[1], 16) == port:
+            drops += int(columns[-1])
+    return drops
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run_benchmark(args):
+    """
+    Runs the Connector + MessageLogger + MessageReceiver pipeline headless and loads it with simulated gateways.
+    Returns the results as dictionary.
+    """
+    if args.shards > 1:
+        from sharded_connector import ShardedConnector
+        connector = ShardedConnector(args.shards, timestamp_mode=args.timestamp_mode,
+                                     receive_buffer_size=args.receive_buffer_size, UDP_IP="127.0.0.1",
+                                     shared_UDP_port=args.port)
+    else:
+        connector = Connector(timestamp_mode=args.timestamp_mode, receive_buffer_size=args.receive_buffer_size,
+                              UDP_IP="127.0.0.1", shared_UDP_port=args.port)
+    port = connector.sock.getsockname()[1]
+    message_logger = LatencyMessageLogger(args.latency_sample_interval, max_recent_messages=args.max_recent_messages)
+    message_receiver = MessageReceiver(connector, message_logger)
+    message_receiver.start()
+    receiver_thread = threading.Thread(target=message_receiver.run, name="MessageReceiver", daemon=True)
+    receiver_thread.start()
+
+    kernel_drops_before = read_kernel_drops(port)
+    result_queue = multiprocessing.Queue()
+    gateways = [multiprocessing.Process(target=run_gateway, args=(
+        ("127.0.0.1", port), args.rate, args.frames_per_datagram, args.duration, args.ids, seed, result_queue))
+        for seed in range(args.gateways)]
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    for gateway in gateways:
+        gateway.start()
+    results = [result_queue.get() for _ in gateways]
+    for gateway in gateways:
+        gateway.join()
+
+    # waiting until the receiver has drained the socket
+    numb_of_frames = -1
+    while numb_of_frames != message_logger.numb_of_accepted_frames:
+        numb_of_frames = message_logger.numb_of_accepted_frames
+        time.sleep(0.2)
+    wall_time = time.monotonic() - wall_start - 0.2
+    cpu_time = time.process_time() - cpu_start
+    message_receiver.stop()
+    receiver_thread.join()
+    kernel_drops_after = read_kernel_drops(port)
+    connector.close()
+
+    numb_of_sent_frames = sum(sent for sent, _ in results)
+    numb_of_received_frames = message_logger.numb_of_accepted_frames
+    numb_of_lost_frames = numb_of_sent_frames - numb_of_received_frames
+    if kernel_drops_before is not None and kernel_drops_after is not None:
+        kernel_dropped_frames = (kernel_drops_after - kernel_drops_before) * args.frames_per_datagram
+    else:
+        kernel_dropped_frames = None
+    receive_latencies = sorted(message_logger.receive_latencies)
+    end_to_end_latencies = sorted(message_logger.end_to_end_latencies)
+    return {
+        "sent_frames": numb_of_sent_frames,
+        "received_frames": numb_of_received_frames,
+        "send_errors": sum(errors for _, errors in results),
+        "lost_frames": numb_of_lost_frames,
+        "kernel_dropped_frames": kernel_dropped_frames,
+        "application_dropped_frames": None if kernel_dropped_frames is None else numb_of_lost_frames - kernel_dropped_frames,
+        "receive_buffer_size": connector.effective_receive_buffer_size,
+        "sustained_fps": numb_of_received_frames / wall_time if wall_time > 0 else 0.0,
+        "cpu_us_per_frame": cpu_time / numb_of_received_frames * 1e6 if numb_of_received_frames else 0.0,
+        "receive_latency_us": {name: percentile(receive_latencies, fraction) / 1e3
+                              for name, fraction in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999), ("max", 1.0))},
+        "end_to_end_latency_us": {name: percentile(end_to_end_latencies, fraction) / 1e3
+                                  for name, fraction in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999), ("max", 1.0))},
+    }
+
+
+def print_results(args, results):
+    print("gateways: %d, rate: %d frames/s per gateway, %d frames per datagram, IDs: %s, %s time stamps" % (
+        args.gateways, args.rate, args.frames_per_datagram, args.ids, args.timestamp_mode))
+    print("receive buffer:        %d bytes, %d socket(s)" % (results["receive_buffer_size"], args.shards))
+    print("sent frames:           %d (%d send errors)" % (results["sent_frames"], results["send_errors"]))
+    print("received frames:       %d" % results["received_frames"])
+    print("sustained rate:        %.0f frames/s" % results["sustained_fps"])
+    if results["kernel_dropped_frames"] is None:
+        print("lost frames:           %d (kernel drops unknown on this platform)" % results["lost_frames"])
+    else:
+        print("kernel dropped frames: %d" % results["kernel_dropped_frames"])
+        print("app dropped frames:    %d" % results["application_dropped_frames"])
+    print("CPU per frame:         %.2f us" % results["cpu_us_per_frame"])
+    for name in ("receive_latency_us", "end_to_end_latency_us"):
+        print("%-22s " % (name.replace("_us", "").replace("_", " ") + ":") +
+              "  ".join("%s %.0f us" % item for item in results[name].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback load generator and throughput/latency benchmark of the Connector")
+    parser.add_argument("--gateways", type=int, default=1, help="number of simulated gateways")
+    parser.add_argument("--rate", type=int, default=10000, help="frames per second per gateway")
+    parser.add_argument("--frames-per-datagram", type=int, default=1,
+                        help="CAN frames per CANeth datagram, 1 to %d" % CANETH_MAX_FRAMES_PER_DATAGRAM)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load")
+    parser.add_argument("--ids", default="uniform:64", help="ID distribution: uniform:N, zipf:N or fixed:ID,ID,...")
+    parser.add_argument("--port", type=int, default=0, help="UDP port of the Connector, 0 for a free port")
+    parser.add_argument("--timestamp-mode", choices=("kernel", "monotonic"), default="kernel")
+    parser.add_argument("--receive-buffer-size", type=int, default=None, help="SO_RCVBUF in bytes, OS default if not set")
+    parser.add_argument("--shards", type=int, default=1, help="number of SO_REUSEPORT sockets with a receiver thread each")
+    parser.add_argument("--max-recent-messages", type=int, default=1000)
+    parser.add_argument("--latency-sample-interval", type=int, default=16, help="latency of every n-th frame is measured")
+    args = parser.parse_args()
+    if not 1 <= args.frames_per_datagram <= CANETH_MAX_FRAMES_PER_DATAGRAM:
+        parser.error("--frames-per-datagram must be between 1 and %d" % CANETH_MAX_FRAMES_PER_DATAGRAM)
+    print_results(args, run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()